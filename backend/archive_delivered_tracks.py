@@ -0,0 +1,186 @@
+"""
+Script to move delivered packages' location history into the cold archive tier
+Each package delivered more than ARCHIVE_DELIVERED_AFTER_H hours ago has its
+points packed into one compressed location_archives document (see
+tracking.archive) and removed from the hot location collection, so that only
+in-flight packages remain there. Route history reads merge the archive back in.
+
+Safe to re-run, e.g. from cron with --yes: points that arrive for a package
+after it was archived are merged into its archive on the next run.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# tracking.storage reads LOCATION_STORAGE_MODE on import
+load_dotenv()
+
+from tracking.storage import (
+    LOCATIONS_COLLECTION,
+    BUCKETS_COLLECTION,
+    POINT_FIELDS,
+    use_buckets,
+    unpack_bucket
+)
+from tracking.archive import ARCHIVES_COLLECTION, archive_document, load_archive
+from tracking.route_cache import RouteColumns
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "track_order")
+ARCHIVE_DELIVERED_AFTER_H = float(os.getenv("ARCHIVE_DELIVERED_AFTER_H", "24"))
+
+# Stay below MongoDB's 16 MB document limit
+MAX_ARCHIVE_BYTES = 15 * 1024 * 1024
+
+
+async def read_hot_points(db, package_id) -> tuple[list[dict], list]:
+    """
+    Read a package's points from the hot collection
+
+    Returns:
+        The points, and the point _ids (documents layout) or (bucket _id,
+        count) pairs (buckets layout) to delete once they are archived
+    """
+    if use_buckets():
+        points, buckets = [], []
+        async for bucket in db[BUCKETS_COLLECTION].find({"package_id": package_id}):
+            points.extend(unpack_bucket(bucket))
+            buckets.append((bucket["_id"], bucket["count"]))
+        return points, buckets
+
+    cursor = db[LOCATIONS_COLLECTION].find({"package_id": package_id}, {field: 1 for field in POINT_FIELDS})
+    points = await cursor.to_list(length=None)
+    return points, [point["_id"] for point in points]
+
+
+async def delete_hot_points(db, archived: list):
+    """Delete archived points from the hot collection"""
+    if use_buckets():
+        for bucket_id, count in archived:
+            # A bucket that gained points meanwhile is kept for the next run
+            await db[BUCKETS_COLLECTION].delete_one({"_id": bucket_id, "count": count})
+        return
+
+    for i in range(0, len(archived), 1000):
+        await db[LOCATIONS_COLLECTION].delete_many({"_id": {"$in": archived[i:i + 1000]}})
+
+
+async def archive_package(db, package: dict) -> int:
+    """
+    Merge a package's hot points into its archive, then delete them
+
+    Returns:
+        Number of points moved out of the hot collection
+    """
+    package_id = package["_id"]
+    points, archived = await read_hot_points(db, package_id)
+    if not points:
+        return 0
+    points.sort(key=lambda loc: (loc["timestamp"], loc["_id"]))
+
+    route = await load_archive(db, package_id)
+    if route is None:
+        route = RouteColumns(package_id)
+        for point in points:
+            route.append(point)
+    else:
+        # Late points; upsert also skips copies left by an interrupted run
+        for point in points:
+            route.upsert(point)
+
+    document = archive_document(package, route)
+    if len(document["data"]) > MAX_ARCHIVE_BYTES:
+        print(f"  ⚠️  {package['tracking_id']}: archive too large ({len(route)} points), skipped")
+        return 0
+    await db[ARCHIVES_COLLECTION].replace_one({"package_id": package_id}, document, upsert=True)
+
+    # Verify the archive before deleting anything
+    stored = await load_archive(db, package_id)
+    if stored is None or len(stored) != len(route):
+        raise RuntimeError(f"Archive of {package['tracking_id']} did not verify; hot points kept")
+
+    # Reads merge the archive in from here on, so the delete is not visible
+    await db.packages.update_one({"_id": package_id}, {"$set": {"archived_at": document["archived_at"]}})
+    await delete_hot_points(db, archived)
+    return len(points)
+
+
+async def find_candidates(db, cutoff: datetime) -> list[dict]:
+    """Delivered packages (settled before cutoff) with points in the hot collection"""
+    # Start from the packages that still have hot points (a scan of the
+    # package_id index), so the cost follows the hot data rather than every
+    # delivery ever made
+    hot = db[BUCKETS_COLLECTION if use_buckets() else LOCATIONS_COLLECTION]
+    package_ids = await hot.distinct("package_id")
+    if not package_ids:
+        return []
+    query = {
+        "_id": {"$in": package_ids},
+        "status": "delivered",
+        "$or": [
+            {"delivered_at": {"$lt": cutoff}},
+            # Delivered before delivered_at was recorded
+            {"delivered_at": {"$exists": False}, "updated_at": {"$lt": cutoff}}
+        ]
+    }
+    return await db.packages.find(query).to_list(length=None)
+
+
+async def archive_delivered(assume_yes: bool = False):
+    """Archive the tracks of all settled delivered packages"""
+    try:
+        client = AsyncIOMotorClient(MONGODB_URI)
+        db = client[DATABASE_NAME]
+
+        print("🔌 Connected to MongoDB")
+        print(f"📊 Database: {DATABASE_NAME}")
+        print()
+
+        cutoff = datetime.utcnow() - timedelta(hours=ARCHIVE_DELIVERED_AFTER_H)
+        candidates = await find_candidates(db, cutoff)
+        print(f"📦 {len(candidates)} delivered packages with hot location history")
+        if not candidates:
+            client.close()
+            print("✅ Nothing to archive")
+            return
+
+        if not assume_yes:
+            response = input("Archive their tracks? (yes/no): ")
+            if response.lower() not in ["yes", "y"]:
+                print("❌ Operation cancelled")
+                client.close()
+                return
+
+        print()
+        print("🗄️  Archiving tracks...")
+        moved = 0
+        for package in candidates:
+            count = await archive_package(db, package)
+            if count:
+                print(f"  ✅ {package['tracking_id']}: {count} points")
+            moved += count
+
+        print()
+        print(f"✅ Moved {moved} points into {ARCHIVES_COLLECTION}")
+        archive_stats = await db.command("collStats", ARCHIVES_COLLECTION)
+        print(f"📊 {ARCHIVES_COLLECTION}: {archive_stats['count']} tracks, {archive_stats['size']} bytes")
+
+        client.close()
+        print()
+        print("✅ Done!")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("🗄️  Delivered Track Archiver")
+    print("=" * 60)
+    print()
+    asyncio.run(archive_delivered(assume_yes="--yes" in sys.argv))
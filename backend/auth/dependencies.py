@@ -3,6 +3,7 @@ Authentication dependencies for protected routes
 """
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Optional
 from db.connection import get_database
 from models.user import UserResponse, TokenData
 from auth.utils import decode_access_token
@@ -10,6 +11,42 @@ from auth.utils import decode_access_token
 security = HTTPBearer()
 
 
+async def get_user_from_token(token: str) -> Optional[UserResponse]:
+    """
+    Resolve a JWT access token to its user
+    
+    Returns:
+        The user, or None if the token is invalid or the user no longer exists
+    """
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    
+    user_id: str = payload.get("sub")
+    if user_id is None:
+        return None
+    
+    return await _load_user(user_id)
+
+
+async def _load_user(user_id: str) -> Optional[UserResponse]:
+    """Fetch a user from the database by ID"""
+    from bson import ObjectId
+    db = get_database()
+    users_collection = db.users
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if user is None:
+        return None
+    
+    return UserResponse(
+        id=str(user["_id"]),
+        name=user["name"],
+        email=user["email"],
+        role=user["role"],
+        created_at=user["created_at"]
+    )
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> UserResponse:
@@ -35,11 +72,7 @@ async def get_current_user(
         )
     
     # Fetch user from database
-    from bson import ObjectId
-    db = get_database()
-    users_collection = db.users
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    
+    user = await _load_user(user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -47,13 +80,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return UserResponse(
-        id=str(user["_id"]),
-        name=user["name"],
-        email=user["email"],
-        role=user["role"],
-        created_at=user["created_at"]
-    )
+    return user
 
 
 async def get_current_active_user(
@@ -7,6 +7,7 @@ from models.user import UserCreate, UserResponse
 from auth.utils import get_password_hash
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -57,23 +58,20 @@ async def register(user_data: UserCreate):
         "updated_at": datetime.utcnow()
     }
     
-    # Insert user into database
-    result = await users_collection.insert_one(user_doc)
-    
-    # Create unique index on email if it doesn't exist
+    # Insert user into database (insert_one sets _id on user_doc)
     try:
-        await users_collection.create_index("email", unique=True)
-    except Exception:
-        pass  # Index might already exist
-    
-    # Fetch created user (without password)
-    created_user = await users_collection.find_one({"_id": result.inserted_id})
+        await users_collection.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent signup for the same email
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     return UserResponse(
-        id=str(created_user["_id"]),
-        name=created_user["name"],
-        email=created_user["email"],
-        role=created_user["role"],
-        created_at=created_user["created_at"]
+        id=str(user_doc["_id"]),
+        name=user_doc["name"],
+        email=user_doc["email"],
+        role=user_doc["role"],
+        created_at=user_doc["created_at"]
     )
-
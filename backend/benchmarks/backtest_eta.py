@@ -0,0 +1,347 @@
+"""
+Backtest: accuracy and latency of the ETA estimators
+
+Replays delivered packages' recorded tracks point by point through
+tracking.eta as if each point had just been received. Every prediction is
+compared with the package's actual arrival: the first point within the
+auto-delivery radius of the recipient, or the time the package was marked
+delivered. The report gives absolute error percentiles, the mean signed
+error (positive = predicted too late) and per-prediction latency for each
+estimator:
+
+    constant     calculate_eta at DEFAULT_AVERAGE_SPEED_KMH
+    speed        ETA_MODE=speed: EWMA of observed segment speeds (tracking.speed)
+    historical   ETA_MODE=historical: speed table from SPEED_TABLE_PATH (for
+                 synthetic tracks, built from a separate synthetic training set)
+    vectorized   calculate_eta_many over a whole track per call (constant speed)
+
+Usage (from backend/):
+    python -m benchmarks.backtest_eta [--source synthetic|db] [--packages N]
+        [--estimators constant,speed,...] [--max-p90-error-min M]
+        [--max-p95-latency-us U] [--json results.json]
+
+--source synthetic (default) generates seeded tracks with rush-hour slowdowns
+and stops, no database needed. --source db reads delivered packages from
+MONGODB_URI / DATABASE_NAME, e.g. a dump restored with mongorestore. With
+gates given, exits with status 1 if any estimator misses them.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from packages.status import should_auto_transition_to_delivered
+from tracking.eta import (
+    DEFAULT_AVERAGE_SPEED_KMH,
+    calculate_eta,
+    calculate_eta_along,
+    calculate_eta_many
+)
+from tracking.speed import SpeedEstimator
+from tracking.speed_table import SPEED_TABLE_PATH, SpeedTable, SpeedTableBuilder
+
+# Degrees of latitude per kilometer
+_KM_LAT = 1 / 111.195
+
+
+class Track(NamedTuple):
+    """A delivered package's recorded points, oldest first"""
+    tracking_id: str
+    recipient_lat: float
+    recipient_lon: float
+    points: list[dict]
+    arrived_at: datetime
+
+
+def arrival_time(points: list[dict], recipient_lat: float, recipient_lon: float, delivered_at: datetime) -> datetime:
+    """First point within the auto-delivery radius, else the delivery time"""
+    for point in points:
+        if should_auto_transition_to_delivered(point["latitude"], point["longitude"], recipient_lat, recipient_lon):
+            return point["timestamp"]
+    return delivered_at
+
+
+def synthetic_tracks(n: int, seed: int = 42) -> list[Track]:
+    """
+    Couriers driving straight to the recipient around Delhi, pinging every
+    30 s, slower in rush hours (08-10, 17-20 UTC) with occasional stops
+    """
+    rng = random.Random(seed)
+    tracks = []
+    for i in range(n):
+        latitude, longitude = rng.uniform(28.50, 28.75), rng.uniform(77.05, 77.35)
+        distance_km, bearing = rng.uniform(3, 15), rng.uniform(0, 2 * math.pi)
+        recipient_lat = latitude + distance_km * math.cos(bearing) * _KM_LAT
+        recipient_lon = longitude + distance_km * math.sin(bearing) * _KM_LAT / math.cos(math.radians(latitude))
+        pace = rng.uniform(0.7, 1.3)
+        ts = datetime(2024, 1, 1) + timedelta(minutes=rng.randrange(7 * 24 * 60))
+
+        points = []
+        stopped_until = None
+        while True:
+            points.append({"latitude": latitude, "longitude": longitude, "timestamp": ts})
+            remaining_lat, remaining_lon = recipient_lat - latitude, recipient_lon - longitude
+            remaining_km = math.hypot(remaining_lat / _KM_LAT, remaining_lon * math.cos(math.radians(latitude)) / _KM_LAT)
+            if remaining_km < 0.05:
+                break
+
+            ts += timedelta(seconds=30)
+            if stopped_until is not None and ts < stopped_until:
+                continue
+            stopped_until = ts + timedelta(minutes=rng.uniform(1, 5)) if rng.random() < 0.02 else None
+
+            rush_hour = 8 <= ts.hour < 10 or 17 <= ts.hour < 20
+            speed_kmh = (12.0 if rush_hour else 28.0) * pace * rng.uniform(0.8, 1.2)
+            step = min(1.0, speed_kmh * 30 / 3600 / remaining_km)
+            latitude += remaining_lat * step
+            longitude += remaining_lon * step
+        tracks.append(Track(f"SYN-{i:05d}", recipient_lat, recipient_lon, points, points[-1]["timestamp"]))
+    return tracks
+
+
+async def db_tracks(limit: int) -> list[Track]:
+    """Read delivered packages and their tracks (archived ones included)"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from tracking.storage import iter_route_locations
+
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    db = client[os.getenv("DATABASE_NAME", "track_order")]
+    tracks = []
+    query = {"status": "delivered", "recipient.latitude": {"$ne": 0.0}}
+    async for package in db.packages.find(query).sort("updated_at", -1).limit(limit):
+        points = []
+        async for batch in iter_route_locations(db, package["_id"], archived=bool(package.get("archived_at"))):
+            points.extend(batch)
+        if len(points) < 2:
+            continue
+        recipient_lat = package["recipient"]["latitude"]
+        recipient_lon = package["recipient"]["longitude"]
+        arrived_at = arrival_time(points, recipient_lat, recipient_lon, package["updated_at"])
+        tracks.append(Track(package["tracking_id"], recipient_lat, recipient_lon, points, arrived_at))
+    client.close()
+    return tracks
+
+
+class PointEstimator:
+    """Predicts from one point at a time, as the ingest path does"""
+    name = ""
+
+    def start(self, track: Track):
+        """Reset per-package state before replaying a track"""
+
+    def predict(self, track: Track, point: dict) -> Optional[datetime]:
+        raise NotImplementedError
+
+    def predict_track(self, track: Track, points: list[dict]) -> tuple[list, list[float]]:
+        """Predictions and per-prediction latency (ns)"""
+        self.start(track)
+        predictions, latencies = [], []
+        for point in points:
+            started = time.perf_counter_ns()
+            predictions.append(self.predict(track, point))
+            latencies.append(time.perf_counter_ns() - started)
+        return predictions, latencies
+
+
+class ConstantEstimator(PointEstimator):
+    name = "constant"
+
+    def predict(self, track, point):
+        return calculate_eta(
+            point["latitude"], point["longitude"], track.recipient_lat, track.recipient_lon,
+            now=point["timestamp"]
+        )
+
+
+class ObservedSpeedEstimator(PointEstimator):
+    name = "speed"
+
+    def __init__(self):
+        self.estimator = SpeedEstimator()
+
+    def start(self, track):
+        self.estimator.forget(track.tracking_id)
+
+    def predict(self, track, point):
+        # Observing the point is part of the per-ping cost
+        self.estimator.observe(track.tracking_id, point["latitude"], point["longitude"], point["timestamp"])
+        speed = self.estimator.speed_kmh(track.tracking_id) or DEFAULT_AVERAGE_SPEED_KMH
+        return calculate_eta(
+            point["latitude"], point["longitude"], track.recipient_lat, track.recipient_lon,
+            average_speed_kmh=speed, now=point["timestamp"]
+        )
+
+
+class HistoricalEstimator(PointEstimator):
+    name = "historical"
+
+    def __init__(self, table: SpeedTable):
+        self.table = table
+
+    def predict(self, track, point):
+        return calculate_eta_along(
+            point["latitude"], point["longitude"], track.recipient_lat, track.recipient_lon,
+            self.table.speed_kmh, now=point["timestamp"]
+        )
+
+
+class VectorizedEstimator:
+    """calculate_eta_many over all points of a track in one call"""
+    name = "vectorized"
+
+    def predict_track(self, track: Track, points: list[dict]) -> tuple[list, list[float]]:
+        started = time.perf_counter_ns()
+        latitudes = np.fromiter((point["latitude"] for point in points), dtype=np.float64, count=len(points))
+        longitudes = np.fromiter((point["longitude"] for point in points), dtype=np.float64, count=len(points))
+        remaining = calculate_eta_many(latitudes, longitudes, track.recipient_lat, track.recipient_lon, now=points[0]["timestamp"])
+        # Each ETA relative to its own point's time
+        offsets = np.array([point["timestamp"] for point in points], dtype="datetime64[us]")
+        etas = remaining + (offsets - offsets[0])
+        elapsed = time.perf_counter_ns() - started
+        return etas.astype(datetime).tolist(), [elapsed / len(points)] * len(points)
+
+
+def training_table(tracks: list[Track]) -> SpeedTable:
+    """Speed table built from tracks (in a temporary file)"""
+    builder = SpeedTableBuilder()
+    for track in tracks:
+        builder.add_track(track.points)
+    path = os.path.join(tempfile.mkdtemp(), "speed_table.bin")
+    builder.write(path)
+    return SpeedTable.open(path)
+
+
+def build_estimators(names: list[str], table_path: Optional[str], training: Optional[list[Track]] = None) -> list:
+    estimators = []
+    for name in names:
+        if name == "constant":
+            estimators.append(ConstantEstimator())
+        elif name == "speed":
+            estimators.append(ObservedSpeedEstimator())
+        elif name == "vectorized":
+            estimators.append(VectorizedEstimator())
+        elif name == "historical":
+            if table_path is None and training is not None:
+                estimators.append(HistoricalEstimator(training_table(training)))
+            elif os.path.exists(table_path or SPEED_TABLE_PATH):
+                estimators.append(HistoricalEstimator(SpeedTable.open(table_path or SPEED_TABLE_PATH)))
+            else:
+                print(f"⚠️  {table_path or SPEED_TABLE_PATH} not found (python build_speed_table.py); skipping historical")
+        else:
+            raise SystemExit(f"Unknown estimator: {name}")
+    return estimators
+
+
+def backtest(estimator, tracks: list[Track], every: int = 1) -> dict:
+    """Replay tracks through an estimator and summarize errors and latency"""
+    errors, latencies = [], []
+    failed = 0
+    for track in tracks:
+        points = [point for point in track.points if point["timestamp"] < track.arrived_at][::every]
+        if not points:
+            continue
+        predictions, point_latencies = estimator.predict_track(track, points)
+        latencies.extend(point_latencies)
+        for eta in predictions:
+            if eta is None:
+                failed += 1
+            else:
+                errors.append((eta - track.arrived_at).total_seconds() / 60)
+
+    errors = np.array(errors)
+    latencies = np.array(latencies) / 1000
+    abs_errors = np.abs(errors)
+    return {
+        "estimator": estimator.name,
+        "predictions": int(len(errors)),
+        "failed": failed,
+        "error_p50_min": float(np.percentile(abs_errors, 50)) if len(errors) else None,
+        "error_p90_min": float(np.percentile(abs_errors, 90)) if len(errors) else None,
+        "error_p95_min": float(np.percentile(abs_errors, 95)) if len(errors) else None,
+        "error_p99_min": float(np.percentile(abs_errors, 99)) if len(errors) else None,
+        "bias_min": float(errors.mean()) if len(errors) else None,
+        "within_5_min": float((abs_errors <= 5).mean()) if len(errors) else None,
+        "latency_p50_us": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "latency_p95_us": float(np.percentile(latencies, 95)) if len(latencies) else None,
+        "latency_p99_us": float(np.percentile(latencies, 99)) if len(latencies) else None,
+        "cpu_s": float(latencies.sum() / 1e6)
+    }
+
+
+def report(result: dict):
+    if not result["predictions"]:
+        print(f"  {result['estimator']:<11} no predictions")
+        return
+    print(
+        f"  {result['estimator']:<11} "
+        f"|err| p50 {result['error_p50_min']:6.1f}  p90 {result['error_p90_min']:6.1f}  "
+        f"p95 {result['error_p95_min']:6.1f}  p99 {result['error_p99_min']:6.1f} min  "
+        f"bias {result['bias_min']:+6.1f} min  ≤5 min {result['within_5_min']:6.1%}  "
+        f"latency p50 {result['latency_p50_us']:7.1f}  p95 {result['latency_p95_us']:7.1f} us"
+    )
+
+
+def check_gates(results: list[dict], max_p90_error_min: Optional[float], max_p95_latency_us: Optional[float]) -> bool:
+    passed = True
+    for result in results:
+        if not result["predictions"]:
+            continue
+        if max_p90_error_min is not None and result["error_p90_min"] > max_p90_error_min:
+            print(f"❌ {result['estimator']}: p90 error {result['error_p90_min']:.1f} min > {max_p90_error_min} min")
+            passed = False
+        if max_p95_latency_us is not None and result["latency_p95_us"] > max_p95_latency_us:
+            print(f"❌ {result['estimator']}: p95 latency {result['latency_p95_us']:.1f} us > {max_p95_latency_us} us")
+            passed = False
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest ETA estimators on delivered tracks")
+    parser.add_argument("--source", choices=["synthetic", "db"], default="synthetic")
+    parser.add_argument("--packages", type=int, default=200, help="Number of delivered packages")
+    parser.add_argument("--estimators", default="constant,speed,historical,vectorized")
+    parser.add_argument("--every", type=int, default=1, help="Replay every Nth point")
+    parser.add_argument("--seed", type=int, default=42, help="Synthetic track seed")
+    parser.add_argument("--speed-table", help="Speed table file (default: SPEED_TABLE_PATH)")
+    parser.add_argument("--max-p90-error-min", type=float)
+    parser.add_argument("--max-p95-latency-us", type=float)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    training = None
+    if args.source == "db":
+        tracks = asyncio.run(db_tracks(args.packages))
+    else:
+        tracks = synthetic_tracks(args.packages, args.seed)
+        training = synthetic_tracks(args.packages * 5, args.seed + 1)
+    points = sum(len(track.points) for track in tracks)
+    print(f"📊 {len(tracks)} delivered tracks ({args.source}), {points} points")
+
+    results = []
+    for estimator in build_estimators(args.estimators.split(","), args.speed_table, training):
+        result = backtest(estimator, tracks, args.every)
+        report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"source": args.source, "tracks": len(tracks), "results": results}, f, indent=2)
+
+    if not check_gates(results, args.max_p90_error_min, args.max_p95_latency_us):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark: scalar vs NumPy-vectorized distance and ETA calculation
+
+Compares a Python loop over calculate_distance / calculate_eta with one call
+of calculate_distance_many / calculate_eta_many at 1, 100, 10k and 1M
+coordinate pairs (the scalar loops are capped at 100k calls and scaled).
+
+Usage (from backend/):
+    python -m benchmarks.bench_eta_vectorized [max_pairs]
+
+CPU only; no database needed.
+"""
+import sys
+import time
+
+import numpy as np
+
+from tracking.eta import calculate_distance, calculate_distance_many, calculate_eta, calculate_eta_many
+
+SIZES = [1, 100, 10_000, 1_000_000]
+MAX_SCALAR_CALLS = 100_000
+
+
+def make_pairs(n: int) -> tuple[np.ndarray, ...]:
+    """Random couriers and destinations around Delhi"""
+    rng = np.random.default_rng(42)
+    return (
+        rng.uniform(28.4, 28.8, n), rng.uniform(77.0, 77.4, n),
+        rng.uniform(28.4, 28.8, n), rng.uniform(77.0, 77.4, n)
+    )
+
+
+def time_call(fn, repeats: int) -> float:
+    """Best-of-3 seconds per call"""
+    fn()  # warm up
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeats)
+    return best
+
+
+def compare(label: str, scalar, vectorized, columns: tuple[np.ndarray, ...]):
+    n = len(columns[0])
+    repeats = max(1, 10_000 // n)
+
+    # Scalar: Python floats, as the per-package callers pass them
+    scalar_n = min(n, MAX_SCALAR_CALLS)
+    rows = list(zip(*(column[:scalar_n].tolist() for column in columns)))
+    scalar_s = time_call(lambda: [scalar(*row) for row in rows], repeats) * n / scalar_n
+    vector_s = time_call(lambda: vectorized(*columns), repeats)
+
+    print(
+        f"  {label:<10} {n:>9,} pairs  scalar {scalar_s / n * 1e9:9.1f} ns/pair  "
+        f"vectorized {vector_s / n * 1e9:9.1f} ns/pair  ({scalar_s / vector_s:6.1f}x)"
+    )
+
+
+def main(max_pairs: int):
+    for n in [size for size in SIZES if size <= max_pairs]:
+        columns = make_pairs(n)
+        print(f"📊 {n:,} pairs")
+        compare("distance", calculate_distance, calculate_distance_many, columns)
+        compare("eta", calculate_eta, calculate_eta_many, columns)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1])
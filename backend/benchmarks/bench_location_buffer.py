@@ -0,0 +1,90 @@
+"""
+Benchmark: per-request insert_one vs buffered insert_many for location updates
+
+Usage (from backend/):
+    python -m benchmarks.bench_location_buffer [num_pings] [concurrency]
+
+Writes to a scratch collection in the configured database and drops it afterwards.
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from db.connection import connect_to_mongo, close_mongo_connection
+from tracking.buffer import LocationWriteBuffer
+
+load_dotenv()
+
+COLLECTION_NAME = "bench_location_updates"
+
+
+def make_doc(i: int) -> dict:
+    """Build a synthetic location document"""
+    now = datetime.utcnow()
+    return {
+        "package_id": ObjectId(),
+        "latitude": 28.6 + i * 1e-5,
+        "longitude": 77.2 + i * 1e-5,
+        "timestamp": now,
+        "created_at": now
+    }
+
+
+async def run_concurrently(num_pings: int, concurrency: int, write):
+    """Run `write(i)` for num_pings pings with bounded concurrency"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await write(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(num_pings)))
+    return time.perf_counter() - start
+
+
+def report(label: str, num_pings: int, elapsed: float):
+    print(f"  {label:<28} {elapsed:8.3f}s  {num_pings / elapsed:10.0f} pings/s  {elapsed / num_pings * 1e6:8.1f} us/ping")
+
+
+async def main(num_pings: int, concurrency: int):
+    db = await connect_to_mongo()
+    collection = db[COLLECTION_NAME]
+    await collection.drop()
+
+    print(f"📊 {num_pings} pings, concurrency {concurrency}")
+
+    # Per-request path: one round trip per ping
+    elapsed = await run_concurrently(num_pings, concurrency, lambda i: collection.insert_one(make_doc(i)))
+    report("insert_one per ping", num_pings, elapsed)
+    await collection.drop()
+
+    # Buffered path, caller waits for the group commit
+    buffer = LocationWriteBuffer(collection_name=COLLECTION_NAME)
+    elapsed = await run_concurrently(num_pings, concurrency, lambda i: buffer.add(make_doc(i), wait=True))
+    await buffer.close()
+    report("buffer (wait=True)", num_pings, elapsed)
+    print(f"    {buffer.get_stats()}")
+    await collection.drop()
+
+    # Buffered path, fire and forget (includes the final drain)
+    buffer = LocationWriteBuffer(collection_name=COLLECTION_NAME)
+    start = time.perf_counter()
+    await run_concurrently(num_pings, concurrency, lambda i: buffer.add(make_doc(i), wait=False))
+    await buffer.close()
+    report("buffer (wait=False)", num_pings, time.perf_counter() - start)
+    print(f"    {buffer.get_stats()}")
+
+    written = await collection.count_documents({})
+    assert written == num_pings, f"expected {num_pings} documents, found {written}"
+    await collection.drop()
+    await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    pings = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(pings, workers))
@@ -0,0 +1,91 @@
+"""
+Benchmark: parse cost per point of location ingest body formats
+
+Compares JSON bodies validated into LocationUpdateCreate / LocationBatchCreate
+(one Pydantic model per point) with the binary formats in tracking.codec,
+which decode into typed arrays and build lightweight LocationPoint tuples.
+
+Usage (from backend/):
+    python -m benchmarks.bench_payload_parse [points_per_batch] [repeats]
+
+CPU only; no database needed.
+"""
+import json
+import sys
+import time
+
+import msgpack
+
+from models.location import LocationBatchCreate, LocationUpdateCreate
+from tracking.codec import (
+    decode_msgpack,
+    decode_msgpack_point,
+    decode_packed,
+    decode_packed_record,
+    encode_packed,
+    encode_packed_record
+)
+
+
+def make_points(n: int) -> list[tuple]:
+    """Build synthetic (tracking_id, latitude, longitude, unix_timestamp) points"""
+    return [(f"TRK-{i % 10:04d}", 28.6 + i * 1e-5, 77.2 + i * 1e-5, 1700000000.0 + i) for i in range(n)]
+
+
+def json_body(points: list[tuple]) -> bytes:
+    return json.dumps({"updates": [
+        {"tracking_id": p[0], "latitude": p[1], "longitude": p[2], "timestamp": p[3]}
+        for p in points
+    ]}).encode()
+
+
+def msgpack_body(points: list[tuple]) -> bytes:
+    return msgpack.packb({
+        "tracking_id": [p[0] for p in points],
+        "latitude": [p[1] for p in points],
+        "longitude": [p[2] for p in points],
+        "timestamp": [p[3] for p in points]
+    })
+
+
+def measure(label: str, parse, body: bytes, num_points: int, repeats: int):
+    parse(body)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        parse(body)
+    elapsed = time.perf_counter() - start
+    per_point = elapsed / (repeats * num_points) * 1e9
+    print(f"  {label:<30} {len(body) / num_points:7.1f} bytes/pt  {per_point:9.1f} ns/pt")
+
+
+def main(num_points: int, repeats: int):
+    tracking_id, latitude, longitude, timestamp = make_points(1)[0]
+    single_repeats = repeats * 100
+    print(f"📊 single point (/{{tracking_id}}/update), {single_repeats} repeats")
+
+    measure("json + pydantic", LocationUpdateCreate.model_validate_json,
+            json.dumps({"latitude": latitude, "longitude": longitude, "timestamp": timestamp}).encode(),
+            1, single_repeats)
+    measure("msgpack map", lambda b: decode_msgpack_point(b, tracking_id),
+            msgpack.packb({"latitude": latitude, "longitude": longitude, "timestamp": timestamp}),
+            1, single_repeats)
+    measure("packed record", lambda b: decode_packed_record(b, tracking_id),
+            encode_packed_record(latitude, longitude, timestamp), 1, single_repeats)
+
+    points = make_points(num_points)
+    print(f"📊 {num_points} points per batch (/batch), {repeats} repeats")
+
+    measure("json + pydantic", lambda b: LocationBatchCreate.model_validate_json(b).updates,
+            json_body(points), num_points, repeats)
+    measure("msgpack columns -> points", lambda b: decode_msgpack(b).points(),
+            msgpack_body(points), num_points, repeats)
+    measure("packed struct -> points", lambda b: decode_packed(b).points(),
+            encode_packed(points), num_points, repeats)
+    measure("packed struct (arrays only)", decode_packed,
+            encode_packed(points), num_points, repeats)
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    main(batch_size, runs)
@@ -0,0 +1,157 @@
+"""
+Benchmark: per-row cost of list response serialization
+
+Compares the Pydantic path (build a response model per row, then FastAPI's
+response_model validation and JSON encoding) with models.fast_json (row
+mapping + orjson) for route history and package list payloads.
+
+Usage (from backend/):
+    python -m benchmarks.bench_response_serialization [rows] [repeats]
+
+CPU only; no database needed.
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from models.fast_json import FastJSONResponse, location_row, package_row
+from models.location import LocationUpdateResponse, RouteHistoryResponse
+from models.package import PackageResponse, PackageListResponse
+
+
+def make_locations(n: int) -> list[dict]:
+    package_id = ObjectId()
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "package_id": package_id,
+            "latitude": 28.6 + i * 1e-5,
+            "longitude": 77.2 + i * 1e-5,
+            "timestamp": start + timedelta(seconds=i),
+            "created_at": start + timedelta(seconds=i, milliseconds=250)
+        }
+        for i in range(n)
+    ]
+
+
+def make_packages(n: int) -> list[dict]:
+    now = datetime(2024, 1, 1)
+    contact = {"name": "Someone", "address": "1 Main Street", "phone": "1234567890", "latitude": 28.6, "longitude": 77.2}
+    return [
+        {
+            "_id": ObjectId(),
+            "tracking_id": f"TRK-20240101-{i:06d}",
+            "sender": dict(contact),
+            "recipient": dict(contact),
+            "status": "in_transit",
+            "user_id": ObjectId(),
+            "created_at": now,
+            "updated_at": now
+        }
+        for i in range(n)
+    ]
+
+
+_adapters = {}
+
+
+def fastapi_render(model_type, response) -> bytes:
+    """
+    What FastAPI does with a returned model under response_model: dump it,
+    validate against the response field, serialize and json.dumps
+    """
+    adapter = _adapters.setdefault(model_type, TypeAdapter(model_type))
+    validated = adapter.validate_python(response.model_dump())
+    return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+
+def pydantic_history(locations: list[dict]) -> bytes:
+    response = RouteHistoryResponse(
+        package_id=str(locations[0]["package_id"]),
+        tracking_id="TRK-1",
+        locations=[
+            LocationUpdateResponse(
+                id=str(loc["_id"]),
+                package_id=str(loc["package_id"]),
+                latitude=loc["latitude"],
+                longitude=loc["longitude"],
+                timestamp=loc["timestamp"],
+                created_at=loc["created_at"]
+            )
+            for loc in locations
+        ],
+        total=len(locations)
+    )
+    return fastapi_render(RouteHistoryResponse, response)
+
+
+def fast_history(locations: list[dict]) -> bytes:
+    package_id = str(locations[0]["package_id"])
+    return FastJSONResponse({
+        "package_id": package_id,
+        "tracking_id": "TRK-1",
+        "locations": [location_row(loc, package_id) for loc in locations],
+        "total": len(locations),
+        "next_cursor": None,
+        "has_more": False,
+        "polyline": None
+    }).body
+
+
+def pydantic_packages(packages: list[dict]) -> bytes:
+    response = PackageListResponse(
+        packages=[
+            PackageResponse(
+                id=str(pkg["_id"]),
+                tracking_id=pkg["tracking_id"],
+                sender=pkg["sender"],
+                recipient=pkg["recipient"],
+                status=pkg["status"],
+                user_id=str(pkg["user_id"]),
+                created_at=pkg["created_at"],
+                updated_at=pkg["updated_at"]
+            )
+            for pkg in packages
+        ],
+        total=len(packages)
+    )
+    return fastapi_render(PackageListResponse, response)
+
+
+def fast_packages(packages: list[dict]) -> bytes:
+    return FastJSONResponse({"packages": [package_row(pkg) for pkg in packages], "total": len(packages)}).body
+
+
+def measure(label: str, render, rows: list[dict], repeats: int) -> float:
+    render(rows)  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        render(rows)
+    per_row = (time.perf_counter() - start) / (repeats * len(rows)) * 1e6
+    print(f"  {label:<24} {per_row:8.2f} us/row")
+    return per_row
+
+
+def main(num_rows: int, repeats: int):
+    locations = make_locations(num_rows)
+    packages = make_packages(min(num_rows, 100))
+
+    print(f"📊 route history, {len(locations)} rows, {repeats} repeats")
+    before = measure("pydantic + FastAPI", pydantic_history, locations, repeats)
+    after = measure("fast_json (orjson)", fast_history, locations, repeats)
+    print(f"    {before / after:.1f}x faster")
+
+    print(f"📊 package list, {len(packages)} rows, {repeats} repeats")
+    before = measure("pydantic + FastAPI", pydantic_packages, packages, repeats)
+    after = measure("fast_json (orjson)", fast_packages, packages, repeats)
+    print(f"    {before / after:.1f}x faster")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(rows, runs)
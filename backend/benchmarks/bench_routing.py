@@ -0,0 +1,94 @@
+"""
+Benchmark: road graph (contraction hierarchy) build time and route queries
+
+Builds a synthetic city of two-way streets on a jittered grid (about 100 m
+blocks, a faster arterial every 10th street), then times route() between
+random points at increasing straight-line distances, checking each route
+against a plain Dijkstra search of the uncontracted graph.
+
+Usage (from backend/):
+    python -m benchmarks.bench_routing [grid_size]
+
+CPU only; no database needed.
+"""
+import heapq
+import sys
+import time
+
+import numpy as np
+
+from tracking.routing import RoadGraphBuilder
+
+BLOCK_DEGREES = 0.0009
+QUERIES = 200
+
+
+def make_city(size: int, seed: int = 42) -> RoadGraphBuilder:
+    """size x size intersections around Delhi"""
+    rng = np.random.default_rng(seed)
+    jitter = rng.uniform(-0.0002, 0.0002, (size, size, 2))
+    lat = 28.5 + np.arange(size)[:, None] * BLOCK_DEGREES + jitter[..., 0]
+    lon = 77.1 + np.arange(size)[None, :] * BLOCK_DEGREES + jitter[..., 1]
+
+    builder = RoadGraphBuilder()
+    for i in range(size):
+        speed = 50.0 if i % 10 == 0 else 20.0
+        builder.add_road(zip(lat[i, :], lon[i, :]), speed)
+        builder.add_road(zip(lat[:, i], lon[:, i]), speed)
+    return builder
+
+
+def dijkstra_seconds(builder: RoadGraphBuilder, source: int, target: int) -> float:
+    """Reference: plain Dijkstra over the builder's edges"""
+    adjacency: dict[int, list] = {}
+    for u, w, _, seconds in builder.edges:
+        adjacency.setdefault(u, []).append((w, seconds))
+    times = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        time_s, v = heapq.heappop(heap)
+        if v == target:
+            return time_s
+        if time_s > times[v]:
+            continue
+        for w, seconds in adjacency.get(v, ()):
+            if time_s + seconds < times.get(w, float("inf")):
+                times[w] = time_s + seconds
+                heapq.heappush(heap, (time_s + seconds, w))
+    return float("inf")
+
+
+def main(size: int):
+    builder = make_city(size)
+    rng = np.random.default_rng(7)
+    extent = (size - 1) * BLOCK_DEGREES
+
+    start = time.perf_counter()
+    graph = builder.build()
+    print(
+        f"📊 {graph.nodes:,} nodes, {len(builder.edges):,} edges -> {len(graph.up):,} up / "
+        f"{len(graph.down):,} down ({time.perf_counter() - start:.1f}s build)"
+    )
+
+    for fraction in [0.1, 0.3, 1.0]:
+        span = extent * fraction / 1.5
+        starts = rng.uniform(28.5, 28.5 + extent - span, (QUERIES, 2)) + [0, 77.1 - 28.5]
+        ends = starts + rng.uniform(0, span, (QUERIES, 2))
+        latencies = []
+        for (lat1, lon1), (lat2, lon2) in zip(starts.tolist(), ends.tolist()):
+            t0 = time.perf_counter()
+            graph.route(lat1, lon1, lat2, lon2)
+            latencies.append(time.perf_counter() - t0)
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1e6
+        print(f"  up to {span * 111:5.1f} km  p50 {p50:9.1f} µs  p95 {p95:9.1f} µs")
+
+    # Spot-check routes against the uncontracted graph
+    for source, target in rng.integers(0, graph.nodes, (20, 2)).tolist():
+        expected = dijkstra_seconds(builder, source, target)
+        _, seconds = graph.shortest_path(source, target)
+        assert abs(seconds - expected) <= 1e-3 * expected + 1e-3, (source, target, seconds, expected)
+    print("  ✅ 20 routes match Dijkstra")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,61 @@
+"""
+Script to build the road graph for road-distance ETAs (ROAD_GRAPH_PATH)
+Reads a GeoJSON road extract (LineString features with OSM highway,
+maxspeed, oneway and junction properties, e.g. an Overpass or osmium
+export of highway=* ways), contracts it into a routing hierarchy and writes
+the graph file (see tracking.routing). Restart the API servers to pick it up.
+
+Usage:
+    python build_road_graph.py roads.geojson
+"""
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# tracking.routing reads its settings on import
+load_dotenv()
+
+from tracking.routing import ROAD_GRAPH_PATH, RoadGraphBuilder
+
+
+def build_road_graph(source: str):
+    """Convert a GeoJSON road extract to the graph file"""
+    try:
+        output = ROAD_GRAPH_PATH or "road_graph.bin"
+        print(f"📂 Reading {source}")
+        with open(source) as f:
+            geojson = json.load(f)
+
+        builder = RoadGraphBuilder()
+        edges = builder.add_geojson(geojson)
+        print(f"  ✅ {len(builder.latitude)} nodes, {edges} edges")
+
+        start = time.perf_counter()
+        graph = builder.build()
+        print(f"  ✅ Contracted in {time.perf_counter() - start:.1f}s: {len(graph.up)} up and {len(graph.down)} down edges")
+
+        graph.write(output)
+        print(f"  ✅ Wrote {output} ({os.path.getsize(output)} bytes)")
+        if not ROAD_GRAPH_PATH:
+            print(f"  ℹ️ Set ROAD_GRAPH_PATH={output} to use it")
+
+        print()
+        print("✅ Done!")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    print("=" * 60)
+    print("🛣️ Road Graph Build")
+    print("=" * 60)
+    print()
+    build_road_graph(sys.argv[1])
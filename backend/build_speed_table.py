@@ -0,0 +1,95 @@
+"""
+Script to build the historical travel-speed table for ETA_MODE=historical
+Aggregates the tracks of delivered packages into per (geohash cell,
+hour-of-week) speeds and writes SPEED_TABLE_PATH (see tracking.speed_table).
+
+By default the existing table is updated with packages delivered since it
+was last built; --full rebuilds it from all delivered packages. Restart the
+API servers to pick up the new table.
+"""
+import asyncio
+import os
+import sys
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# tracking.storage and tracking.speed_table read their settings on import
+load_dotenv()
+
+from tracking.storage import iter_route_locations
+from tracking.speed_table import (
+    SPEED_TABLE_PATH,
+    SPEED_TABLE_PRECISION,
+    SpeedTable,
+    SpeedTableBuilder
+)
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "track_order")
+
+
+async def read_track(db, package: dict) -> list[dict]:
+    """Read a package's whole track, including an archived one"""
+    points = []
+    async for batch in iter_route_locations(db, package["_id"], archived=bool(package.get("archived_at"))):
+        points.extend(batch)
+    return points
+
+
+async def build_speed_table(full: bool = False):
+    """Add delivered packages' tracks to the speed table"""
+    try:
+        client = AsyncIOMotorClient(MONGODB_URI)
+        db = client[DATABASE_NAME]
+
+        print("🔌 Connected to MongoDB")
+        print(f"📊 Database: {DATABASE_NAME}")
+        print()
+
+        if not full and os.path.exists(SPEED_TABLE_PATH):
+            builder = SpeedTableBuilder.from_table(SpeedTable.open(SPEED_TABLE_PATH))
+            print(f"📂 Updating {SPEED_TABLE_PATH}: {len(builder.totals)} cells, built until {builder.built_until}")
+        else:
+            builder = SpeedTableBuilder(precision=SPEED_TABLE_PRECISION)
+            print(f"🆕 Building {SPEED_TABLE_PATH} from all deliveries")
+
+        # Delivered is final and delivered_at never moves, so each package is
+        # added exactly once (updated_at also changes when a package is edited)
+        query = {"status": "delivered"}
+        if builder.built_until is not None:
+            query["$or"] = [
+                {"delivered_at": {"$gt": builder.built_until}},
+                # Delivered before delivered_at was recorded
+                {"delivered_at": {"$exists": False}, "updated_at": {"$gt": builder.built_until}}
+            ]
+
+        packages = 0
+        segments = 0
+        async for package in db.packages.find(query):
+            segments += builder.add_track(await read_track(db, package))
+            delivered_at = package.get("delivered_at") or package["updated_at"]
+            if builder.built_until is None or delivered_at > builder.built_until:
+                builder.built_until = delivered_at
+            packages += 1
+
+        print(f"  ✅ Added {segments} segments from {packages} delivered packages")
+        builder.write(SPEED_TABLE_PATH)
+        print(f"  ✅ Wrote {len(builder.totals)} cells to {SPEED_TABLE_PATH} ({os.path.getsize(SPEED_TABLE_PATH)} bytes)")
+
+        client.close()
+        print()
+        print("✅ Done!")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    full = "--full" in sys.argv
+    print("=" * 60)
+    print("🚦 Speed Table Build: " + ("full" if full else "incremental"))
+    print("=" * 60)
+    print()
+    asyncio.run(build_speed_table(full))
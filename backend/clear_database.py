@@ -1,6 +1,6 @@
 """
 Script to clear all data from the database
-WARNING: This will delete all users, packages, location updates, and predictions
+WARNING: This will delete all users, packages, location updates (documents and buckets), archived tracks, and predictions
 """
 import asyncio
 import os
@@ -30,6 +30,8 @@ async def clear_database():
             "users",
             "packages",
             "location_updates",
+            "location_buckets",
+            "location_archives",
             "predictions"
         ]
         
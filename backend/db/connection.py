@@ -13,10 +13,15 @@ class MongoDB:
 
 db = MongoDB()
 
-async def connect_to_mongo():
-    """Create database connection"""
+async def connect_to_mongo(event_listeners: Optional[list] = None):
+    """
+    Create database connection
+    
+    Args:
+        event_listeners: Optional pymongo monitoring listeners (e.g. command counters in tests)
+    """
     mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-    db.client = AsyncIOMotorClient(mongodb_uri)
+    db.client = AsyncIOMotorClient(mongodb_uri, event_listeners=event_listeners or [])
     database_name = os.getenv("DATABASE_NAME", "track_order")
     return db.client[database_name]
 
@@ -0,0 +1,148 @@
+"""
+Index manager: declares every collection index in one place and builds
+missing ones once at startup (instead of per-request create_index calls)
+"""
+import logging
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from db.connection import get_database
+
+logger = logging.getLogger(__name__)
+
+
+# Declared indexes per collection. Names match the pymongo defaults so
+# indexes created by earlier versions are recognised as already present.
+INDEXES: dict[str, list[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_1", unique=True),
+    ],
+    "packages": [
+        IndexModel([("tracking_id", ASCENDING)], name="tracking_id_1", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id_1"),
+        IndexModel([("status", ASCENDING)], name="status_1"),
+        IndexModel([("created_at", DESCENDING)], name="created_at_-1"),
+    ],
+    "location_updates": [
+        # Route history in (timestamp, _id) keyset order; the prefixes also
+        # serve package_id-only and (package_id, timestamp) lookups
+        IndexModel(
+            [("package_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+            name="package_id_1_timestamp_1__id_1"
+        ),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp_1"),
+        # Retried uploads (only points that carry a key are indexed)
+        IndexModel(
+            [("idempotency_key", ASCENDING)],
+            name="idempotency_key_1",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}}
+        ),
+    ],
+    "location_buckets": [
+        # Bucketed history layout (LOCATION_STORAGE_MODE=buckets)
+        IndexModel(
+            [("package_id", ASCENDING), ("hour", ASCENDING), ("max_timestamp", ASCENDING)],
+            name="package_id_1_hour_1_max_timestamp_1"
+        ),
+    ],
+    "location_archives": [
+        # Cold archive tier: one compressed track per delivered package
+        IndexModel([("package_id", ASCENDING)], name="package_id_1", unique=True),
+    ],
+    "predictions": [
+        IndexModel([("package_id", ASCENDING)], name="package_id_1", unique=True),
+    ],
+}
+
+# Indexes replaced by a declared index: collection -> {old name: new name}.
+# The old index is dropped once its replacement exists, so deployments do
+# not keep paying for both on every write.
+SUPERSEDED_INDEXES: dict[str, dict[str, str]] = {
+    "location_updates": {
+        # (package_id, timestamp) is a prefix of the keyset pagination index
+        "package_id_1_timestamp_1": "package_id_1_timestamp_1__id_1",
+    },
+}
+
+
+async def get_missing_indexes(db, collection_name: str) -> list[IndexModel]:
+    """
+    Diff the declared indexes of a collection against list_indexes()
+
+    Returns:
+        Declared indexes that do not exist yet
+    """
+    existing = {}
+    async for index in db[collection_name].list_indexes():
+        existing[index["name"]] = index
+
+    missing = []
+    for model in INDEXES.get(collection_name, []):
+        spec = model.document
+        current = existing.get(spec["name"])
+        if current is None:
+            missing.append(model)
+        elif dict(current["key"]) != dict(spec["key"]) or current.get("unique", False) != spec.get("unique", False):
+            logger.warning(
+                f"Index {collection_name}.{spec['name']} differs from its declaration; "
+                f"drop it manually to rebuild"
+            )
+    return missing
+
+
+async def drop_superseded_indexes(db, collection_name: str) -> list[str]:
+    """
+    Drop indexes of a collection whose replacement has been built
+
+    Returns:
+        Names of the dropped indexes
+    """
+    superseded = SUPERSEDED_INDEXES.get(collection_name)
+    if not superseded:
+        return []
+    existing = set()
+    async for index in db[collection_name].list_indexes():
+        existing.add(index["name"])
+
+    dropped = []
+    for old_name, new_name in superseded.items():
+        if old_name in existing and new_name in existing:
+            await db[collection_name].drop_index(old_name)
+            dropped.append(old_name)
+            logger.info(f"Dropped index {collection_name}.{old_name} (superseded by {new_name})")
+    return dropped
+
+
+async def ensure_indexes() -> dict[str, list[str]]:
+    """
+    Build every declared index that is missing (called once from lifespan)
+
+    Returns:
+        Mapping of collection name -> names of indexes that were created
+    """
+    db = get_database()
+    created: dict[str, list[str]] = {}
+
+    for collection_name in INDEXES:
+        try:
+            missing = await get_missing_indexes(db, collection_name)
+            if not missing:
+                await drop_superseded_indexes(db, collection_name)
+                continue
+            # background=True keeps pre-4.2 servers from locking the collection;
+            # newer servers ignore it and always use an optimized build
+            models = [
+                IndexModel(
+                    list(model.document["key"].items()),
+                    **{k: v for k, v in model.document.items() if k != "key"},
+                    background=True
+                )
+                for model in missing
+            ]
+            names = await db[collection_name].create_indexes(models)
+            created[collection_name] = names
+            logger.info(f"Created indexes on {collection_name}: {', '.join(names)}")
+            await drop_superseded_indexes(db, collection_name)
+        except Exception as e:
+            logger.error(f"Error ensuring indexes on {collection_name}: {e}")
+
+    return created
@@ -0,0 +1,112 @@
+"""
+Script to import depot, hub and restricted-zone geofences
+Reads a GeoJSON FeatureCollection: Polygon / MultiPolygon features, or Point
+features with a radius_m property, each with kind (depot, hub or
+restricted) and name properties. Fences are upserted by name (unnamed ones
+are inserted); --replace deletes all existing fences first. Every fence is
+validated before anything is written. Restart the API servers to pick up
+the new fences.
+
+Usage:
+    python import_geofences.py fences.geojson [--replace]
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, UpdateOne
+
+# tracking.geofence reads its settings on import
+load_dotenv()
+
+from tracking.geofence import GEOFENCES_COLLECTION, RESTRICTED, Geofence
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "track_order")
+
+
+def feature_document(feature: dict) -> dict:
+    """geofences document for a GeoJSON feature (validated)"""
+    properties = feature.get("properties") or {}
+    document = {
+        "_id": ObjectId(),
+        "name": properties.get("name", ""),
+        "kind": properties.get("kind", RESTRICTED),
+        "geometry": feature.get("geometry"),
+        "updated_at": datetime.utcnow()
+    }
+    if properties.get("radius_m") is not None:
+        document["radius_m"] = float(properties["radius_m"])
+    Geofence.from_document(document)
+    return document
+
+
+async def import_geofences(source: str, replace: bool = False):
+    """Write the fences of a GeoJSON file to the geofences collection"""
+    try:
+        print(f"📂 Reading {source}")
+        with open(source) as f:
+            features = json.load(f).get("features", [])
+
+        documents = []
+        for number, feature in enumerate(features, 1):
+            try:
+                documents.append(feature_document(feature))
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                print(f"  ❌ Feature {number}: {e}")
+        if len(documents) < len(features):
+            print("❌ Nothing imported; fix the features above")
+            return
+        print(f"  ✅ {len(documents)} valid fences")
+
+        client = AsyncIOMotorClient(MONGODB_URI)
+        db = client[DATABASE_NAME]
+
+        print("🔌 Connected to MongoDB")
+        print(f"📊 Database: {DATABASE_NAME}")
+        print()
+
+        collection = db[GEOFENCES_COLLECTION]
+        if replace:
+            result = await collection.delete_many({})
+            print(f"  🗑️ Deleted {result.deleted_count} existing fences")
+
+        operations = []
+        for document in documents:
+            if document["name"]:
+                fields = {key: value for key, value in document.items() if key != "_id"}
+                update = {"$set": fields}
+                if "radius_m" not in fields:
+                    update["$unset"] = {"radius_m": ""}
+                operations.append(UpdateOne({"name": document["name"]}, update, upsert=True))
+            else:
+                operations.append(InsertOne(document))
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        print(f"  ✅ Imported {len(operations)} fences ({await collection.count_documents({})} in total)")
+
+        client.close()
+        print()
+        print("✅ Done!")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    if not arguments:
+        print(__doc__)
+        sys.exit(1)
+    replace = "--replace" in sys.argv
+    print("=" * 60)
+    print("📍 Geofence Import" + (": replace" if replace else ""))
+    print("=" * 60)
+    print()
+    asyncio.run(import_geofences(arguments[0], replace))
@@ -5,10 +5,19 @@ Smart Package / Delivery Tracking System
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
-from db.connection import connect_to_mongo, close_mongo_connection
+from db.connection import connect_to_mongo, close_mongo_connection, get_database
+from db.indexes import ensure_indexes
+from tracking.buffer import location_buffer
+from tracking.ratelimit import point_coalescer
+from tracking.eta import ETA_MODE
+from tracking.speed_table import load_speed_table
+from tracking.routing import load_road_graph, ROAD_GRAPH_PATH
+from tracking.predictions import eta_scheduler, ETA_SCHEDULER_ENABLED
+from tracking.geofence import load_geofences
 from auth.register import router as register_router
 from auth.login import router as login_router
 from auth.me import router as me_router
@@ -23,8 +32,26 @@ async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
     print("✅ Connected to MongoDB")
+    # Build missing indexes without delaying startup
+    index_task = asyncio.create_task(ensure_indexes())
+    if ETA_MODE == "historical" and load_speed_table() is not None:
+        print("✅ Loaded historical speed table")
+    if ROAD_GRAPH_PATH and load_road_graph() is not None:
+        print("✅ Loaded road graph")
+    fences = await load_geofences(get_database())
+    if fences:
+        print(f"✅ Loaded {fences} geofences")
+    if ETA_SCHEDULER_ENABLED:
+        eta_scheduler.start()
+        print("✅ Started ETA scheduler")
     yield
     # Shutdown
+    await eta_scheduler.close()
+    if not index_task.done():
+        index_task.cancel()
+    await point_coalescer.close()
+    await location_buffer.close()
+    print("✅ Flushed location write buffer")
     await close_mongo_connection()
     print("✅ Disconnected from MongoDB")
 
@@ -0,0 +1,144 @@
+"""
+Script to convert location history between storage layouts
+Copies one-document-per-point location_updates into per-package, per-hour
+location_buckets (or back with --reverse). Set LOCATION_STORAGE_MODE to the
+new layout once the migration has finished.
+"""
+import asyncio
+import os
+import sys
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from tracking.storage import (
+    LOCATIONS_COLLECTION,
+    BUCKETS_COLLECTION,
+    LOCATION_BUCKET_SIZE,
+    POINT_FIELDS,
+    bucket_hour,
+    unpack_bucket
+)
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "track_order")
+
+
+def build_buckets(package_id, points: list[dict]) -> list[dict]:
+    """Group a package's points (sorted by timestamp) into hour buckets of at most LOCATION_BUCKET_SIZE"""
+    buckets = []
+    current = None
+    for point in points:
+        hour = bucket_hour(point["timestamp"])
+        if current is None or current["hour"] != hour or current["count"] >= LOCATION_BUCKET_SIZE:
+            current = {
+                "package_id": package_id,
+                "hour": hour,
+                "count": 0,
+                "min_timestamp": point["timestamp"],
+                "max_timestamp": point["timestamp"],
+                "points": []
+            }
+            buckets.append(current)
+        current["points"].append({field: point[field] for field in POINT_FIELDS})
+        current["count"] += 1
+        current["max_timestamp"] = point["timestamp"]
+    return buckets
+
+
+async def to_buckets(db):
+    """Copy location_updates into location_buckets, one package at a time"""
+    source = db[LOCATIONS_COLLECTION]
+    target = db[BUCKETS_COLLECTION]
+    package_ids = await source.distinct("package_id")
+    print(f"📦 Converting {len(package_ids)} packages")
+
+    converted = 0
+    for package_id in package_ids:
+        cursor = source.find({"package_id": package_id}).sort("timestamp", 1)
+        points = await cursor.to_list(length=None)
+        # Re-running the migration replaces a package's buckets
+        await target.delete_many({"package_id": package_id})
+        buckets = build_buckets(package_id, points)
+        if buckets:
+            await target.insert_many(buckets, ordered=True)
+        converted += len(points)
+    print(f"  ✅ Wrote {converted} points into {await target.count_documents({})} buckets")
+    return converted
+
+
+async def to_documents(db):
+    """Copy location_buckets back into location_updates"""
+    source = db[BUCKETS_COLLECTION]
+    target = db[LOCATIONS_COLLECTION]
+    package_ids = await source.distinct("package_id")
+    print(f"📦 Converting {len(package_ids)} packages")
+
+    converted = 0
+    for package_id in package_ids:
+        await target.delete_many({"package_id": package_id})
+        documents = []
+        async for bucket in source.find({"package_id": package_id}).sort("hour", 1):
+            documents.extend(unpack_bucket(bucket))
+        if documents:
+            await target.insert_many(documents, ordered=True)
+        converted += len(documents)
+    print(f"  ✅ Wrote {converted} point documents")
+    return converted
+
+
+async def count_points(db, in_buckets: bool) -> int:
+    """Count stored points in either layout"""
+    if not in_buckets:
+        return await db[LOCATIONS_COLLECTION].count_documents({})
+    result = await db[BUCKETS_COLLECTION].aggregate([
+        {"$group": {"_id": None, "points": {"$sum": "$count"}}}
+    ]).to_list(length=1)
+    return result[0]["points"] if result else 0
+
+
+async def migrate(reverse: bool = False):
+    """Run the migration and optionally clear the source collection"""
+    try:
+        client = AsyncIOMotorClient(MONGODB_URI)
+        db = client[DATABASE_NAME]
+
+        print("🔌 Connected to MongoDB")
+        print(f"📊 Database: {DATABASE_NAME}")
+        print()
+
+        source_name = BUCKETS_COLLECTION if reverse else LOCATIONS_COLLECTION
+        source_count = await count_points(db, reverse)
+        converted = await (to_documents(db) if reverse else to_buckets(db))
+
+        if converted != source_count:
+            print(f"⚠️  Converted {converted} points but {source_name} holds {source_count}; keeping source data")
+            client.close()
+            return
+
+        print()
+        response = input(f"Delete the old {source_name} data? (yes/no): ")
+        if response.lower() in ["yes", "y"]:
+            result = await db[source_name].delete_many({})
+            print(f"  ✅ Deleted {result.deleted_count} documents from {source_name}")
+        else:
+            print(f"ℹ️  Kept {source_name}")
+
+        client.close()
+        print()
+        print("✅ Done!")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    reverse = "--reverse" in sys.argv
+    print("=" * 60)
+    print("🔁 Location History Migration: " + ("buckets -> documents" if reverse else "documents -> buckets"))
+    print("=" * 60)
+    print()
+    asyncio.run(migrate(reverse))
@@ -0,0 +1,72 @@
+"""
+Fast JSON serialization for list responses
+
+Endpoints returning many rows read straight from MongoDB can skip building
+(and FastAPI re-validating) a Pydantic model per row. The row mappers below
+turn documents into dicts with the same fields, order and value formats as
+the response models, and FastJSONResponse encodes them with orjson.
+Routes keep their response_model, so the OpenAPI schema is unchanged.
+"""
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+
+# UTC-aware datetimes end in "Z", like Pydantic's output
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    """Encode content (ObjectId and datetime aware) to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson, bypassing response_model validation"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def location_row(location: dict, package_id: str) -> dict:
+    """Map a location document like LocationUpdateResponse"""
+    return {
+        "id": str(location["_id"]),
+        "package_id": package_id,
+        "latitude": float(location["latitude"]),
+        "longitude": float(location["longitude"]),
+        "timestamp": location["timestamp"],
+        "created_at": location["created_at"]
+    }
+
+
+def contact_row(contact: dict) -> dict:
+    """Map a sender/recipient subdocument like SenderRecipient"""
+    return {
+        "name": contact["name"],
+        "address": contact["address"],
+        "phone": contact["phone"],
+        # Old packages have no coordinates
+        "latitude": float(contact.get("latitude", 0.0)),
+        "longitude": float(contact.get("longitude", 0.0))
+    }
+
+
+def package_row(package: dict) -> dict:
+    """Map a package document like PackageResponse"""
+    return {
+        "id": str(package["_id"]),
+        "tracking_id": package["tracking_id"],
+        "sender": contact_row(package["sender"]),
+        "recipient": contact_row(package["recipient"]),
+        "status": package["status"],
+        "user_id": str(package["user_id"]),
+        "created_at": package["created_at"],
+        "updated_at": package["updated_at"]
+    }
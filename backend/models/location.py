@@ -6,6 +6,9 @@ from typing import Optional
 from datetime import datetime
 from bson import ObjectId
 
+# Maximum number of points in one batch upload
+MAX_BATCH_POINTS = 5000
+
 
 # Pydantic Schemas
 class LocationUpdateCreate(BaseModel):
@@ -13,6 +16,9 @@ class LocationUpdateCreate(BaseModel):
     latitude: float = Field(..., ge=-90, le=90, description="Latitude coordinate")
     longitude: float = Field(..., ge=-180, le=180, description="Longitude coordinate")
     timestamp: Optional[datetime] = Field(default=None, description="Timestamp of location (defaults to now)")
+    idempotency_key: Optional[str] = Field(default=None, max_length=128, description="Client-supplied key; retries with the same key are not stored twice")
+    device_id: Optional[str] = Field(default=None, max_length=64, description="Courier device ID (with sequence, an alternative idempotency key)")
+    sequence: Optional[int] = Field(default=None, ge=0, description="Per-device upload sequence number")
 
 
 class LocationUpdateResponse(BaseModel):
@@ -35,8 +41,29 @@ class RouteHistoryResponse(BaseModel):
     tracking_id: str
     locations: list[LocationUpdateResponse]
     total: int
+    next_cursor: Optional[str] = Field(default=None, description="Pass as cursor to fetch the points after this page")
+    has_more: bool = Field(default=False, description="Whether more points match beyond this page")
+    polyline: Optional[str] = Field(default=None, description="Google encoded polyline (format=polyline); locations is then empty")
 
     class Config:
         from_attributes = True
         json_encoders = {ObjectId: str}
 
+
+
+class LocationBatchItem(LocationUpdateCreate):
+    """Schema for a single point in a batch location upload"""
+    tracking_id: str = Field(..., description="Package tracking ID")
+
+
+class LocationBatchCreate(BaseModel):
+    """Schema for a batch of buffered location updates (one or many packages)"""
+    updates: list[LocationBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_POINTS)
+
+
+class LocationBatchResponse(BaseModel):
+    """Schema for batch location upload response"""
+    locations: list[LocationUpdateResponse]
+    total: int
+    dropped: int = 0
+    duplicates: int = 0
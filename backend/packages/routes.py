@@ -5,10 +5,12 @@ from fastapi import APIRouter, HTTPException, status, Depends, Query
 from db.connection import get_database
 from models.package import PackageCreate, PackageUpdate, PackageResponse, PackageListResponse
 from models.user import UserResponse
+from models.fast_json import FastJSONResponse, package_row
 from auth.dependencies import get_current_active_user, require_role
 from packages.utils import generate_tracking_id
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
 from typing import Optional
 
 router = APIRouter(prefix="/api/packages", tags=["packages"])
@@ -65,19 +67,9 @@ async def create_package(
         "updated_at": datetime.utcnow()
     }
     
-    # Insert package into database
-    result = await packages_collection.insert_one(package_doc)
-    
-    # Create indexes if they don't exist
-    try:
-        await packages_collection.create_index("tracking_id", unique=True)
-        await packages_collection.create_index("user_id")
-        await packages_collection.create_index("status")
-    except Exception:
-        pass  # Indexes might already exist
-    
-    # Fetch created package
-    created_package = await packages_collection.find_one({"_id": result.inserted_id})
+    # Insert package into database (insert_one sets _id on package_doc)
+    await packages_collection.insert_one(package_doc)
+    created_package = package_doc
     
     # Ensure latitude/longitude exist (should already be there from new packages)
     sender = created_package["sender"].copy() if isinstance(created_package["sender"], dict) else created_package["sender"]
@@ -182,36 +174,14 @@ async def list_packages(
     cursor = packages_collection.find(query).sort("created_at", -1)
     packages = await cursor.to_list(length=100)
     
-    package_list = []
-    for pkg in packages:
-        # Handle missing latitude/longitude in old packages
-        sender = pkg["sender"].copy() if isinstance(pkg["sender"], dict) else pkg["sender"]
-        recipient = pkg["recipient"].copy() if isinstance(pkg["recipient"], dict) else pkg["recipient"]
-        
-        if isinstance(sender, dict):
-            sender.setdefault("latitude", 0.0)
-            sender.setdefault("longitude", 0.0)
-        if isinstance(recipient, dict):
-            recipient.setdefault("latitude", 0.0)
-            recipient.setdefault("longitude", 0.0)
-        
-        package_list.append(
-            PackageResponse(
-                id=str(pkg["_id"]),
-                tracking_id=pkg["tracking_id"],
-                sender=sender,
-                recipient=recipient,
-                status=pkg["status"],
-                user_id=str(pkg["user_id"]),
-                created_at=pkg["created_at"],
-                updated_at=pkg["updated_at"]
-            )
-        )
+    # Serialize the documents directly (same shape as PackageListResponse);
+    # row mapping also defaults latitude/longitude missing in old packages
+    package_list = [package_row(pkg) for pkg in packages]
     
-    return PackageListResponse(
-        packages=package_list,
-        total=len(package_list)
-    )
+    return FastJSONResponse({
+        "packages": package_list,
+        "total": len(package_list)
+    })
 
 
 @router.put("/{tracking_id}", response_model=PackageResponse)
@@ -233,14 +203,6 @@ async def update_package(
     
     packages_collection = db.packages
     
-    # Find package
-    package = await packages_collection.find_one({"tracking_id": tracking_id})
-    if not package:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Package not found"
-        )
-    
     # Build update document
     update_doc = {"updated_at": datetime.utcnow()}
     if package_update.sender:
@@ -250,14 +212,17 @@ async def update_package(
     if package_update.status:
         update_doc["status"] = package_update.status
     
-    # Update package
-    await packages_collection.update_one(
+    # Update package and get the updated document in one round trip
+    updated_package = await packages_collection.find_one_and_update(
         {"tracking_id": tracking_id},
-        {"$set": update_doc}
+        {"$set": update_doc},
+        return_document=ReturnDocument.AFTER
     )
-    
-    # Fetch updated package
-    updated_package = await packages_collection.find_one({"tracking_id": tracking_id})
+    if not updated_package:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Package not found"
+        )
     
     # Handle missing latitude/longitude in old packages
     sender = updated_package["sender"].copy() if isinstance(updated_package["sender"], dict) else updated_package["sender"]
@@ -294,7 +259,7 @@ async def update_package_status_endpoint(
     - **tracking_id**: Package tracking ID
     - **new_status**: New status (registered, in_transit, delivered)
     """
-    from packages.status import can_transition, update_package_status
+    from packages.status import update_package_status
     
     try:
         db = get_database()
@@ -304,41 +269,36 @@ async def update_package_status_endpoint(
             detail=f"Database connection error: {str(e)}"
         )
     
-    packages_collection = db.packages
-    
-    # Find package
-    package = await packages_collection.find_one({"tracking_id": tracking_id})
-    if not package:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Package not found"
-        )
-    
-    # Validate status
+    # Validate status (an unknown package is reported first)
     if new_status not in ["registered", "in_transit", "delivered"]:
+        if not await db.packages.find_one({"tracking_id": tracking_id}, projection={"_id": 1}):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Package not found"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid status. Must be one of: registered, in_transit, delivered"
         )
     
-    # Validate transition
-    current_status = package["status"]
-    if not can_transition(current_status, new_status):
+    # Validate and apply the transition in a single conditional update
+    result = await update_package_status(tracking_id, new_status, current_user.id)
+    if result.reason == "not_found":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Package not found"
+        )
+    if result.reason == "rejected":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot transition from {current_status} to {new_status}"
+            detail=f"Cannot transition from {result.current_status} to {new_status}"
         )
-    
-    # Update status
-    success = await update_package_status(tracking_id, new_status, current_user.id)
-    if not success:
+    if not result.ok:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update package status"
         )
-    
-    # Fetch updated package
-    updated_package = await packages_collection.find_one({"tracking_id": tracking_id})
+    updated_package = result.package
     
     # Handle missing latitude/longitude in old packages
     sender = updated_package["sender"].copy() if isinstance(updated_package["sender"], dict) else updated_package["sender"]
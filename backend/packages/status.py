@@ -2,9 +2,12 @@
 Status transition logic for packages
 """
 from typing import Optional
+from dataclasses import dataclass
 from datetime import datetime
 from db.connection import get_database
+from tracking.geofence import ENTER, EXIT, SENDER, RECIPIENT, DEPOT, HUB
 from bson import ObjectId
+from pymongo import ReturnDocument
 import logging
 
 logger = logging.getLogger(__name__)
@@ -93,13 +96,73 @@ def should_auto_transition_to_delivered(
     return distance <= distance_threshold_km
 
 
+def geofence_transitions(current_status: str, events: list, delivered_on: str = ENTER) -> list[str]:
+    """
+    Status transitions triggered by a ping's geofence events
+    
+    Leaving the sender or a depot, or entering a hub, puts a registered
+    package in transit; entering (or, with delivered_on="dwell", dwelling
+    in) the recipient fence delivers it.
+    
+    Args:
+        current_status: Current package status
+        events: GeofenceEvents of the ping
+        delivered_on: Recipient fence event type that means delivered
+    
+    Returns:
+        New statuses to apply in order (possibly none)
+    """
+    transitions = []
+    status = current_status
+    if status == "registered" and any(
+        (event.type == EXIT and event.kind in (SENDER, DEPOT)) or (event.type == ENTER and event.kind == HUB)
+        for event in events
+    ):
+        transitions.append("in_transit")
+        status = "in_transit"
+    if status == "in_transit" and any(
+        event.type == delivered_on and event.kind == RECIPIENT for event in events
+    ):
+        transitions.append("delivered")
+    return transitions
+
+
+@dataclass
+class TransitionResult:
+    """Outcome of a status transition attempt"""
+    package: Optional[dict] = None  # Updated package document on success
+    reason: Optional[str] = None  # "not_found", "rejected" or "error" on failure
+    current_status: Optional[str] = None  # Status that blocked a rejected transition
+
+    @property
+    def ok(self) -> bool:
+        return self.package is not None
+
+
+def allowed_source_states(new_status: str) -> list[str]:
+    """
+    Get the statuses a package may be in to transition to new_status
+    
+    Args:
+        new_status: Desired new status
+    
+    Returns:
+        List of source statuses from VALID_TRANSITIONS
+    """
+    return [source for source, targets in VALID_TRANSITIONS.items() if new_status in targets]
+
+
 async def update_package_status(
     tracking_id: str,
     new_status: str,
     user_id: Optional[str] = None
-) -> bool:
+) -> TransitionResult:
     """
-    Update package status with validation
+    Atomically update package status with validation
+    
+    The transition is a single conditional update whose filter only matches
+    packages in an allowed source state, so concurrent pings cannot apply
+    an invalid transition.
     
     Args:
         tracking_id: Package tracking ID
@@ -107,36 +170,39 @@ async def update_package_status(
         user_id: Optional user ID for logging
     
     Returns:
-        True if status was updated, False otherwise
+        TransitionResult with the updated document, or the rejection reason
     """
     try:
         db = get_database()
         packages_collection = db.packages
         
-        # Find package
-        package = await packages_collection.find_one({"tracking_id": tracking_id})
-        if not package:
-            return False
-        
-        current_status = package["status"]
-        
-        # Validate transition
-        if not can_transition(current_status, new_status):
-            return False
+        now = datetime.utcnow()
+        fields = {"status": new_status, "updated_at": now}
+        if new_status == "delivered":
+            # Unlike updated_at, later edits of the package do not move it
+            fields["delivered_at"] = now
         
-        # Update status
-        await packages_collection.update_one(
-            {"tracking_id": tracking_id},
+        updated_package = await packages_collection.find_one_and_update(
             {
-                "$set": {
-                    "status": new_status,
-                    "updated_at": datetime.utcnow()
-                }
-            }
+                "tracking_id": tracking_id,
+                "status": {"$in": allowed_source_states(new_status)}
+            },
+            {"$set": fields},
+            return_document=ReturnDocument.AFTER
         )
+        if updated_package:
+            if user_id:
+                logger.info(f"User {user_id} changed package {tracking_id} status to {new_status}")
+            return TransitionResult(package=updated_package)
         
-        return True
+        # Slow path (rejections only): find out why the filter did not match
+        package = await packages_collection.find_one(
+            {"tracking_id": tracking_id},
+            projection={"status": 1}
+        )
+        if not package:
+            return TransitionResult(reason="not_found")
+        return TransitionResult(reason="rejected", current_status=package["status"])
     except Exception as e:
         logger.error(f"Error updating package status: {e}")
-        return False
-
+        return TransitionResult(reason="error")
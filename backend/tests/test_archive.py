@@ -0,0 +1,83 @@
+"""
+Unit tests for the cold archive tier
+"""
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+from tracking.archive import pack_route, unpack_route, archive_document
+from tracking.route_cache import RouteColumns
+from tracking.storage import _merge_points
+
+START = datetime(2024, 1, 1, 10, 0)
+
+
+def make_point(package_id, seconds, latitude=28.65):
+    ts = START + timedelta(seconds=seconds, milliseconds=seconds * 7 % 1000)
+    return {
+        "_id": ObjectId(),
+        "package_id": package_id,
+        "latitude": latitude + seconds * 1e-5,
+        "longitude": 77.20 - seconds * 1e-5,
+        "timestamp": ts,
+        "created_at": ts + timedelta(milliseconds=350)
+    }
+
+
+def make_route(points):
+    route = RouteColumns(points[0]["package_id"] if points else ObjectId())
+    for point in points:
+        route.append(point)
+    return route
+
+
+def test_pack_round_trip():
+    """Test an archived track decodes to the original documents"""
+    package_id = ObjectId()
+    points = [make_point(package_id, i * 5) for i in range(500)]
+    blob = pack_route(make_route(points))
+
+    route = unpack_route(blob, package_id)
+    assert route.documents(0, len(route)) == points
+    # Smaller than the raw columns (44 bytes per point)
+    assert len(blob) < 44 * len(points)
+
+
+def test_pack_empty_route():
+    """Test an empty track round-trips"""
+    route = unpack_route(pack_route(RouteColumns(ObjectId())), ObjectId())
+    assert len(route) == 0
+
+
+def test_unpack_rejects_corrupt_blob():
+    """Test corrupt archives raise ValueError"""
+    package_id = ObjectId()
+    blob = pack_route(make_route([make_point(package_id, 0)]))
+    with pytest.raises(ValueError):
+        unpack_route(b"XXXX" + blob[4:], package_id)
+    with pytest.raises(ValueError):
+        unpack_route(blob[:-3], package_id)
+
+
+def test_archive_document():
+    """Test the archive document records the track's extent"""
+    package_id = ObjectId()
+    points = [make_point(package_id, i) for i in range(3)]
+    document = archive_document({"_id": package_id, "tracking_id": "TRK1"}, make_route(points))
+
+    assert document["package_id"] == package_id
+    assert document["count"] == 3
+    assert document["min_timestamp"] == points[0]["timestamp"]
+    assert document["max_timestamp"] == points[-1]["timestamp"]
+    assert unpack_route(bytes(document["data"]), package_id).documents(0, 3) == points
+
+
+def test_merge_points_drops_duplicates():
+    """Test archived and hot points merge in order without duplicates"""
+    package_id = ObjectId()
+    points = [make_point(package_id, i) for i in range(6)]
+    archived = points[:4]
+    # Point 3 was archived by an interrupted run but not deleted yet
+    hot = points[3:]
+
+    assert _merge_points(archived, hot) == points
+    assert _merge_points([points[1], points[4]], [points[0], points[2]]) == [points[i] for i in (0, 1, 2, 4)]
@@ -0,0 +1,55 @@
+"""
+Unit tests for the ETA backtesting harness
+"""
+import pytest
+from datetime import datetime, timedelta
+from benchmarks.backtest_eta import (
+    ConstantEstimator,
+    VectorizedEstimator,
+    arrival_time,
+    backtest,
+    check_gates,
+    synthetic_tracks
+)
+from tracking.eta import calculate_distance
+
+
+def test_synthetic_tracks_reach_recipient():
+    """Test synthetic couriers end at the recipient, pinging in time order"""
+    for track in synthetic_tracks(5, seed=1):
+        last = track.points[-1]
+        assert calculate_distance(last["latitude"], last["longitude"], track.recipient_lat, track.recipient_lon) < 0.1
+        assert all(a["timestamp"] < b["timestamp"] for a, b in zip(track.points, track.points[1:]))
+    assert synthetic_tracks(2, seed=1)[0].points == synthetic_tracks(2, seed=1)[0].points
+
+
+def test_arrival_time_uses_delivery_radius():
+    """Test arrival is the first point within 100 m of the recipient"""
+    start = datetime(2024, 1, 1, 10, 0)
+    points = [
+        {"latitude": 28.60, "longitude": 77.2, "timestamp": start},
+        {"latitude": 28.6995, "longitude": 77.2, "timestamp": start + timedelta(minutes=20)},
+        {"latitude": 28.70, "longitude": 77.2, "timestamp": start + timedelta(minutes=21)},
+    ]
+    delivered_at = start + timedelta(hours=1)
+    assert arrival_time(points, 28.70, 77.2, delivered_at) == points[1]["timestamp"]
+    assert arrival_time(points[:1], 28.70, 77.2, delivered_at) == delivered_at
+
+
+def test_backtest_reports_errors_and_latency():
+    """Test the vectorized estimator matches the scalar one it replaces"""
+    tracks = synthetic_tracks(10)
+    constant = backtest(ConstantEstimator(), tracks)
+    vectorized = backtest(VectorizedEstimator(), tracks)
+
+    assert constant["predictions"] == vectorized["predictions"] > 0
+    assert constant["error_p90_min"] == pytest.approx(vectorized["error_p90_min"], abs=1e-3)
+    assert constant["latency_p50_us"] > 0
+
+
+def test_gates():
+    """Test results outside the accuracy or latency gates fail"""
+    result = {"estimator": "constant", "predictions": 10, "error_p90_min": 12.0, "latency_p95_us": 8.0}
+    assert check_gates([result], 15.0, 10.0)
+    assert not check_gates([result], 10.0, None)
+    assert not check_gates([result], None, 5.0)
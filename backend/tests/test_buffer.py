@@ -0,0 +1,103 @@
+"""
+Unit tests for the location write-behind buffer
+"""
+import pytest
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from db.connection import connect_to_mongo, db as mongo
+from tracking.buffer import LocationWriteBuffer
+
+TEST_COLLECTION = "test_location_buffer"
+
+
+def make_doc():
+    return {
+        "package_id": ObjectId(),
+        "latitude": 28.65,
+        "longitude": 77.20,
+        "timestamp": datetime.utcnow(),
+        "created_at": datetime.utcnow()
+    }
+
+
+async def test_buffer_flushes_on_size():
+    """Test a full batch is written with one flush"""
+    database = await connect_to_mongo()
+    await database[TEST_COLLECTION].drop()
+    buffer = LocationWriteBuffer(collection_name=TEST_COLLECTION, max_batch_size=3, max_delay_seconds=10)
+
+    ids = await asyncio.gather(*(buffer.add(make_doc()) for _ in range(3)))
+
+    assert await database[TEST_COLLECTION].count_documents({"_id": {"$in": ids}}) == 3
+    assert buffer.get_stats()["flushes"] == 1
+    await database[TEST_COLLECTION].drop()
+
+
+async def test_buffer_drains_on_close():
+    """Test fire-and-forget documents are written when the buffer closes"""
+    database = await connect_to_mongo()
+    await database[TEST_COLLECTION].drop()
+    buffer = LocationWriteBuffer(collection_name=TEST_COLLECTION, max_batch_size=100, max_delay_seconds=10)
+
+    for _ in range(5):
+        await buffer.add(make_doc(), wait=False)
+    assert buffer.get_stats()["pending"] == 5
+
+    await buffer.close()
+    assert await database[TEST_COLLECTION].count_documents({}) == 5
+    await database[TEST_COLLECTION].drop()
+
+
+async def test_buffer_propagates_write_errors():
+    """Test waiting callers see the flush error"""
+    client, mongo.client = mongo.client, None  # simulate a missing connection
+    try:
+        buffer = LocationWriteBuffer(max_batch_size=1)
+        with pytest.raises(RuntimeError):
+            await buffer.add(make_doc())
+        assert buffer.get_stats()["errors"] == 1
+    finally:
+        mongo.client = client
+
+
+async def test_close_waits_for_timer_flush(monkeypatch):
+    """Test close() waits for a deadline flush that is still writing"""
+    written = []
+
+    class SlowCollection:
+        async def insert_many(self, documents, ordered=True):
+            await asyncio.sleep(0.05)
+            written.extend(documents)
+
+    monkeypatch.setattr("tracking.buffer.get_database", lambda: {TEST_COLLECTION: SlowCollection()})
+    buffer = LocationWriteBuffer(collection_name=TEST_COLLECTION, max_batch_size=100, max_delay_seconds=0.01)
+
+    for _ in range(3):
+        await buffer.add(make_doc(), wait=False)
+    # Let the deadline pass so the timer flush is mid-write
+    await asyncio.sleep(0.02)
+    assert written == []
+
+    await buffer.close()
+    assert len(written) == 3
+
+
+async def test_duplicate_reaches_its_waiter(monkeypatch):
+    """Test a point rejected by the idempotency index fails only its own caller"""
+    from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+    class DuplicateCollection:
+        async def insert_many(self, documents, ordered=True):
+            raise BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}]})
+
+    monkeypatch.setattr("tracking.buffer.get_database", lambda: {TEST_COLLECTION: DuplicateCollection()})
+    buffer = LocationWriteBuffer(collection_name=TEST_COLLECTION, max_batch_size=3, max_delay_seconds=10)
+
+    results = await asyncio.gather(*(buffer.add(make_doc()) for _ in range(3)), return_exceptions=True)
+
+    assert isinstance(results[0], ObjectId)
+    assert isinstance(results[1], DuplicateKeyError)
+    assert isinstance(results[2], ObjectId)
+    assert buffer.get_stats()["documents_written"] == 2
+    assert buffer.get_stats()["errors"] == 0
@@ -0,0 +1,93 @@
+"""
+Unit tests for binary location payload codecs
+"""
+import math
+import msgpack
+import pytest
+from datetime import datetime
+from tracking.codec import (
+    PACKED_CONTENT_TYPE,
+    PayloadError,
+    decode_msgpack,
+    decode_msgpack_point,
+    decode_packed,
+    decode_packed_record,
+    decode_point,
+    decode_points,
+    encode_packed,
+    encode_packed_record
+)
+
+
+def test_packed_round_trip():
+    """Test packed columns decode to the encoded points"""
+    body = encode_packed([
+        ("TRK-1", 28.65, 77.2, 1704103200.0),
+        ("TRK-2", -33.9, 151.2, None),
+        ("TRK-1", 28.66, 77.19, 1704103260.5)
+    ])
+    points = decode_packed(body).points()
+    assert [p.tracking_id for p in points] == ["TRK-1", "TRK-2", "TRK-1"]
+    assert points[1].latitude == -33.9
+    assert points[0].timestamp == datetime(2024, 1, 1, 10, 0)
+    assert points[1].timestamp is None
+    assert points[2].timestamp == datetime(2024, 1, 1, 10, 1, 0, 500000)
+
+
+@pytest.mark.parametrize("latitude,longitude", [(90.5, 0.0), (-91.0, 0.0), (0.0, 180.1), (math.nan, 0.0)])
+def test_packed_range_validation(latitude, longitude):
+    """Test out-of-range and NaN coordinates are rejected like the Pydantic model"""
+    with pytest.raises(PayloadError):
+        decode_packed(encode_packed([("TRK-1", 0.0, 0.0, None), ("TRK-1", latitude, longitude, None)]))
+    with pytest.raises(PayloadError):
+        decode_packed_record(encode_packed_record(latitude, longitude), "TRK-1")
+
+
+def test_packed_bounds_are_inclusive():
+    """Test the exact bounds are accepted"""
+    columns = decode_packed(encode_packed([("TRK-1", 90.0, -180.0, None), ("TRK-1", -90.0, 180.0, None)]))
+    assert len(columns) == 2
+
+
+def test_packed_malformed_body():
+    """Test truncated or foreign bodies are rejected"""
+    body = encode_packed([("TRK-1", 28.65, 77.2, None)])
+    with pytest.raises(PayloadError):
+        decode_packed(body[:-1])
+    with pytest.raises(PayloadError):
+        decode_packed(b"JSON" + body[4:])
+    with pytest.raises(PayloadError):
+        decode_packed_record(b"\x00" * 16, "TRK-1")
+
+
+def test_msgpack_columns():
+    """Test a msgpack column map decodes to points"""
+    body = msgpack.packb({
+        "tracking_id": ["TRK-1", "TRK-2"],
+        "latitude": [28.65, 12.9],
+        "longitude": [77.2, 77.6],
+        "timestamp": [1704103200, None]
+    })
+    points = decode_msgpack(body).points()
+    assert [p.tracking_id for p in points] == ["TRK-1", "TRK-2"]
+    assert points[0].timestamp == datetime(2024, 1, 1, 10, 0)
+    assert points[1].timestamp is None
+
+
+def test_msgpack_validation():
+    """Test msgpack bodies get the same checks as packed ones"""
+    with pytest.raises(PayloadError):
+        decode_msgpack(msgpack.packb({"tracking_id": "TRK-1", "latitude": [95.0], "longitude": [0.0]}))
+    with pytest.raises(PayloadError):
+        decode_msgpack(msgpack.packb({"tracking_id": "TRK-1", "latitude": ["north"], "longitude": [0.0]}))
+    with pytest.raises(PayloadError):
+        decode_msgpack_point(msgpack.packb({"latitude": 28.65}), "TRK-1")
+    point = decode_msgpack_point(msgpack.packb({"latitude": 28.65, "longitude": 77.2}), "TRK-1")
+    assert (point.tracking_id, point.latitude, point.timestamp) == ("TRK-1", 28.65, None)
+
+
+def test_json_is_not_decoded():
+    """Test non-binary content types fall through to JSON validation"""
+    assert decode_points("application/json", b"{}") is None
+    assert decode_point("application/json", b"{}", "TRK-1") is None
+    assert decode_point(PACKED_CONTENT_TYPE, encode_packed_record(1.0, 2.0), "TRK-1").longitude == 2.0
@@ -0,0 +1,151 @@
+"""
+Round-trip regression tests: count MongoDB commands issued per request
+"""
+import pytest
+from functools import partial
+from fastapi.testclient import TestClient
+from pymongo import monitoring
+from main import app
+from db.connection import connect_to_mongo
+from bson import ObjectId
+
+WRITE_COMMANDS = {"insert", "update", "findAndModify"}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Records (command name, collection) for every command sent to MongoDB"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append((event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands = []
+
+
+def reads_after_write(commands, collection):
+    """Return the find commands issued on a collection after it was written"""
+    written = False
+    reads = []
+    for name, target in commands:
+        if target != collection:
+            continue
+        if name in WRITE_COMMANDS:
+            written = True
+        elif name == "find" and written:
+            reads.append(name)
+    return reads
+
+
+@pytest.fixture(scope="module")
+def counter():
+    return CommandCounter()
+
+
+@pytest.fixture(scope="module")
+def client(counter):
+    """Test client whose Mongo connection reports every command to the counter"""
+    with TestClient(app) as test_client:
+        test_client.portal.call(partial(connect_to_mongo, event_listeners=[counter]))
+        yield test_client
+
+
+def register_and_login(client, role):
+    user_data = {
+        "name": "Round Trip",
+        "email": f"{role}_{ObjectId()}@example.com",
+        "password": "testpassword123",
+        "role": role
+    }
+    client.post("/api/auth/register", json=user_data)
+    response = client.post("/api/auth/login", json={
+        "email": user_data["email"],
+        "password": user_data["password"]
+    })
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+PACKAGE_DATA = {
+    "sender": {"name": "Sender", "address": "123 Main St", "phone": "1234567890",
+               "latitude": 28.6139, "longitude": 77.2090},
+    "recipient": {"name": "Recipient", "address": "456 Oak Ave", "phone": "0987654321",
+                  "latitude": 28.7041, "longitude": 77.1025},
+    "status": "registered"
+}
+
+
+def test_register_no_read_after_write(client, counter):
+    """Test register does one duplicate check and one insert"""
+    counter.reset()
+    response = client.post("/api/auth/register", json={
+        "name": "Round Trip",
+        "email": f"rt_{ObjectId()}@example.com",
+        "password": "testpassword123",
+        "role": "customer"
+    })
+    assert response.status_code == 201
+    assert counter.commands == [("find", "users"), ("insert", "users")]
+
+
+def test_create_package_no_read_after_write(client, counter):
+    """Test create_package builds its response from the inserted document"""
+    headers = register_and_login(client, "customer")
+    counter.reset()
+    response = client.post("/api/packages", json=PACKAGE_DATA, headers=headers)
+    assert response.status_code == 201
+    assert reads_after_write(counter.commands, "packages") == []
+    assert [c for c in counter.commands if c[1] == "packages"][-1] == ("insert", "packages")
+
+
+def test_update_package_single_round_trip(client, counter):
+    """Test update_package uses one findAndModify on packages"""
+    customer = register_and_login(client, "customer")
+    manager = register_and_login(client, "manager")
+    tracking_id = client.post("/api/packages", json=PACKAGE_DATA, headers=customer).json()["tracking_id"]
+
+    counter.reset()
+    response = client.put(f"/api/packages/{tracking_id}", json={"status": "in_transit"}, headers=manager)
+    assert response.status_code == 200
+    assert response.json()["status"] == "in_transit"
+    assert [c for c in counter.commands if c[1] == "packages"] == [("findAndModify", "packages")]
+
+
+def test_update_status_single_round_trip(client, counter):
+    """Test a status transition is one conditional findAndModify"""
+    customer = register_and_login(client, "customer")
+    manager = register_and_login(client, "manager")
+    tracking_id = client.post("/api/packages", json=PACKAGE_DATA, headers=customer).json()["tracking_id"]
+
+    counter.reset()
+    response = client.put(f"/api/packages/{tracking_id}/status?new_status=in_transit", headers=manager)
+    assert response.status_code == 200
+    assert [c for c in counter.commands if c[1] == "packages"] == [("findAndModify", "packages")]
+
+    # Rejected transitions report the blocking status
+    response = client.put(f"/api/packages/{tracking_id}/status?new_status=registered", headers=manager)
+    assert response.status_code == 400
+    assert "in_transit" in response.json()["detail"]
+
+
+def test_update_location_no_read_after_write(client, counter):
+    """Test update_location never reads back the inserted point"""
+    customer = register_and_login(client, "customer")
+    courier = register_and_login(client, "delivery_staff")
+    tracking_id = client.post("/api/packages", json=PACKAGE_DATA, headers=customer).json()["tracking_id"]
+
+    counter.reset()
+    response = client.post(
+        f"/api/tracking/{tracking_id}/update",
+        json={"latitude": 28.65, "longitude": 77.20},
+        headers=courier
+    )
+    assert response.status_code == 201
+    assert [c for c in counter.commands if c[1] == "location_updates"] == [("insert", "location_updates")]
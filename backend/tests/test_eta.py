@@ -2,8 +2,19 @@
 Unit tests for ETA calculation logic
 """
 import pytest
+import numpy as np
 from datetime import datetime, timedelta
-from tracking.eta import calculate_distance, calculate_eta, format_eta
+from tracking.eta import (
+    calculate_distance,
+    calculate_eta,
+    calculate_distance_many,
+    calculate_eta_many,
+    format_eta
+)
+
+# Delhi, Gurgaon, same point, Mumbai
+CURRENT = [(28.6139, 77.2090), (28.4089, 77.0418), (28.6139, 77.2090), (19.0760, 72.8777)]
+DESTINATION = [(28.4089, 77.0418), (28.6139, 77.2090), (28.6139, 77.2090), (28.6139, 77.2090)]
 
 
 def test_calculate_distance_same_location():
@@ -78,3 +89,37 @@ def test_format_eta_hours_minutes():
     
     assert "h" in formatted["formatted"] or "m" in formatted["formatted"]
 
+
+def test_calculate_distance_many_matches_scalar():
+    """Test vectorized distances match calculate_distance"""
+    (lat1, lon1), (lat2, lon2) = np.array(CURRENT).T, np.array(DESTINATION).T
+    distances = calculate_distance_many(lat1, lon1, lat2, lon2)
+    
+    expected = [calculate_distance(*current, *destination) for current, destination in zip(CURRENT, DESTINATION)]
+    assert distances == pytest.approx(expected, rel=1e-12, abs=1e-9)
+
+
+def test_calculate_distance_many_broadcasts():
+    """Test one destination broadcasts against many current points"""
+    lat1, lon1 = np.array(CURRENT).T
+    distances = calculate_distance_many(lat1, lon1, 28.6139, 77.2090)
+    assert distances.shape == (len(CURRENT),)
+    assert distances[2] == 0.0
+
+
+def test_calculate_eta_many_matches_scalar():
+    """Test vectorized ETAs match calculate_eta"""
+    (lat1, lon1), (lat2, lon2) = np.array(CURRENT).T, np.array(DESTINATION).T
+    etas = calculate_eta_many(lat1, lon1, lat2, lon2, average_speed_kmh=[30.0, 45.0, 30.0, 60.0])
+    
+    for eta, current, destination, speed in zip(etas, CURRENT, DESTINATION, [30.0, 45.0, 30.0, 60.0]):
+        expected = calculate_eta(*current, *destination, average_speed_kmh=speed)
+        assert abs((eta.astype(datetime) - expected).total_seconds()) < 1
+
+
+def test_calculate_eta_many_invalid_speed():
+    """Test ETAs the scalar version cannot compute are NaT"""
+    etas = calculate_eta_many([28.6139, 28.6139], [77.2090, 77.2090], [28.4089, 28.6139], [77.0418, 77.2090], 0.0)
+    assert np.isnat(etas[0])
+    # Arrived points do not depend on speed
+    assert not np.isnat(etas[1])
@@ -0,0 +1,71 @@
+"""
+Unit tests for the freshness-based ETA read cache
+"""
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from tracking.eta_cache import ETACache, eta_location_key
+
+NOW = datetime(2024, 1, 1, 10, 0, 0)
+ETA = NOW + timedelta(minutes=30)
+
+
+def make_key(point_id=None, timestamp=NOW, recipient=(28.4089, 77.0418)):
+    location = {"_id": point_id or ObjectId(), "timestamp": timestamp}
+    return eta_location_key(location, *recipient)
+
+
+def test_hit_while_nothing_moved():
+    """Test the prediction is served for the same point"""
+    cache = ETACache()
+    key = make_key()
+    assert cache.get("TRK-1", key) is None
+    cache.put("TRK-1", key, ETA, NOW)
+
+    cached = cache.get("TRK-1", key)
+    assert cached.eta == ETA
+    assert cached.calculated_at == NOW
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_new_point_misses():
+    """Test a new point, a merged (moved) point or a new recipient invalidate"""
+    cache = ETACache()
+    point_id = ObjectId()
+    key = make_key(point_id)
+    for changed in [
+        make_key(),
+        make_key(point_id, timestamp=NOW + timedelta(seconds=30)),
+        make_key(point_id, recipient=(28.7041, 77.1025))
+    ]:
+        cache.put("TRK-1", key, ETA, NOW)
+        assert cache.get("TRK-1", changed) is None
+    assert cache.get_stats()["moved"] == 3
+    # Invalidated entries are dropped
+    assert cache.get("TRK-1", key) is None
+
+
+def test_expires_after_max_age():
+    """Test predictions older than max age are recalculated"""
+    cache = ETACache(max_age_seconds=0.01)
+    key = make_key()
+    cache.put("TRK-1", key, ETA, NOW)
+    time.sleep(0.02)
+    assert cache.get("TRK-1", key) is None
+    assert cache.get_stats()["expired"] == 1
+
+
+def test_evicts_least_recently_used():
+    """Test the cache stays within max_size"""
+    cache = ETACache(max_size=2)
+    keys = {tracking_id: make_key() for tracking_id in ["TRK-1", "TRK-2", "TRK-3"]}
+    cache.put("TRK-1", keys["TRK-1"], ETA, NOW)
+    cache.put("TRK-2", keys["TRK-2"], ETA, NOW)
+    cache.get("TRK-1", keys["TRK-1"])
+    cache.put("TRK-3", keys["TRK-3"], ETA, NOW)
+    assert cache.get_stats()["size"] == 2
+    assert cache.get("TRK-2", keys["TRK-2"]) is None
+    assert cache.get("TRK-1", keys["TRK-1"]) is not None
@@ -0,0 +1,88 @@
+"""
+Unit tests for the fast JSON row serializers
+"""
+import json
+from datetime import datetime, timezone
+from bson import ObjectId
+from models.fast_json import dumps, location_row, package_row
+from models.location import LocationUpdateResponse, RouteHistoryResponse
+from models.package import PackageResponse, PackageListResponse
+
+
+def make_package(**overrides):
+    package = {
+        "_id": ObjectId(),
+        "tracking_id": "TRK-20240101-ABC123",
+        "sender": {"name": "Sender", "address": "1 Main Street", "phone": "1234567890", "latitude": 28, "longitude": 77.2},
+        "recipient": {"name": "Recipient", "address": "2 High Street", "phone": "0987654321"},
+        "status": "in_transit",
+        "user_id": ObjectId(),
+        "created_at": datetime(2024, 1, 1, 10, 0, 0, 123000),
+        "updated_at": datetime(2024, 1, 1, 11, 0)
+    }
+    package.update(overrides)
+    return package
+
+
+def test_package_row_matches_pydantic():
+    """Test package rows encode exactly like PackageListResponse"""
+    packages = [make_package(), make_package(updated_at=datetime(2024, 1, 2, tzinfo=timezone.utc))]
+    expected = PackageListResponse(
+        packages=[
+            PackageResponse(
+                id=str(pkg["_id"]),
+                tracking_id=pkg["tracking_id"],
+                sender=pkg["sender"],
+                recipient=pkg["recipient"],
+                status=pkg["status"],
+                user_id=str(pkg["user_id"]),
+                created_at=pkg["created_at"],
+                updated_at=pkg["updated_at"]
+            )
+            for pkg in packages
+        ],
+        total=2
+    ).model_dump_json()
+    fast = dumps({"packages": [package_row(pkg) for pkg in packages], "total": 2})
+    assert json.loads(fast) == json.loads(expected)
+    assert fast == expected.encode()
+
+
+def test_location_row_matches_pydantic():
+    """Test location rows encode exactly like RouteHistoryResponse"""
+    package_id = ObjectId()
+    locations = [
+        {"_id": ObjectId(), "package_id": package_id, "latitude": 28.65, "longitude": 77, "timestamp": datetime(2024, 1, 1, 10, 0), "created_at": datetime(2024, 1, 1, 10, 0, 1, 500)}
+    ]
+    expected = RouteHistoryResponse(
+        package_id=str(package_id),
+        tracking_id="TRK-1",
+        locations=[
+            LocationUpdateResponse(
+                id=str(loc["_id"]),
+                package_id=str(loc["package_id"]),
+                latitude=loc["latitude"],
+                longitude=loc["longitude"],
+                timestamp=loc["timestamp"],
+                created_at=loc["created_at"]
+            )
+            for loc in locations
+        ],
+        total=1
+    ).model_dump_json()
+    fast = dumps({
+        "package_id": str(package_id),
+        "tracking_id": "TRK-1",
+        "locations": [location_row(loc, str(package_id)) for loc in locations],
+        "total": 1,
+        "next_cursor": None,
+        "has_more": False,
+        "polyline": None
+    })
+    assert fast == expected.encode()
+
+
+def test_dumps_object_id():
+    """Test stray ObjectIds are encoded as strings"""
+    object_id = ObjectId()
+    assert dumps({"id": object_id}) == f'{{"id":"{object_id}"}}'.encode()
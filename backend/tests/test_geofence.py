@@ -0,0 +1,252 @@
+"""
+Unit tests for the geofence index, tracker and status transitions
+"""
+import random
+import pytest
+from datetime import datetime, timedelta, timezone
+from packages.status import geofence_transitions
+from tracking.geofence import (
+    Geofence,
+    GeofenceIndex,
+    GeofenceTracker,
+    package_fences,
+    DEPOT,
+    DWELL,
+    ENTER,
+    EXIT,
+    HUB,
+    RECIPIENT,
+    RESTRICTED,
+    SENDER
+)
+
+NOW = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def square(south, west, north, east):
+    """Closed GeoJSON ring of [longitude, latitude] positions"""
+    return [[west, south], [east, south], [east, north], [west, north], [west, south]]
+
+
+def make_package(status="registered"):
+    return {
+        "status": status,
+        "sender": {"latitude": 28.6139, "longitude": 77.2090},
+        "recipient": {"latitude": 28.6500, "longitude": 77.2090}
+    }
+
+
+def test_polygon_with_hole():
+    """Test polygon containment excludes holes"""
+    fence = Geofence.from_document({
+        "_id": "yard",
+        "kind": DEPOT,
+        "geometry": {"type": "Polygon", "coordinates": [square(28.0, 77.0, 28.1, 77.1), square(28.04, 77.04, 28.06, 77.06)]}
+    })
+    assert fence.contains(28.02, 77.02)
+    assert not fence.contains(28.05, 77.05)
+    assert not fence.contains(28.2, 77.05)
+
+
+def test_circle_and_invalid_documents():
+    """Test circle fences and rejected documents"""
+    fence = Geofence.from_document({
+        "_id": "hub-1",
+        "kind": HUB,
+        "radius_m": 200,
+        "geometry": {"type": "Point", "coordinates": [77.2, 28.6]}
+    })
+    assert fence.contains(28.6 + 0.0017, 77.2)  # ~190 m north
+    assert not fence.contains(28.6 + 0.0019, 77.2)  # ~210 m north
+    with pytest.raises(ValueError):
+        Geofence.from_document({"_id": 1, "kind": HUB, "geometry": {"type": "Point", "coordinates": [77.2, 28.6]}})
+    with pytest.raises(ValueError):
+        Geofence.from_document({"_id": 2, "kind": "moat", "radius_m": 5, "geometry": {"type": "Point", "coordinates": [77.2, 28.6]}})
+    with pytest.raises(ValueError):
+        Geofence.from_document({"_id": 3, "geometry": {"type": "LineString", "coordinates": [[77.2, 28.6]]}})
+
+
+def test_index_matches_brute_force():
+    """Test grid queries return exactly the fences containing a point"""
+    rng = random.Random(3)
+    index = GeofenceIndex(cell_degrees=0.01)
+    fences = []
+    for number in range(300):
+        lat, lon = 28.5 + rng.random() * 0.3, 77.0 + rng.random() * 0.3
+        if number % 2:
+            fence = Geofence(id=str(number), kind=HUB, center=(lat, lon), radius_m=rng.uniform(50, 3000))
+        else:
+            size = rng.uniform(0.001, 0.03)
+            fence = Geofence.from_document({
+                "_id": number,
+                "kind": RESTRICTED,
+                "geometry": {"type": "Polygon", "coordinates": [square(lat, lon, lat + size, lon + size)]}
+            })
+        index.add(fence)
+        fences.append(fence)
+    index.remove("1")
+    fences = [fence for fence in fences if fence.id != "1"]
+    assert len(index) == 299
+
+    for _ in range(500):
+        lat, lon = 28.5 + rng.random() * 0.3, 77.0 + rng.random() * 0.3
+        expected = {fence.id for fence in fences if fence.contains(lat, lon)}
+        assert {fence.id for fence in index.query(lat, lon)} == expected
+
+
+def test_enter_exit_and_dwell():
+    """Test events for a trip through an indexed fence"""
+    index = GeofenceIndex()
+    index.add(Geofence(id="hub", kind=HUB, name="North hub", center=(28.63, 77.209), radius_m=300))
+    tracker = GeofenceTracker(index, dwell_seconds=120)
+
+    assert tracker.update("TRK1", 28.62, 77.209, NOW) == []
+    events = tracker.update("TRK1", 28.63, 77.209, NOW + timedelta(minutes=1))
+    assert [(event.type, event.fence_id, event.name) for event in events] == [(ENTER, "hub", "North hub")]
+    assert tracker.update("TRK1", 28.6301, 77.209, NOW + timedelta(minutes=2)) == []
+    events = tracker.update("TRK1", 28.6302, 77.209, NOW + timedelta(minutes=3))
+    assert [event.type for event in events] == [DWELL]
+    # Dwell fires once per visit
+    assert tracker.update("TRK1", 28.6302, 77.209, NOW + timedelta(minutes=9)) == []
+    events = tracker.update("TRK1", 28.64, 77.209, NOW + timedelta(minutes=10))
+    assert [event.type for event in events] == [EXIT]
+    assert tracker.get_stats()["events"] == {ENTER: 1, EXIT: 1, DWELL: 1}
+
+
+def test_aware_and_naive_timestamps():
+    """Test mixed timezone-aware and naive UTC timestamps are comparable"""
+    index = GeofenceIndex()
+    index.add(Geofence(id="hub", kind=HUB, center=(28.63, 77.209), radius_m=300))
+    tracker = GeofenceTracker(index, dwell_seconds=60)
+    tracker.update("TRK1", 28.63, 77.209, NOW)
+    events = tracker.update("TRK1", 28.63, 77.209, (NOW + timedelta(minutes=2)).replace(tzinfo=timezone.utc))
+    assert [event.type for event in events] == [DWELL]
+
+
+def test_package_fences_and_transitions():
+    """Test sender exit and recipient entry drive the status transitions"""
+    package = make_package()
+    fences = package_fences(package)
+    assert [fence.id for fence in fences] == [SENDER, RECIPIENT]
+    tracker = GeofenceTracker(GeofenceIndex())
+
+    # Still within 500 m of the sender
+    events = tracker.update("TRK1", 28.6160, 77.2090, NOW, fences, starts_inside=[SENDER])
+    assert geofence_transitions("registered", events) == []
+    # Left the sender
+    events = tracker.update("TRK1", 28.6300, 77.2090, NOW + timedelta(minutes=5), fences)
+    assert [(event.type, event.kind) for event in events] == [(EXIT, SENDER)]
+    assert geofence_transitions("registered", events) == ["in_transit"]
+    # Within 100 m of the recipient
+    events = tracker.update("TRK1", 28.6495, 77.2090, NOW + timedelta(minutes=15), fences)
+    assert [(event.type, event.kind) for event in events] == [(ENTER, RECIPIENT)]
+    assert geofence_transitions("in_transit", events) == ["delivered"]
+    assert geofence_transitions("in_transit", events, delivered_on=DWELL) == []
+
+
+def test_first_point_far_from_sender():
+    """Test a registered package first seen away from its sender goes in transit"""
+    fences = package_fences(make_package())
+    tracker = GeofenceTracker(GeofenceIndex())
+    events = tracker.update("TRK1", 28.6495, 77.2090, NOW, fences, starts_inside=[SENDER])
+    assert geofence_transitions("registered", events) == ["in_transit", "delivered"]
+    assert geofence_transitions("delivered", events) == []
+
+
+def test_depot_and_hub_transitions():
+    """Test leaving a depot or entering a hub puts a package in transit"""
+    index = GeofenceIndex()
+    index.add(Geofence(id="depot", kind=DEPOT, center=(28.0, 77.0), radius_m=200))
+    index.add(Geofence(id="hub", kind=HUB, center=(28.1, 77.0), radius_m=200))
+    index.add(Geofence(id="zone", kind=RESTRICTED, center=(28.2, 77.0), radius_m=200))
+    tracker = GeofenceTracker(index)
+
+    assert geofence_transitions("registered", tracker.update("A", 28.0, 77.0, NOW)) == []
+    assert geofence_transitions("registered", tracker.update("A", 28.05, 77.0, NOW)) == ["in_transit"]
+    assert geofence_transitions("registered", tracker.update("B", 28.1, 77.0, NOW)) == ["in_transit"]
+    assert geofence_transitions("registered", tracker.update("C", 28.2, 77.0, NOW)) == []
+
+
+def test_tracker_bounded_and_forget():
+    """Test tracked packages are LRU-bounded and forgettable"""
+    index = GeofenceIndex()
+    index.add(Geofence(id="hub", kind=HUB, center=(28.1, 77.0), radius_m=200))
+    tracker = GeofenceTracker(index, max_packages=2)
+    for key in ["A", "B", "C"]:
+        tracker.update(key, 28.1, 77.0, NOW)
+    assert tracker.get_stats()["tracked_packages"] == 2
+    # "A" was evicted, so it enters again
+    assert [event.type for event in tracker.update("A", 28.1, 77.0, NOW)] == [ENTER]
+    tracker.forget("A")
+    assert [event.type for event in tracker.update("A", 28.1, 77.0, NOW)] == [ENTER]
+
+
+def test_retry_emits_events_again():
+    """Test events whose transition failed are emitted on the next update"""
+    fences = package_fences(make_package("in_transit"))
+    tracker = GeofenceTracker(GeofenceIndex(), dwell_seconds=60)
+
+    events = tracker.update("TRK1", 28.6495, 77.2090, NOW, fences)
+    assert [(event.type, event.kind) for event in events] == [(ENTER, RECIPIENT)]
+    tracker.retry("TRK1", events)
+    events = tracker.update("TRK1", 28.6496, 77.2090, NOW + timedelta(seconds=30), fences)
+    assert geofence_transitions("in_transit", events) == ["delivered"]
+
+    events = tracker.update("TRK1", 28.6496, 77.2090, NOW + timedelta(seconds=90), fences)
+    assert geofence_transitions("in_transit", events, delivered_on=DWELL) == ["delivered"]
+    tracker.retry("TRK1", events)
+    events = tracker.update("TRK1", 28.6496, 77.2090, NOW + timedelta(seconds=100), fences)
+    assert [event.type for event in events] == [DWELL]
+
+    # A retried exit is emitted again while the package stays outside
+    tracker = GeofenceTracker(GeofenceIndex())
+    events = tracker.update("TRK2", 28.6300, 77.2090, NOW, fences, starts_inside=[SENDER])
+    tracker.retry("TRK2", events)
+    events = tracker.update("TRK2", 28.6310, 77.2090, NOW + timedelta(minutes=1), fences)
+    assert [(event.type, event.kind) for event in events] == [(EXIT, SENDER)]
+
+
+def test_large_fences_are_not_gridded():
+    """Test fences covering many cells are checked directly, not copied per cell"""
+    index = GeofenceIndex(cell_degrees=0.01, max_cells=100)
+    area = Geofence.from_document({
+        "_id": "service-area",
+        "kind": RESTRICTED,
+        "geometry": {"type": "Polygon", "coordinates": [square(20.0, 70.0, 30.0, 80.0)]}
+    })
+    index.add(area)
+    index.add(Geofence(id="hub", kind=HUB, center=(28.6, 77.2), radius_m=200))
+    assert sum(len(fences) for fences in index._cells.values()) < 10
+    assert {fence.id for fence in index.query(28.6, 77.2)} == {"service-area", "hub"}
+    assert [fence.id for fence in index.query(25.0, 75.0)] == ["service-area"]
+    assert index.query(31.0, 75.0) == []
+
+    index.remove("service-area")
+    assert [fence.id for fence in index.query(28.6, 77.2)] == ["hub"]
+    assert len(index) == 1
+
+
+def test_changed_fence_is_entered_again():
+    """Test a package inside a fence whose definition changed gets exit and enter again"""
+    package = make_package("registered")
+    tracker = GeofenceTracker(GeofenceIndex())
+    # Already at the recipient while still registered: the enter is not used
+    events = tracker.update("TRK1", 28.6495, 77.2090, NOW, package_fences(package))
+    assert [(event.type, event.kind) for event in events] == [(ENTER, RECIPIENT)]
+    assert tracker.update("TRK1", 28.6496, 77.2090, NOW + timedelta(minutes=1), package_fences(package)) == []
+
+    # The recipient address is corrected to a point nearby
+    package["recipient"]["latitude"] = 28.6497
+    events = tracker.update("TRK1", 28.6496, 77.2090, NOW + timedelta(minutes=2), package_fences(package))
+    assert [(event.type, event.kind) for event in events] == [(EXIT, RECIPIENT), (ENTER, RECIPIENT)]
+    assert geofence_transitions("in_transit", events) == ["delivered"]
+
+    # Re-importing an indexed fence unchanged does not
+    index = GeofenceIndex()
+    index.add(Geofence(id="hub", kind=HUB, center=(28.1, 77.0), radius_m=200))
+    tracker = GeofenceTracker(index)
+    tracker.update("A", 28.1, 77.0, NOW)
+    index.add(Geofence(id="hub", kind=HUB, center=(28.1, 77.0), radius_m=200))
+    assert tracker.update("A", 28.1, 77.0, NOW) == []
+    index.add(Geofence(id="hub", kind=HUB, center=(28.1, 77.0), radius_m=300))
+    assert [event.type for event in tracker.update("A", 28.1, 77.0, NOW)] == [EXIT, ENTER]
@@ -0,0 +1,81 @@
+"""
+Unit tests for idempotent location uploads
+"""
+import pytest
+import asyncio
+from tracking.idempotency import IdempotencyCache, location_idempotency_key
+
+
+def test_location_idempotency_key():
+    """Test keys are scoped to the package and need a key or a device sequence"""
+    assert location_idempotency_key("TRK-1", "abc") == "TRK-1:key:abc"
+    assert location_idempotency_key("TRK-1", device_id="phone-7", sequence=42) == "TRK-1:seq:phone-7:42"
+    assert location_idempotency_key("TRK-1", device_id="phone-7") is None
+    assert location_idempotency_key("TRK-1") is None
+
+
+async def test_run_once_replays_result():
+    """Test a duplicate gets the original result without running again"""
+    cache = IdempotencyCache()
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        return {"id": "first"}
+
+    assert await cache.run_once("k", operation) == {"id": "first"}
+    assert await cache.run_once("k", operation) == {"id": "first"}
+    assert len(calls) == 1
+    assert cache.get_stats()["hits"] == 1
+
+
+async def test_run_once_concurrent_duplicates_wait():
+    """Test a concurrent duplicate waits for the in-flight request"""
+    cache = IdempotencyCache()
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    results = await asyncio.gather(cache.run_once("k", operation), cache.run_once("k", operation))
+    assert results == ["done", "done"]
+    assert len(calls) == 1
+
+
+async def test_run_once_failures_can_retry():
+    """Test failed operations are not remembered"""
+    cache = IdempotencyCache()
+
+    async def failing():
+        raise ValueError("boom")
+
+    async def succeeding():
+        return "ok"
+
+    with pytest.raises(ValueError):
+        await cache.run_once("k", failing)
+    assert await cache.run_once("k", succeeding) == "ok"
+
+
+def test_cache_is_bounded():
+    """Test the cache evicts least recently used keys"""
+    cache = IdempotencyCache(max_size=2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, key)
+    assert cache.get("a") is None
+    assert cache.get("c") == "c"
+
+
+async def test_run_once_without_key():
+    """Test uploads without a key always run"""
+    cache = IdempotencyCache()
+    calls = []
+
+    async def operation():
+        calls.append(1)
+
+    await cache.run_once(None, operation)
+    await cache.run_once(None, operation)
+    assert len(calls) == 2
@@ -0,0 +1,27 @@
+"""
+Unit tests for the startup index manager
+"""
+from db.connection import connect_to_mongo
+from db.indexes import INDEXES, SUPERSEDED_INDEXES, ensure_indexes, get_missing_indexes
+
+
+async def test_ensure_indexes_is_idempotent():
+    """Test a second bootstrap finds nothing missing"""
+    db = await connect_to_mongo()
+    await ensure_indexes()
+
+    for collection_name in INDEXES:
+        assert await get_missing_indexes(db, collection_name) == []
+    assert await ensure_indexes() == {}
+
+
+async def test_superseded_index_is_dropped():
+    """Test the old (package_id, timestamp) index goes once the keyset index exists"""
+    db = await connect_to_mongo()
+    await ensure_indexes()
+    await db.location_updates.create_index([("package_id", 1), ("timestamp", 1)], name="package_id_1_timestamp_1")
+
+    await ensure_indexes()
+    names = [index["name"] async for index in db.location_updates.list_indexes()]
+    assert "package_id_1_timestamp_1__id_1" in names
+    assert not set(SUPERSEDED_INDEXES["location_updates"]) & set(names)
@@ -0,0 +1,77 @@
+"""
+Unit tests for batch ETA calculation and the ETA scheduler
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from tracking.eta import calculate_eta
+from tracking.predictions import ETAScheduler, calculate_package_etas
+
+NOW = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def make_package(package_id, recipient_lat=28.4089, recipient_lng=77.0418):
+    return {
+        "_id": package_id,
+        "tracking_id": f"TRK-{package_id}",
+        "recipient": {"latitude": recipient_lat, "longitude": recipient_lng}
+    }
+
+
+def test_batch_matches_calculate_eta():
+    """Test batch ETAs match calculate_eta per package"""
+    packages = [make_package(1), make_package(2), make_package(3, 28.7041, 77.1025)]
+    latest = {
+        1: {"latitude": 28.6139, "longitude": 77.2090},
+        2: {"latitude": 28.4090, "longitude": 77.0418},
+        3: {"latitude": 28.5355, "longitude": 77.3910}
+    }
+    etas = dict(calculate_package_etas(packages, latest, now=NOW))
+    assert set(etas) == {1, 2, 3}
+    for package in packages:
+        point = latest[package["_id"]]
+        expected = calculate_eta(
+            point["latitude"], point["longitude"],
+            package["recipient"]["latitude"], package["recipient"]["longitude"],
+            now=NOW
+        )
+        assert abs(etas[package["_id"]] - expected) <= timedelta(microseconds=1)
+
+
+def test_batch_skips_packages_without_location():
+    """Test packages with no stored point get no ETA"""
+    packages = [make_package(1), make_package(2)]
+    etas = calculate_package_etas(packages, {2: {"latitude": 28.6, "longitude": 77.2}}, now=NOW)
+    assert [package_id for package_id, _ in etas] == [2]
+    assert calculate_package_etas(packages, {}, now=NOW) == []
+
+
+def test_batch_returns_datetimes():
+    """Test batch ETAs are plain datetimes (storable by pymongo)"""
+    etas = calculate_package_etas([make_package(1)], {1: {"latitude": 28.6, "longitude": 77.2}}, now=NOW)
+    assert type(etas[0][1]) is datetime
+    assert etas[0][1] > NOW
+
+
+@pytest.mark.asyncio
+async def test_scheduler_close_stops_loop(monkeypatch):
+    """Test close() cancels the background loop and counts failed runs"""
+    monkeypatch.setattr("tracking.predictions.get_database", lambda: "db")
+    scheduler = ETAScheduler(interval_seconds=0.01)
+    attempts = []
+    retried = asyncio.Event()
+
+    async def failing_run_once(db):
+        attempts.append(db)
+        if len(attempts) == 2:
+            retried.set()
+        raise RuntimeError("database unavailable")
+
+    scheduler.run_once = failing_run_once
+    scheduler.start()
+    await asyncio.wait_for(retried.wait(), timeout=1)
+    await scheduler.close()
+    # Every run fails and is retried on the next interval
+    assert scheduler.get_stats()["failures"] == len(attempts)
+    assert scheduler.get_stats()["runs"] == 0
+    await scheduler.close()
@@ -0,0 +1,137 @@
+"""
+Unit tests for ingest rate limiting and coalescing
+"""
+import pytest
+import asyncio
+from tracking.ratelimit import TokenBucketLimiter, IngestRateLimiter, PointCoalescer
+
+
+def make_limiter(package_burst=2, user_burst=100, max_keys=1000):
+    return IngestRateLimiter(
+        user_limiter=TokenBucketLimiter(rate_per_second=10, burst=user_burst, max_keys=max_keys),
+        package_limiter=TokenBucketLimiter(rate_per_second=1, burst=package_burst, max_keys=max_keys)
+    )
+
+
+def test_token_bucket_refills():
+    """Test a drained bucket reports the wait and refills over time"""
+    limiter = TokenBucketLimiter(rate_per_second=2, burst=1)
+    assert limiter.wait_time("k", now=0.0) == 0.0
+    limiter.consume("k")
+    assert limiter.wait_time("k", now=0.0) == pytest.approx(0.5)
+    assert limiter.wait_time("k", now=0.5) == 0.0
+
+
+def test_package_burst_is_limited():
+    """Test a tight loop on one package is rejected after the burst"""
+    limiter = make_limiter(package_burst=2)
+    assert limiter.try_acquire("user-1", ["TRK-1"]) == 0
+    assert limiter.try_acquire("user-1", ["TRK-1"]) == 0
+    assert limiter.try_acquire("user-1", ["TRK-1"]) > 0
+    # Other packages of the same courier are unaffected
+    assert limiter.try_acquire("user-1", ["TRK-2"]) == 0
+    assert limiter.get_stats()["limited"] == 1
+
+
+def test_rejection_does_not_drain_other_buckets():
+    """Test tokens are only taken when every bucket allows the request"""
+    limiter = make_limiter(package_burst=1, user_burst=1)
+    assert limiter.try_acquire("user-1", ["TRK-1"]) == 0
+    assert limiter.try_acquire("user-2", ["TRK-1"]) > 0
+    # user-2's own bucket is still full
+    assert limiter.try_acquire("user-2", ["TRK-2"]) == 0
+
+
+def test_limiter_memory_is_bounded():
+    """Test the bucket map never exceeds max_keys"""
+    limiter = TokenBucketLimiter(rate_per_second=1, burst=1, max_keys=3)
+    for i in range(10):
+        limiter.wait_time(f"k{i}")
+    assert limiter.get_stats()["tracked_keys"] == 3
+
+
+async def test_coalescer_keeps_newest_point():
+    """Test only the newest excess point is ingested"""
+    coalescer = PointCoalescer()
+    ingested = []
+
+    def point(value):
+        async def ingest():
+            ingested.append(value)
+        return ingest
+
+    coalescer.submit("TRK-1", point(1), 0.01)
+    coalescer.submit("TRK-1", point(2), 0.01)
+    coalescer.submit("TRK-1", point(3), 0.01)
+    await asyncio.sleep(0.05)
+
+    assert ingested == [3]
+    assert coalescer.get_stats()["coalesced"] == 2
+
+
+async def test_coalescer_drains_on_close():
+    """Test pending points are ingested at shutdown"""
+    coalescer = PointCoalescer()
+    ingested = []
+
+    async def ingest():
+        ingested.append(1)
+
+    coalescer.submit("TRK-1", ingest, 60)
+    await coalescer.close()
+    assert ingested == [1]
+
+
+async def test_coalescer_waits_for_a_token():
+    """Test a deferred point is only ingested once it can take a token"""
+    coalescer = PointCoalescer()
+    ingested = []
+    tokens = [0.01, 0.01, 0.0]
+
+    async def ingest():
+        ingested.append(1)
+
+    coalescer.submit("TRK-1", ingest, 0.01, acquire=lambda: tokens.pop(0))
+    await asyncio.sleep(0.02)
+    assert ingested == []
+    await asyncio.sleep(0.05)
+    assert ingested == [1]
+    assert tokens == []
+
+
+async def test_coalescer_memory_is_bounded():
+    """Test pending points never exceed max_keys"""
+    coalescer = PointCoalescer(max_keys=3)
+    ingested = []
+
+    def point(value):
+        async def ingest():
+            ingested.append(value)
+        return ingest
+
+    for i in range(5):
+        coalescer.submit(f"TRK-{i}", point(i), 60)
+    assert coalescer.get_stats()["pending"] == 3
+    assert coalescer.get_stats()["evicted"] == 2
+
+    await coalescer.close()
+    assert ingested == [2, 3, 4]
+
+
+async def test_retries_replay_before_rate_limiting(monkeypatch):
+    """Test a retried upload replays its stored result even when its buckets are empty"""
+    from models.location import LocationUpdateCreate
+    from tracking import routes
+    from tracking.idempotency import IdempotencyCache
+
+    cache = IdempotencyCache()
+    cache.put("TRK-1:key:abc", "stored")
+    limiter = make_limiter(package_burst=1)
+    monkeypatch.setattr(routes, "idempotency_cache", cache)
+    monkeypatch.setattr(routes, "ingest_limiter", limiter)
+    monkeypatch.setattr(routes, "INGEST_RATE_LIMIT_ENABLED", True)
+    assert limiter.try_acquire("user-1", ["TRK-1"]) == 0
+
+    point = LocationUpdateCreate(latitude=28.65, longitude=77.20)
+    assert await routes._submit_location(None, "user-1", "TRK-1", point, "abc") == "stored"
+    assert limiter.get_stats()["limited"] == 0
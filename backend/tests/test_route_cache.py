@@ -0,0 +1,123 @@
+"""
+Unit tests for the in-memory route cache
+"""
+from datetime import datetime, timedelta
+from bson import ObjectId
+from tracking.route_cache import RouteCache, to_millis, from_millis
+
+START = datetime(2024, 1, 1, 10, 0)
+
+
+def make_point(package_id, minutes, latitude=28.65):
+    ts = START + timedelta(minutes=minutes)
+    return {
+        "_id": ObjectId(),
+        "package_id": package_id,
+        "latitude": latitude,
+        "longitude": 77.20,
+        "timestamp": ts,
+        "created_at": ts
+    }
+
+
+def batches_of(points, size=2):
+    async def read():
+        for i in range(0, len(points), size):
+            yield points[i:i + size]
+    return read
+
+
+def test_millis_round_trip():
+    """Test timestamps are truncated to milliseconds like BSON datetimes"""
+    ts = datetime(2024, 1, 1, 10, 0, 0, 123456)
+    assert from_millis(to_millis(ts)) == datetime(2024, 1, 1, 10, 0, 0, 123000)
+
+
+async def test_load_then_serve_window():
+    """Test a loaded route serves documents equal to the stored ones"""
+    package_id = ObjectId()
+    points = [make_point(package_id, i) for i in range(5)]
+    cache = RouteCache()
+
+    assert cache.get("TRK-1") is None
+    route = await cache.load("TRK-1", package_id, batches_of(points))
+    assert cache.get("TRK-1") is route
+
+    start, end = route.window(since=START + timedelta(minutes=1), until=START + timedelta(minutes=4))
+    assert route.documents(start, end) == points[1:4]
+
+    start, end = route.window(after=(points[2]["timestamp"], points[2]["_id"]))
+    assert route.documents(start, end) == points[3:]
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["points"]) == (1, 1, 5)
+
+
+async def test_ingested_points_are_added():
+    """Test ingest keeps a cached route current, in order and without duplicates"""
+    package_id = ObjectId()
+    points = [make_point(package_id, i) for i in (0, 2)]
+    cache = RouteCache()
+    route = await cache.load("TRK-1", package_id, batches_of(points))
+
+    late = make_point(package_id, 1)
+    cache.add("TRK-1", late)
+    cache.add("TRK-1", late)
+    cache.add("TRK-2", make_point(ObjectId(), 0))  # not cached: ignored
+
+    assert route.documents(0, len(route)) == [points[0], late, points[1]]
+    assert cache.get_stats()["points"] == 3
+
+
+async def test_merge_moves_point():
+    """Test a thinning merge moves the kept point and keeps its created_at"""
+    package_id = ObjectId()
+    points = [make_point(package_id, 0), make_point(package_id, 1)]
+    cache = RouteCache()
+    route = await cache.load("TRK-1", package_id, batches_of(points))
+
+    moved = {**make_point(package_id, 3, latitude=28.70), "_id": points[1]["_id"]}
+    cache.add("TRK-1", moved, replaces=points[1]["_id"])
+
+    assert len(route) == 2
+    last = route.document(1)
+    assert (last["latitude"], last["timestamp"], last["created_at"]) == (28.70, moved["timestamp"], points[1]["created_at"])
+
+
+async def test_points_written_during_load_are_kept():
+    """Test points ingested while a route is being read are merged in"""
+    package_id = ObjectId()
+    points = [make_point(package_id, i) for i in range(3)]
+    cache = RouteCache()
+    written = make_point(package_id, 5)
+
+    async def read():
+        yield points[:2]
+        # Written after the cursor started; may or may not be in later batches
+        cache.add("TRK-1", written)
+        yield points[2:] + [written]
+
+    route = await cache.load("TRK-1", package_id, read)
+    assert route.documents(0, len(route)) == points + [written]
+
+
+async def test_budget_evicts_least_recent():
+    """Test the point budget evicts the least recently used route"""
+    cache = RouteCache(max_points=5)
+    for name in ("A", "B"):
+        package_id = ObjectId()
+        await cache.load(name, package_id, batches_of([make_point(package_id, i) for i in range(3)]))
+
+    assert cache.get("A") is None
+    assert cache.get("B") is not None
+    assert cache.get_stats()["evictions"] == 1
+
+
+async def test_long_routes_are_not_cached():
+    """Test routes over max_route_points are not cached or retried"""
+    package_id = ObjectId()
+    cache = RouteCache(max_route_points=3)
+    points = [make_point(package_id, i) for i in range(4)]
+    assert await cache.load("TRK-1", package_id, batches_of(points)) is None
+    assert await cache.load("TRK-1", package_id, batches_of(points)) is None
+    assert cache.get_stats()["routes"] == 0
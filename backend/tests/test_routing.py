@@ -0,0 +1,181 @@
+"""
+Unit tests for the road graph routing engine
+"""
+import heapq
+import math
+import random
+import pytest
+from datetime import datetime
+from tracking.eta import calculate_distance, calculate_eta, set_road_graph
+from tracking.routing import RoadGraph, RoadGraphBuilder, road_direction, road_speed_kmh
+
+NOW = datetime(2024, 1, 1, 10, 0, 0)
+
+# Degrees per ~100 m block
+BLOCK = 0.0009
+
+
+def make_grid(size: int = 8, seed: int = 1) -> RoadGraphBuilder:
+    """size x size grid of streets, some one-way, with mixed speeds"""
+    rng = random.Random(seed)
+    builder = RoadGraphBuilder()
+    for i in range(size):
+        row = [(28.6 + i * BLOCK, 77.2 + j * BLOCK) for j in range(size)]
+        column = [(28.6 + j * BLOCK, 77.2 + i * BLOCK) for j in range(size)]
+        for road in (row, column):
+            for a, b in zip(road, road[1:]):
+                builder.add_road([a, b], rng.choice([15.0, 30.0, 50.0]), rng.choice([0, 0, 1, -1]))
+    return builder
+
+
+def dijkstra(builder: RoadGraphBuilder, source: int, target: int):
+    """Reference (seconds, length_m) over the uncontracted edges"""
+    adjacency = {}
+    for u, w, length_m, seconds in builder.edges:
+        adjacency.setdefault(u, []).append((w, seconds, length_m))
+    best = {source: (0.0, 0.0)}
+    heap = [(0.0, 0.0, source)]
+    while heap:
+        seconds, length_m, v = heapq.heappop(heap)
+        if v == target:
+            return seconds, length_m
+        if seconds > best[v][0]:
+            continue
+        for w, edge_seconds, edge_length in adjacency.get(v, ()):
+            if seconds + edge_seconds < best.get(w, (math.inf,))[0]:
+                best[w] = (seconds + edge_seconds, length_m + edge_length)
+                heapq.heappush(heap, (seconds + edge_seconds, length_m + edge_length, w))
+    return None
+
+
+def test_matches_dijkstra():
+    """Test hierarchy queries find the fastest route of the original graph"""
+    builder = make_grid()
+    graph = builder.build()
+    nodes = graph.nodes
+    for source in range(0, nodes, 5):
+        for target in range(0, nodes, 7):
+            expected = dijkstra(builder, source, target)
+            result = graph.shortest_path(source, target)
+            if expected is None:
+                assert result is None
+                continue
+            length_m, seconds = result
+            assert seconds == pytest.approx(expected[0], rel=1e-4)
+            assert length_m >= calculate_distance(
+                graph.latitude[source], graph.longitude[source],
+                graph.latitude[target], graph.longitude[target]
+            ) * 1000 * (1 - 1e-4)
+
+
+def test_one_way_and_unreachable():
+    """Test one-way streets are only routed forwards"""
+    builder = RoadGraphBuilder()
+    builder.add_road([(28.6, 77.2), (28.601, 77.2), (28.602, 77.2)], 36.0, direction=1)
+    builder.add_node(28.7, 77.3)
+    graph = builder.build()
+
+    length_m, seconds = graph.shortest_path(0, 2)
+    assert length_m == pytest.approx(222.4, abs=0.5)
+    assert seconds == pytest.approx(length_m / 10, rel=1e-4)
+    assert graph.shortest_path(2, 0) is None
+    assert graph.shortest_path(0, 3) is None
+
+
+def test_write_and_open(tmp_path):
+    """Test the graph file round trip"""
+    builder = make_grid(5)
+    graph = builder.build()
+    path = str(tmp_path / "roads.bin")
+    graph.write(path)
+    loaded = RoadGraph.open(path)
+    assert loaded.nodes == graph.nodes
+    assert len(loaded.up) == len(graph.up)
+    for source, target in [(0, 24), (24, 0), (3, 17)]:
+        assert loaded.shortest_path(source, target) == graph.shortest_path(source, target)
+
+
+def test_open_rejects_bad_files(tmp_path):
+    """Test bad magic and truncation are reported as ValueError"""
+    path = tmp_path / "roads.bin"
+    path.write_bytes(b"XXXX" + bytes(12))
+    with pytest.raises(ValueError):
+        RoadGraph.open(str(path))
+
+    make_grid(3).build().write(str(path))
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError):
+        RoadGraph.open(str(path))
+
+
+def test_nearest_node():
+    """Test snapping picks the nearest node within the snap distance"""
+    graph = make_grid(5).build()
+    graph.max_snap_km = 0.5
+    node, distance_km = graph.nearest_node(28.6 + 2 * BLOCK + 0.0001, 77.2 + 3 * BLOCK - 0.0001)
+    assert (graph.latitude[node], graph.longitude[node]) == pytest.approx((28.6 + 2 * BLOCK, 77.2 + 3 * BLOCK))
+    assert distance_km < 0.02
+    assert graph.nearest_node(28.7, 77.2) is None
+
+
+def test_route_adds_snapped_stretches():
+    """Test route() counts the straight stretches to the snapped nodes"""
+    builder = make_grid(5)
+    graph = builder.build()
+    route = graph.route(28.6 - 0.0002, 77.2, 28.6 + 4 * BLOCK, 77.2 + 4 * BLOCK + 0.0002)
+    length_m, _ = graph.shortest_path(0, graph.nearest_node(28.6 + 4 * BLOCK, 77.2 + 4 * BLOCK)[0])
+    assert route.snapped_km == pytest.approx(0.0222 + 0.0195, abs=0.002)
+    assert route.distance_km == pytest.approx(length_m / 1000 + route.snapped_km)
+    assert graph.route(28.6, 77.2, 29.0, 77.2) is None
+
+
+def test_calculate_eta_uses_road_distance():
+    """Test calculate_eta times the road distance when a graph is set"""
+    builder = RoadGraphBuilder()
+    # A detour: 0.9 km east, 0.9 km north, 0.9 km back west
+    builder.add_road([(28.6, 77.2), (28.6, 77.2092), (28.6081, 77.2092), (28.6081, 77.2)], 30.0)
+    graph = builder.build()
+    straight = calculate_eta(28.6, 77.2, 28.6081, 77.2, now=NOW)
+    try:
+        set_road_graph(graph)
+        road = calculate_eta(28.6, 77.2, 28.6081, 77.2, now=NOW)
+        # Off the graph: straight line
+        off_graph = calculate_eta(28.7, 77.3, 28.71, 77.3, now=NOW)
+    finally:
+        set_road_graph(None)
+    # 0.9 km vs 2.7 km at 30 km/h, plus the 5 minute minimum buffer
+    assert (straight - NOW).total_seconds() == pytest.approx((0.9 / 30 + 5 / 60) * 3600, rel=0.01)
+    assert (road - NOW).total_seconds() == pytest.approx((2.7 / 30 + 5 / 60) * 3600, rel=0.01)
+    assert off_graph == calculate_eta(28.7, 77.3, 28.71, 77.3, now=NOW)
+
+
+def test_geojson_properties():
+    """Test OSM speed and direction tags"""
+    assert road_speed_kmh({"maxspeed": "40"}) == 40
+    assert road_speed_kmh({"maxspeed": "30 mph"}) == pytest.approx(48.28, abs=0.01)
+    assert road_speed_kmh({"highway": "residential"}) == 20
+    assert road_speed_kmh({"highway": "path", "maxspeed": "none"}) == 25
+    assert road_direction({"oneway": "yes"}) == 1
+    assert road_direction({"oneway": "-1"}) == -1
+    assert road_direction({"junction": "roundabout"}) == 1
+    assert road_direction({"highway": "primary"}) == 0
+
+    builder = RoadGraphBuilder()
+    added = builder.add_geojson({
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"highway": "primary", "oneway": "yes"},
+                "geometry": {"type": "LineString", "coordinates": [[77.2, 28.6], [77.201, 28.6], [77.202, 28.6]]}
+            },
+            {
+                "type": "Feature",
+                "properties": {"highway": "residential"},
+                "geometry": {"type": "MultiLineString", "coordinates": [[[77.202, 28.6], [77.202, 28.601]]]}
+            },
+            {"type": "Feature", "properties": {}, "geometry": {"type": "Point", "coordinates": [77.2, 28.6]}}
+        ]
+    })
+    assert added == 4
+    assert len(builder.latitude) == 4
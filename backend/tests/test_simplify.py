@@ -0,0 +1,55 @@
+"""
+Unit tests for route simplification and polyline encoding
+"""
+import numpy as np
+import pytest
+from tracking.simplify import rdp_mask, zoom_tolerance_meters, encode_polyline, decode_polyline
+
+
+def test_encode_polyline_reference():
+    """Test the encoder against Google's documented example"""
+    encoded = encode_polyline([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453])
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline(encoded) == [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def test_encode_polyline_empty():
+    """Test an empty route encodes to an empty string"""
+    assert encode_polyline([], []) == ""
+
+
+def test_rdp_drops_collinear_points():
+    """Test points on a straight line are dropped and the endpoints kept"""
+    latitudes = np.linspace(28.60, 28.70, 101)
+    longitudes = np.full(101, 77.20)
+    mask = rdp_mask(latitudes, longitudes, tolerance_m=1.0)
+    assert mask.tolist() == [True] + [False] * 99 + [True]
+
+
+def test_rdp_keeps_corners():
+    """Test a detour larger than the tolerance is kept"""
+    latitudes = [28.60, 28.61, 28.62, 28.62, 28.62]
+    longitudes = [77.20, 77.20, 77.20, 77.21, 77.22]
+    mask = rdp_mask(latitudes, longitudes, tolerance_m=10.0)
+    assert mask.tolist() == [True, False, True, False, True]
+
+
+def test_rdp_tolerance_bounds_error():
+    """Test every dropped point lies within the tolerance of the simplified line"""
+    rng = np.random.default_rng(7)
+    t = np.linspace(0, 6, 2000)
+    latitudes = 28.6 + 0.05 * np.sin(t) + rng.normal(0, 2e-5, t.size)
+    longitudes = 77.2 + 0.01 * t
+    mask = rdp_mask(latitudes, longitudes, tolerance_m=25.0)
+    assert 2 < mask.sum() < 200
+
+    kept = np.flatnonzero(mask)
+    for start, end in zip(kept[:-1], kept[1:]):
+        inner = rdp_mask(latitudes[start:end + 1], longitudes[start:end + 1], tolerance_m=25.0)
+        assert inner.sum() == 2
+
+
+def test_zoom_tolerance():
+    """Test the zoom tolerance halves with each zoom level"""
+    assert zoom_tolerance_meters(0, 0.0) == pytest.approx(156543.03392)
+    assert zoom_tolerance_meters(15, 45.0) == pytest.approx(zoom_tolerance_meters(14, 45.0) / 2)
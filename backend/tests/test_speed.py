@@ -0,0 +1,99 @@
+"""
+Unit tests for the observed-speed estimator behind speed-aware ETAs
+"""
+import pytest
+from datetime import datetime, timedelta
+from tracking.eta import calculate_distance
+from tracking.speed import SpeedEstimator
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+
+# Degrees of latitude per kilometer
+KM = 1 / 111.195
+
+
+def drive(estimator, key, speeds_kmh, seconds=60, start=START, latitude=28.6):
+    """Feed a straight northbound drive, one segment per speed"""
+    estimator.observe(key, latitude, 77.2, start)
+    ts = start
+    for speed in speeds_kmh:
+        latitude += speed * seconds / 3600 * KM
+        ts += timedelta(seconds=seconds)
+        estimator.observe(key, latitude, 77.2, ts)
+    return latitude, ts
+
+
+def test_falls_back_without_enough_segments():
+    """Test no estimate is given before min_segments segments"""
+    estimator = SpeedEstimator(min_segments=3)
+    drive(estimator, "TRK-1", [40, 40])
+    assert estimator.speed_kmh("TRK-1") is None
+    assert estimator.speed_kmh("TRK-2") is None
+    assert estimator.get_stats()["fallbacks"] == 2
+
+
+def test_constant_speed():
+    """Test a steady drive estimates its speed"""
+    estimator = SpeedEstimator()
+    drive(estimator, "TRK-1", [42] * 5)
+    assert estimator.speed_kmh("TRK-1") == pytest.approx(42, rel=1e-3)
+
+
+def test_ewma_follows_recent_segments():
+    """Test the average moves towards the latest speed, weighted by the window"""
+    estimator = SpeedEstimator(window_segments=3)
+    drive(estimator, "TRK-1", [60, 60, 20])
+    # alpha = 2 / (3 + 1): 60 -> 60 -> 60 + 0.5 * (20 - 60)
+    assert estimator.speed_kmh("TRK-1") == pytest.approx(40, rel=1e-3)
+
+
+def test_short_segments_are_extended():
+    """Test points closer than min_segment_seconds are folded into the next segment"""
+    estimator = SpeedEstimator(min_segment_seconds=10, min_segments=1)
+    estimator.observe("TRK-1", 28.6, 77.2, START)
+    estimator.observe("TRK-1", 28.6 + 0.01 * KM, 77.2, START + timedelta(seconds=2))
+    assert estimator.speed_kmh("TRK-1") is None
+
+    estimator.observe("TRK-1", 28.6 + 0.5 * KM, 77.2, START + timedelta(seconds=60))
+    assert estimator.speed_kmh("TRK-1") == pytest.approx(30, rel=1e-3)
+
+
+def test_gps_jumps_are_rejected():
+    """Test implausible segment speeds are not averaged"""
+    estimator = SpeedEstimator(max_speed_kmh=150)
+    latitude, ts = drive(estimator, "TRK-1", [30, 30, 30])
+    estimator.observe("TRK-1", latitude + 10 * KM, 77.2, ts + timedelta(seconds=60))
+
+    assert estimator.speed_kmh("TRK-1") == pytest.approx(30, rel=1e-3)
+    assert estimator.get_stats()["rejected_segments"] == 1
+
+
+def test_parked_courier_has_minimum_speed():
+    """Test a stopped courier gets min_speed_kmh rather than zero"""
+    estimator = SpeedEstimator(min_speed_kmh=5)
+    drive(estimator, "TRK-1", [0] * 5)
+    assert estimator.speed_kmh("TRK-1") == 5
+
+
+def test_seed_from_stored_points():
+    """Test seeding from history matches observing the same points"""
+    points = [
+        {"latitude": 28.6 + i * 0.5 * KM, "longitude": 77.2, "timestamp": START + timedelta(minutes=i)}
+        for i in range(5)
+    ]
+    estimator = SpeedEstimator()
+    assert not estimator.tracks("TRK-1")
+    estimator.seed("TRK-1", points)
+
+    assert estimator.tracks("TRK-1")
+    expected = calculate_distance(points[0]["latitude"], 77.2, points[1]["latitude"], 77.2) * 60
+    assert estimator.speed_kmh("TRK-1") == pytest.approx(expected)
+
+
+def test_max_packages_evicts_oldest():
+    """Test state is bounded to max_packages"""
+    estimator = SpeedEstimator(max_packages=2)
+    for key in ["TRK-1", "TRK-2", "TRK-3"]:
+        estimator.observe(key, 28.6, 77.2, START)
+    assert not estimator.tracks("TRK-1")
+    assert estimator.get_stats()["tracked_packages"] == 2
@@ -0,0 +1,120 @@
+"""
+Unit tests for the historical speed table and per-step ETAs
+"""
+import pytest
+from datetime import datetime, timedelta
+from tracking.eta import calculate_eta, calculate_eta_along
+from tracking.speed_table import (
+    SpeedTable,
+    SpeedTableBuilder,
+    geohash_cell,
+    geohash_string,
+    hour_of_week
+)
+
+# Monday 08:00 UTC
+START = datetime(2024, 1, 1, 8, 0, 0)
+
+# Degrees of latitude per kilometer
+KM = 1 / 111.195
+
+
+def make_track(speed_kmh, minutes=10, start=START, latitude=28.6):
+    """A straight northbound track with one point per minute"""
+    return [
+        {
+            "latitude": latitude + speed_kmh * i / 60 * KM,
+            "longitude": 77.2,
+            "timestamp": start + timedelta(minutes=i)
+        }
+        for i in range(minutes + 1)
+    ]
+
+
+def test_geohash_matches_reference():
+    """Test integer geohashes encode to the standard base32 geohash"""
+    assert geohash_string(geohash_cell(42.605, -5.603, 5), 5) == "ezs42"
+    assert geohash_string(geohash_cell(57.64911, 10.40744, 11), 11) == "u4pruydqqvj"
+
+
+def test_hour_of_week():
+    """Test hours of week start on Monday 00:00 UTC"""
+    assert hour_of_week(datetime(2024, 1, 1, 0, 30)) == 0
+    assert hour_of_week(START) == 8
+    assert hour_of_week(datetime(2024, 1, 7, 23, 59)) == 167
+
+
+def test_build_and_lookup(tmp_path):
+    """Test a written table is memory-mapped and answers lookups"""
+    builder = SpeedTableBuilder(precision=5)
+    assert builder.add_track(make_track(24)) == 10
+    path = str(tmp_path / "speed_table.bin")
+    builder.write(path)
+
+    table = SpeedTable.open(path)
+    assert len(table) == len(builder.totals)
+    assert table.speed_kmh(28.6, 77.2, START + timedelta(minutes=5)) == pytest.approx(24, rel=1e-3)
+    # Another hour of week, another place
+    assert table.speed_kmh(28.6, 77.2, START + timedelta(hours=1)) is None
+    assert table.speed_kmh(19.07, 72.87, START) is None
+
+
+def test_sparse_cells_are_ignored(tmp_path):
+    """Test cells with fewer than min_segments segments give no speed"""
+    builder = SpeedTableBuilder()
+    builder.add_track(make_track(24, minutes=2))
+    path = str(tmp_path / "speed_table.bin")
+    builder.write(path)
+
+    assert SpeedTable.open(path, min_segments=3).speed_kmh(28.6, 77.2, START) is None
+    assert SpeedTable.open(path, min_segments=2).speed_kmh(28.6, 77.2, START) == pytest.approx(24, rel=1e-3)
+
+
+def test_gaps_and_jumps_are_skipped():
+    """Test data gaps and implausible speeds are not counted"""
+    builder = SpeedTableBuilder(max_segment_seconds=600, max_speed_kmh=150)
+    track = make_track(24, minutes=1)
+    track.append({"latitude": 28.7, "longitude": 77.2, "timestamp": START + timedelta(minutes=30)})
+    track.append({"latitude": 29.7, "longitude": 77.2, "timestamp": START + timedelta(minutes=31)})
+    assert builder.add_track(track) == 1
+
+
+def test_incremental_rebuild(tmp_path):
+    """Test a table reopened for an update keeps its totals and watermark"""
+    # Both tracks stay inside one precision-5 cell
+    path = str(tmp_path / "speed_table.bin")
+    builder = SpeedTableBuilder()
+    builder.add_track(make_track(20, minutes=3, latitude=28.58))
+    builder.built_until = START + timedelta(days=1)
+    builder.write(path)
+
+    builder = SpeedTableBuilder.from_table(SpeedTable.open(path))
+    assert builder.built_until == START + timedelta(days=1)
+    builder.add_track(make_track(40, minutes=3, start=START + timedelta(days=7), latitude=28.58))
+    builder.write(path)
+
+    # Same place and hour of week a week later: 3 km in 6 minutes
+    speed = SpeedTable.open(path).speed_kmh(28.58, 77.2, START)
+    assert speed == pytest.approx(30, rel=1e-3)
+
+
+def test_eta_along_constant_matches_calculate_eta():
+    """Test per-step ETAs with no known speeds equal the flat ETA"""
+    eta = calculate_eta_along(28.6139, 77.2090, 28.4089, 77.0418, lambda lat, lon, ts: None)
+    expected = calculate_eta(28.6139, 77.2090, 28.4089, 77.0418)
+    assert abs((eta - expected).total_seconds()) < 1
+
+
+def test_eta_along_uses_step_speeds():
+    """Test known slow stretches lengthen the ETA"""
+    destination = 28.6 + 9.5 * KM
+    fast = calculate_eta_along(28.6, 77.2, destination, 77.2, lambda lat, lon, ts: 60.0)
+    slow_second_half = calculate_eta_along(
+        28.6, 77.2, destination, 77.2,
+        lambda lat, lon, ts: 60.0 if lat < 28.6 + 4.75 * KM else 15.0
+    )
+    now = datetime.utcnow()
+    # 9.5 km at 60 km/h, plus the 5 minute minimum buffer
+    assert (fast - now).total_seconds() / 60 == pytest.approx(14.5, abs=0.1)
+    # 4.75 km at 60 and 4.75 km at 15 km/h, plus the buffer
+    assert (slow_second_half - now).total_seconds() / 60 == pytest.approx(23.75 + 5, abs=0.1)
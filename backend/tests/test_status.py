@@ -0,0 +1,25 @@
+"""
+Unit tests for package status transition rules
+"""
+from packages.status import can_transition, allowed_source_states, TransitionResult
+
+
+def test_can_transition():
+    """Test valid and invalid transitions"""
+    assert can_transition("registered", "in_transit")
+    assert can_transition("in_transit", "delivered")
+    assert not can_transition("delivered", "in_transit")
+
+
+def test_allowed_source_states_match_transitions():
+    """Test the conditional update filter agrees with can_transition"""
+    for new_status in ["registered", "in_transit", "delivered"]:
+        sources = allowed_source_states(new_status)
+        for current_status in ["registered", "in_transit", "delivered"]:
+            assert (current_status in sources) == can_transition(current_status, new_status)
+
+
+def test_transition_result_ok():
+    """Test TransitionResult reports success only with a document"""
+    assert TransitionResult(package={"status": "in_transit"}).ok
+    assert not TransitionResult(reason="rejected", current_status="delivered").ok
@@ -0,0 +1,103 @@
+"""
+Unit tests for the bucketed location storage layout
+"""
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+from db.connection import connect_to_mongo
+from tracking.storage import (
+    BUCKETS_COLLECTION,
+    get_route_locations,
+    insert_locations,
+    update_location_point,
+    bucket_hour,
+    bucket_update,
+    unpack_bucket,
+    encode_history_cursor,
+    decode_history_cursor
+)
+from migrate_location_buckets import build_buckets
+
+
+def make_point(package_id, ts):
+    return {
+        "_id": ObjectId(),
+        "package_id": package_id,
+        "latitude": 28.65,
+        "longitude": 77.20,
+        "timestamp": ts,
+        "created_at": ts
+    }
+
+
+def test_bucket_hour():
+    """Test points are bucketed by the start of their hour"""
+    assert bucket_hour(datetime(2024, 1, 1, 10, 59, 30, 5)) == datetime(2024, 1, 1, 10)
+
+
+def test_bucket_update_targets_open_bucket():
+    """Test the upsert filter only matches non-full buckets of the point's hour"""
+    package_id = ObjectId()
+    point = make_point(package_id, datetime(2024, 1, 1, 10, 15))
+    bucket_filter, update = bucket_update(point, bucket_size=50)
+
+    assert bucket_filter == {"package_id": package_id, "hour": datetime(2024, 1, 1, 10), "count": {"$lt": 50}}
+    assert update["$push"]["points"]["_id"] == point["_id"]
+    assert "package_id" not in update["$push"]["points"]
+
+
+def test_build_buckets_round_trip():
+    """Test migration buckets split by hour and size and unpack to the original points"""
+    package_id = ObjectId()
+    start = datetime(2024, 1, 1, 10, 0)
+    points = [make_point(package_id, start + timedelta(minutes=10 * i)) for i in range(9)]
+
+    buckets = build_buckets(package_id, points)
+    assert [b["count"] for b in buckets] == [6, 3]
+
+    unpacked = [loc for bucket in buckets for loc in unpack_bucket(bucket)]
+    assert unpacked == points
+
+
+def test_history_cursor_round_trip():
+    """Test the history cursor encodes the (timestamp, _id) keyset position"""
+    point = make_point(ObjectId(), datetime(2024, 1, 1, 10, 15, 30, 123000))
+    cursor = encode_history_cursor(point)
+    assert "|" not in cursor
+    assert decode_history_cursor(cursor) == (point["timestamp"], point["_id"])
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "MjAyNC0wMS0wMQ"])
+def test_history_cursor_rejects_garbage(cursor):
+    """Test malformed cursors raise ValueError"""
+    with pytest.raises(ValueError):
+        decode_history_cursor(cursor)
+
+
+async def test_merge_across_hour_moves_point(monkeypatch):
+    """Test a merged point whose timestamp crosses the hour moves to that hour's bucket"""
+    monkeypatch.setattr("tracking.storage.LOCATION_STORAGE_MODE", "buckets")
+    database = await connect_to_mongo()
+    package_id = ObjectId()
+    start = datetime(2024, 1, 1, 10, 50)
+    points = [make_point(package_id, start), make_point(package_id, start + timedelta(minutes=5))]
+    await insert_locations(database, points)
+
+    try:
+        # Same hour: updated in place and the bucket's max follows
+        await update_location_point(database, package_id, points[1]["_id"], {"timestamp": start + timedelta(minutes=8)})
+        bucket = await database[BUCKETS_COLLECTION].find_one({"package_id": package_id})
+        assert bucket["max_timestamp"] == start + timedelta(minutes=8)
+
+        # Next hour: the point leaves the 10:00 bucket
+        moved = start + timedelta(minutes=15)
+        await update_location_point(database, package_id, points[1]["_id"], {"timestamp": moved, "latitude": 28.66})
+        buckets = await database[BUCKETS_COLLECTION].find({"package_id": package_id}).sort("hour", 1).to_list(None)
+        assert [(b["hour"], b["count"]) for b in buckets] == [(bucket_hour(start), 1), (bucket_hour(moved), 1)]
+        assert buckets[1]["points"][0]["_id"] == points[1]["_id"]
+        assert buckets[1]["min_timestamp"] == moved
+
+        route = await get_route_locations(database, package_id, since=bucket_hour(moved))
+        assert [(loc["_id"], loc["latitude"]) for loc in route] == [(points[1]["_id"], 28.66)]
+    finally:
+        await database[BUCKETS_COLLECTION].delete_many({"package_id": package_id})
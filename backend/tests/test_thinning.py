@@ -0,0 +1,82 @@
+"""
+Unit tests for ingest-time GPS point thinning
+"""
+from datetime import datetime, timedelta
+from tracking.thinning import LocationThinner, cross_track_distance_km, KEEP, DROP, MERGE
+
+START = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def test_first_point_is_kept():
+    """Test a package with no state keeps its first point"""
+    thinner = LocationThinner()
+    assert thinner.decide("TRK-1", 28.6139, 77.2090, START) == (KEEP, None)
+
+
+def test_parked_points_are_dropped():
+    """Test near-identical points within the time tolerance are dropped"""
+    thinner = LocationThinner(distance_tolerance_km=0.02, time_tolerance_seconds=60)
+    thinner.keep("TRK-1", 28.6139, 77.2090, START, "kept-id")
+
+    action, doc_id = thinner.decide("TRK-1", 28.61391, 77.20901, START + timedelta(seconds=5))
+    assert action == DROP
+    assert doc_id == "kept-id"
+    assert thinner.get_stats()["dropped"] == 1
+
+
+def test_parked_heartbeat_is_kept():
+    """Test a parked courier still produces a point once the time tolerance passes"""
+    thinner = LocationThinner(distance_tolerance_km=0.02, time_tolerance_seconds=60)
+    thinner.keep("TRK-1", 28.6139, 77.2090, START, "kept-id")
+    assert thinner.decide("TRK-1", 28.6139, 77.2090, START + timedelta(seconds=90))[0] == KEEP
+
+
+def test_moving_points_are_kept():
+    """Test points beyond the distance tolerance are kept"""
+    thinner = LocationThinner(distance_tolerance_km=0.02)
+    thinner.keep("TRK-1", 28.6139, 77.2090, START, "kept-id")
+    assert thinner.decide("TRK-1", 28.6200, 77.2090, START + timedelta(seconds=5))[0] == KEEP
+
+
+def test_collinear_points_are_merged():
+    """Test the online simplifier merges a redundant point on a straight stretch"""
+    thinner = LocationThinner(simplify_tolerance_km=0.01)
+    thinner.keep("TRK-1", 28.6000, 77.2000, START, "a")
+    thinner.keep("TRK-1", 28.6010, 77.2000, START + timedelta(seconds=10), "b")
+
+    action, doc_id = thinner.decide("TRK-1", 28.6020, 77.2000, START + timedelta(seconds=20))
+    assert (action, doc_id) == (MERGE, "b")
+    thinner.merge("TRK-1", 28.6020, 77.2000, START + timedelta(seconds=20))
+    assert thinner.get_stats()["merged"] == 1
+
+    # A turn is kept
+    assert thinner.decide("TRK-1", 28.6020, 77.2100, START + timedelta(seconds=30))[0] == KEEP
+    assert thinner.decide("TRK-1", 28.6030, 77.2000, START + timedelta(seconds=30), allow_merge=False)[0] == KEEP
+
+
+def test_merge_state_waits_for_the_write():
+    """Test a MERGE decision leaves the last kept point alone until merge() is called"""
+    thinner = LocationThinner(simplify_tolerance_km=0.01)
+    thinner.keep("TRK-1", 28.6000, 77.2000, START, "a")
+    thinner.keep("TRK-1", 28.6010, 77.2000, START + timedelta(seconds=10), "b")
+    assert thinner.decide("TRK-1", 28.6020, 77.2000, START + timedelta(seconds=20))[0] == MERGE
+
+    # The write failed: a point near the original "b" is still a duplicate of it
+    assert thinner.decide("TRK-1", 28.60101, 77.2000, START + timedelta(seconds=21)) == (DROP, "b")
+    assert thinner.get_stats()["merged"] == 0
+
+
+def test_state_is_lru_bounded():
+    """Test the per-package state never exceeds max_packages"""
+    thinner = LocationThinner(max_packages=2)
+    for i in range(5):
+        thinner.keep(f"TRK-{i}", 28.6, 77.2, START, str(i))
+    assert thinner.get_stats()["tracked_packages"] == 2
+    assert thinner.decide("TRK-0", 28.6, 77.2, START)[0] == KEEP
+
+
+def test_cross_track_distance():
+    """Test cross-track distance of a point off a north-south segment"""
+    # ~0.001 deg of longitude at 28.6N is ~98 m
+    distance = cross_track_distance_km(28.6005, 77.2010, 28.6000, 77.2000, 28.6010, 77.2000)
+    assert 0.09 < distance < 0.1
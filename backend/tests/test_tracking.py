@@ -1,9 +1,12 @@
 """
 Unit tests for tracking endpoints
 """
+import json
 import pytest
 from fastapi.testclient import TestClient
 from main import app
+from tracking.codec import PACKED_CONTENT_TYPE, encode_packed, encode_packed_record
+from tracking.simplify import decode_polyline
 from bson import ObjectId
 
 client = TestClient(app)
@@ -129,6 +132,114 @@ def test_get_route_history(customer_token, test_package, delivery_token):
     assert len(data["locations"]) > 0
 
 
+def test_get_route_history_pages(customer_token, test_package, delivery_token):
+    """Test paging through route history with the cursor and a time window"""
+    client.post(
+        "/api/tracking/batch",
+        json={"updates": [
+            {"tracking_id": test_package, "latitude": 28.65 + i * 0.01, "longitude": 77.20, "timestamp": f"2024-01-01T10:0{i}:00"}
+            for i in range(5)
+        ]},
+        headers={"Authorization": f"Bearer {delivery_token}"}
+    )
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    
+    first = client.get(f"/api/tracking/{test_package}/history?limit=3", headers=headers).json()
+    assert first["total"] == 3
+    assert first["has_more"] is True
+    
+    second = client.get(
+        f"/api/tracking/{test_package}/history",
+        params={"limit": 3, "cursor": first["next_cursor"]},
+        headers=headers
+    ).json()
+    assert second["total"] == 2
+    assert second["has_more"] is False
+    assert second["locations"][0]["timestamp"] == "2024-01-01T10:03:00"
+    
+    window = client.get(
+        f"/api/tracking/{test_package}/history",
+        params={"since": "2024-01-01T10:01:00", "until": "2024-01-01T10:03:00"},
+        headers=headers
+    ).json()
+    assert [loc["timestamp"] for loc in window["locations"]] == ["2024-01-01T10:01:00", "2024-01-01T10:02:00"]
+    
+    response = client.get(f"/api/tracking/{test_package}/history?cursor=bogus", headers=headers)
+    assert response.status_code == 400
+
+
+def test_get_route_history_simplified_polyline(customer_token, test_package, delivery_token):
+    """Test simplified route history as an encoded polyline"""
+    client.post(
+        "/api/tracking/batch",
+        json={"updates": [
+            {"tracking_id": test_package, "latitude": 28.60 + i * 0.001, "longitude": 77.20, "timestamp": f"2024-01-01T10:{i:02d}:00"}
+            for i in range(20)
+        ]},
+        headers={"Authorization": f"Bearer {delivery_token}"}
+    )
+    
+    response = client.get(
+        f"/api/tracking/{test_package}/history",
+        params={"simplify": 5, "format": "polyline"},
+        headers={"Authorization": f"Bearer {customer_token}"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["locations"] == []
+    assert data["total"] == 2  # straight line: only the endpoints remain
+    assert decode_polyline(data["polyline"]) == [(28.6, 77.2), (28.619, 77.2)]
+
+
+def test_simplified_history_is_paged(customer_token, test_package, delivery_token):
+    """Test simplified route history reads at most limit points per page"""
+    client.post(
+        "/api/tracking/batch",
+        json={"updates": [
+            {"tracking_id": test_package, "latitude": 28.60 + i * 0.001, "longitude": 77.20, "timestamp": f"2024-01-01T10:{i:02d}:00"}
+            for i in range(20)
+        ]},
+        headers={"Authorization": f"Bearer {delivery_token}"}
+    )
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    
+    first = client.get(f"/api/tracking/{test_package}/history", params={"simplify": 5, "limit": 10}, headers=headers).json()
+    assert first["has_more"] is True
+    assert [loc["latitude"] for loc in first["locations"]] == [28.6, 28.609]
+    second = client.get(
+        f"/api/tracking/{test_package}/history",
+        params={"simplify": 5, "limit": 10, "cursor": first["next_cursor"]},
+        headers=headers
+    ).json()
+    assert second["has_more"] is False
+    assert [loc["latitude"] for loc in second["locations"]] == pytest.approx([28.61, 28.619])
+    
+    response = client.get(f"/api/tracking/{test_package}/history", params={"simplify": 0}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_stream_route_history(customer_token, test_package, delivery_token):
+    """Test streaming route history as NDJSON"""
+    client.post(
+        "/api/tracking/batch",
+        json={"updates": [
+            {"tracking_id": test_package, "latitude": 28.65 + i * 0.01, "longitude": 77.20, "timestamp": f"2024-01-01T10:0{i}:00"}
+            for i in range(3)
+        ]},
+        headers={"Authorization": f"Bearer {delivery_token}"}
+    )
+    
+    response = client.get(
+        f"/api/tracking/{test_package}/history/stream",
+        headers={"Authorization": f"Bearer {customer_token}"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["timestamp"] for row in rows] == ["2024-01-01T10:00:00", "2024-01-01T10:01:00", "2024-01-01T10:02:00"]
+    assert rows[0]["latitude"] == 28.65
+
+
 def test_get_eta(customer_token, test_package, delivery_token):
     """Test getting ETA for a package"""
     # Update location first
@@ -149,3 +260,108 @@ def test_get_eta(customer_token, test_package, delivery_token):
     assert "formatted_eta" in data
     assert "time_remaining_minutes" in data
 
+
+
+def test_update_location_batch(delivery_token, test_package):
+    """Test uploading buffered locations in one batch"""
+    response = client.post(
+        "/api/tracking/batch",
+        json={"updates": [
+            {"tracking_id": test_package, "latitude": 28.6500, "longitude": 77.2000, "timestamp": "2024-01-01T10:00:00"},
+            {"tracking_id": test_package, "latitude": 28.6600, "longitude": 77.1900, "timestamp": "2024-01-01T10:01:00"}
+        ]},
+        headers={"Authorization": f"Bearer {delivery_token}"}
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["total"] == 2
+    assert data["locations"][1]["latitude"] == 28.6600
+
+
+def test_update_location_batch_packed(delivery_token, test_package):
+    """Test uploading a batch as packed binary columns"""
+    body = encode_packed([
+        (test_package, 28.6500, 77.2000, 1704103200.0),
+        (test_package, 28.6600, 77.1900, None)
+    ])
+    response = client.post(
+        "/api/tracking/batch",
+        content=body,
+        headers={"Authorization": f"Bearer {delivery_token}", "Content-Type": PACKED_CONTENT_TYPE}
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["total"] == 2
+    assert data["locations"][0]["timestamp"].startswith("2024-01-01T10:00:00")
+
+
+def test_update_location_packed_out_of_range(delivery_token, test_package):
+    """Test packed points get the same range validation as JSON"""
+    response = client.post(
+        f"/api/tracking/{test_package}/update",
+        content=encode_packed_record(91.0, 77.2),
+        headers={"Authorization": f"Bearer {delivery_token}", "Content-Type": PACKED_CONTENT_TYPE}
+    )
+    assert response.status_code == 422
+
+
+def test_update_location_batch_unknown_package(delivery_token):
+    """Test batch upload rejects unknown tracking IDs"""
+    response = client.post(
+        "/api/tracking/batch",
+        json={"updates": [{"tracking_id": "TRK-MISSING0", "latitude": 28.65, "longitude": 77.2}]},
+        headers={"Authorization": f"Bearer {delivery_token}"}
+    )
+    assert response.status_code == 404
+
+
+def test_update_location_idempotent_retry(delivery_token, customer_token, test_package):
+    """Test a retried upload with the same key returns the original point once"""
+    headers = {"Authorization": f"Bearer {delivery_token}", "Idempotency-Key": f"retry-{ObjectId()}"}
+    first = client.post(f"/api/tracking/{test_package}/update", json={"latitude": 28.65, "longitude": 77.20}, headers=headers)
+    retry = client.post(f"/api/tracking/{test_package}/update", json={"latitude": 28.65, "longitude": 77.20}, headers=headers)
+    assert first.status_code == 201
+    assert retry.json()["id"] == first.json()["id"]
+
+    history = client.get(
+        f"/api/tracking/{test_package}/history",
+        headers={"Authorization": f"Bearer {customer_token}"}
+    )
+    assert history.json()["total"] == 1
+
+
+def test_websocket_ingest(delivery_token, test_package):
+    """Test courier WebSocket ingest authenticates once and acks frames in batches"""
+    with client.websocket_connect(f"/api/tracking/ingest/ws?token={delivery_token}") as websocket:
+        assert websocket.receive_json()["type"] == "connected"
+        websocket.send_json({"type": "locations", "updates": [
+            {"ref": 1, "tracking_id": test_package, "latitude": 28.65, "longitude": 77.20},
+            {"ref": 2, "tracking_id": test_package, "latitude": 100.0, "longitude": 77.20}
+        ]})
+        ack = websocket.receive_json()
+        assert ack["type"] == "ack"
+        assert ack["refs"] == [1]
+        assert ack["errors"][0]["ref"] == 2
+        assert ack["errors"][0]["status"] == 422
+
+
+def test_websocket_ingest_rejects_non_object_frames(delivery_token, test_package):
+    """Test frames that are not JSON objects are acked as errors without dropping the connection"""
+    with client.websocket_connect(f"/api/tracking/ingest/ws?token={delivery_token}") as websocket:
+        assert websocket.receive_json()["type"] == "connected"
+        websocket.send_json([])
+        websocket.send_json({"type": "locations", "updates": [
+            "x",
+            {"ref": 1, "tracking_id": test_package, "latitude": 28.65, "longitude": 77.20}
+        ]})
+        ack = websocket.receive_json()
+        assert ack["refs"] == [1]
+        assert [error["status"] for error in ack["errors"]] == [400, 422]
+
+
+def test_websocket_ingest_requires_courier(customer_token):
+    """Test customers cannot open the ingest WebSocket"""
+    from starlette.websockets import WebSocketDisconnect
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/api/tracking/ingest/ws?token={customer_token}") as websocket:
+            websocket.receive_json()
@@ -0,0 +1,120 @@
+"""
+Cold archive tier for delivered packages' tracks
+
+A delivered package's history no longer changes, so archive_delivered_tracks.py
+moves it out of the hot location collection into one location_archives
+document per package holding the whole track as a compressed columnar blob:
+
+    header    <4sI>   magic b"TRK1", number of points
+    zlib stream of the columns, in (timestamp, _id) order
+      ids       12 bytes per point (ObjectId)
+      latitude  f64[n]
+      longitude f64[n]
+      timestamp i64[n]  milliseconds, delta from the previous point
+      created   i64[n]  milliseconds, offset from the point's timestamp
+
+Numeric columns are stored little-endian and byte-shuffled (all first bytes,
+then all second bytes, ...), which lets zlib compress the slowly changing
+high bytes of coordinates and the small deltas well. Decoding is lossless.
+
+The package document gets archived_at set; the read functions of
+tracking.storage merge the archive in for such packages, so route history
+reads work the same before and after archiving.
+"""
+import os
+import struct
+import zlib
+from array import array
+from datetime import datetime
+from typing import Optional
+import numpy as np
+from bson import Binary
+from tracking.route_cache import RouteColumns
+
+ARCHIVES_COLLECTION = "location_archives"
+
+ARCHIVE_MAGIC = b"TRK1"
+_HEADER = struct.Struct("<4sI")
+
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "6"))
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    """Little-endian 8-byte values, byte-transposed"""
+    return values.astype(values.dtype.newbyteorder("<")).view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype: str, n: int) -> np.ndarray:
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(8, n)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(n).astype(dtype[1:])
+
+
+def pack_route(route: RouteColumns, level: int = ARCHIVE_COMPRESSION_LEVEL) -> bytes:
+    """Encode a route as an archive blob"""
+    n = len(route)
+    timestamps = np.asarray(route.timestamps, dtype=np.int64)
+    created = np.asarray(route.created, dtype=np.int64)
+    columns = b"".join([
+        bytes(route.ids),
+        _shuffle(np.asarray(route.latitudes, dtype=np.float64)),
+        _shuffle(np.asarray(route.longitudes, dtype=np.float64)),
+        _shuffle(np.diff(timestamps, prepend=0)),
+        _shuffle(created - timestamps),
+    ])
+    return _HEADER.pack(ARCHIVE_MAGIC, n) + zlib.compress(columns, level)
+
+
+def unpack_route(blob: bytes, package_id) -> RouteColumns:
+    """
+    Decode an archive blob
+
+    Raises:
+        ValueError: The blob is not a valid archive
+    """
+    try:
+        magic, n = _HEADER.unpack_from(blob, 0)
+        columns = zlib.decompress(blob[_HEADER.size:])
+    except (struct.error, zlib.error):
+        raise ValueError("Corrupt track archive")
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError("Bad magic, expected TRK1")
+    if len(columns) != n * (12 + 8 * 4):
+        raise ValueError(f"Expected {n} points in track archive")
+
+    offset = 12 * n
+    ids = columns[:offset]
+    latitudes, longitudes, deltas, offsets = (
+        _unshuffle(columns[offset + 8 * n * i:offset + 8 * n * (i + 1)], dtype, n)
+        for i, dtype in enumerate(("<f8", "<f8", "<i8", "<i8"))
+    )
+    timestamps = np.cumsum(deltas)
+
+    route = RouteColumns(package_id)
+    route.ids = bytearray(ids)
+    route.latitudes = array("d", latitudes.tobytes())
+    route.longitudes = array("d", longitudes.tobytes())
+    route.timestamps = array("q", timestamps.tobytes())
+    route.created = array("q", (timestamps + offsets).tobytes())
+    return route
+
+
+def archive_document(package: dict, route: RouteColumns) -> dict:
+    """Build the location_archives document for a package's whole track"""
+    blob = pack_route(route)
+    return {
+        "package_id": package["_id"],
+        "tracking_id": package["tracking_id"],
+        "count": len(route),
+        "min_timestamp": route.document(0)["timestamp"] if len(route) else None,
+        "max_timestamp": route.document(len(route) - 1)["timestamp"] if len(route) else None,
+        "data": Binary(blob),
+        "archived_at": datetime.utcnow()
+    }
+
+
+async def load_archive(db, package_id) -> Optional[RouteColumns]:
+    """Read and decode a package's archived track, if it has one"""
+    archive = await db[ARCHIVES_COLLECTION].find_one({"package_id": package_id}, {"data": 1})
+    if not archive:
+        return None
+    return unpack_route(bytes(archive["data"]), package_id)
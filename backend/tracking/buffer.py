@@ -0,0 +1,196 @@
+"""
+Write-behind group-commit buffer for location updates
+
+Location pings are collected in memory and written to MongoDB with a single
+insert_many once either the size threshold or the time deadline is reached.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from db.connection import get_database
+from tracking.storage import insert_locations
+
+logger = logging.getLogger(__name__)
+
+
+class LocationWriteBuffer:
+    """
+    Collects location documents and flushes them in batches
+
+    With no collection_name the batch is written through tracking.storage,
+    honouring the configured storage layout.
+    """
+
+    def __init__(
+        self,
+        collection_name: Optional[str] = None,
+        max_batch_size: int = 500,
+        max_delay_seconds: float = 0.05
+    ):
+        self.collection_name = collection_name
+        self.max_batch_size = max_batch_size
+        self.max_delay_seconds = max_delay_seconds
+
+        # Pending documents and the futures of callers waiting on them
+        self._pending: list[dict] = []
+        self._waiters: list[asyncio.Future] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._in_flight: set[asyncio.Task] = set()
+        self._closed = False
+
+        # Counters
+        self.flush_count = 0
+        self.document_count = 0
+        self.error_count = 0
+
+    async def add(self, document: dict, wait: bool = True) -> ObjectId:
+        """
+        Queue a location document for insertion
+
+        Args:
+            document: Location document; an _id is assigned if missing
+            wait: If True, return only after the batch containing the document
+                has been written (group commit). If False, return immediately
+                (fire and forget); write errors are only logged.
+
+        Returns:
+            The _id of the queued document
+
+        Raises:
+            DuplicateKeyError: (wait=True) The document was rejected by the
+                idempotency unique index
+        """
+        if self._closed:
+            raise RuntimeError("Location write buffer is closed")
+
+        document.setdefault("_id", ObjectId())
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future() if wait else None
+
+        self._pending.append(document)
+        self._waiters.append(waiter)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._cancel_timer()
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_delay())
+
+        if waiter is not None:
+            await waiter
+        return document["_id"]
+
+    async def flush(self):
+        """Write all pending documents now"""
+        self._cancel_timer()
+        await self._flush_pending()
+
+    async def close(self):
+        """Flush remaining documents and wait for in-flight writes (shutdown hook)"""
+        self._closed = True
+        await self.flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        """Return buffer counters"""
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flush_count,
+            "documents_written": self.document_count,
+            "errors": self.error_count,
+            "average_batch_size": self.document_count / self.flush_count if self.flush_count else 0.0
+        }
+
+    def _cancel_timer(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+
+    def _start_flush(self):
+        task = asyncio.create_task(self._flush_pending())
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _flush_after_delay(self):
+        try:
+            await asyncio.sleep(self.max_delay_seconds)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        # Past the deadline this is an ordinary flush that close() must wait for
+        task = asyncio.current_task()
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        await self._flush_pending()
+
+    async def _flush_pending(self):
+        if not self._pending:
+            return
+
+        # Swap out the batch before awaiting so new pings start a fresh batch
+        documents, waiters = self._pending, self._waiters
+        self._pending, self._waiters = [], []
+
+        try:
+            db = get_database()
+            if self.collection_name is None:
+                await insert_locations(db, documents)
+            else:
+                await db[self.collection_name].insert_many(documents, ordered=False)
+            self.flush_count += 1
+            self.document_count += len(documents)
+        except DuplicateKeyError as e:
+            # Single retried point rejected by the idempotency unique index:
+            # its caller replays the stored point
+            self.flush_count += 1
+            self._reject(waiters[0], e)
+        except BulkWriteError as e:
+            # Retried points rejected by the idempotency unique index are
+            # duplicates, not failures; the rest of the batch was written
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                self._fail(waiters, e, len(documents))
+                return
+            self.flush_count += 1
+            self.document_count += len(documents) - len(errors)
+            for error in errors:
+                self._reject(waiters[error["index"]], DuplicateKeyError(error.get("errmsg", ""), 11000, error))
+        except Exception as e:
+            self._fail(waiters, e, len(documents))
+            return
+
+        for waiter in waiters:
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    @staticmethod
+    def _reject(waiter: Optional[asyncio.Future], error: DuplicateKeyError):
+        """Hand a per-document duplicate to its waiting caller"""
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(error)
+
+    def _fail(self, waiters: list, error: Exception, count: int):
+        self.error_count += 1
+        logger.error(f"Error flushing {count} location updates: {error}")
+        for waiter in waiters:
+            if waiter is not None and not waiter.done():
+                waiter.set_exception(error)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ["1", "true", "yes"]
+
+
+# Buffer configuration
+LOCATION_BUFFER_ENABLED = _env_bool("LOCATION_BUFFER_ENABLED", "false")
+LOCATION_BUFFER_WAIT = _env_bool("LOCATION_BUFFER_WAIT", "true")
+
+# Global buffer instance
+location_buffer = LocationWriteBuffer(
+    max_batch_size=int(os.getenv("LOCATION_BUFFER_MAX_BATCH", "500")),
+    max_delay_seconds=int(os.getenv("LOCATION_BUFFER_MAX_DELAY_MS", "50")) / 1000
+)
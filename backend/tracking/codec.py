@@ -0,0 +1,326 @@
+"""
+Request body codecs for location ingest
+
+Besides JSON, the update and batch endpoints accept two compact formats that
+decode straight into tuples and typed arrays, skipping the per-point Pydantic
+model:
+
+- application/x-location-points
+    /{tracking_id}/update: one packed little-endian record <ddd>
+      latitude, longitude, timestamp (Unix seconds UTC, NaN = server time)
+    /batch: packed little-endian columns
+      header    <4sHI>  magic b"LOC1", number of tracking IDs, number of points
+      ids       per ID: u8 byte length + UTF-8 bytes
+      index     u16[n]  tracking ID index per point
+      latitude  f64[n]
+      longitude f64[n]
+      timestamp f64[n]  Unix seconds (UTC), NaN = server time
+- application/x-msgpack
+    /{tracking_id}/update: {"latitude": float, "longitude": float, "timestamp": float | None}
+    /batch: a map of columns
+      {"tracking_id": str | [str], "latitude": [float], "longitude": [float],
+       "timestamp": [float | None]}
+
+Range checks match LocationUpdateCreate (latitude -90..90, longitude -180..180).
+"""
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+JSON_CONTENT_TYPE = "application/json"
+PACKED_CONTENT_TYPE = "application/x-location-points"
+MSGPACK_CONTENT_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+
+PACKED_MAGIC = b"LOC1"
+_HEADER = struct.Struct("<4sHI")
+_RECORD = struct.Struct("<ddd")
+
+
+class LocationPoint(NamedTuple):
+    """Lightweight point with the same attributes as LocationBatchItem"""
+    tracking_id: Optional[str]
+    latitude: float
+    longitude: float
+    timestamp: Optional[datetime]
+    idempotency_key: Optional[str] = None
+    device_id: Optional[str] = None
+    sequence: Optional[int] = None
+
+
+class PayloadError(ValueError):
+    """Malformed or out-of-range binary payload"""
+
+
+class PointColumns:
+    """Decoded points as parallel typed arrays"""
+
+    def __init__(self, tracking_ids: list[str], index: array, latitude: array, longitude: array, timestamp: array):
+        self.tracking_ids = tracking_ids
+        self.index = index
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timestamp = timestamp
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    def validate(self):
+        """Apply the LocationUpdateCreate range checks to whole columns"""
+        n = len(self.latitude)
+        if n == 0:
+            raise PayloadError("Payload contains no points")
+        if len(self.longitude) != n or len(self.timestamp) != n or len(self.index) != n:
+            raise PayloadError("Column lengths differ")
+        _check_range("latitude", self.latitude, -90.0, 90.0)
+        _check_range("longitude", self.longitude, -180.0, 180.0)
+        if max(self.index) >= len(self.tracking_ids):
+            raise PayloadError("Tracking ID index out of range")
+
+    def points(self) -> list[LocationPoint]:
+        """Build LocationPoint tuples"""
+        ids = self.tracking_ids
+        try:
+            timestamps = [None if ts != ts else datetime.utcfromtimestamp(ts) for ts in self.timestamp]
+        except (OverflowError, OSError, ValueError):
+            raise PayloadError("timestamp out of range")
+        return [
+            LocationPoint(ids[i], lat, lon, ts)
+            for i, lat, lon, ts in zip(self.index, self.latitude, self.longitude, timestamps)
+        ]
+
+
+def _check_range(name: str, values: array, low: float, high: float):
+    # min/max/isnan run over the whole array in C
+    if any(map(math.isnan, values)) or min(values) < low or max(values) > high:
+        for i, value in enumerate(values):
+            if not (low <= value <= high):
+                raise PayloadError(f"{name} at index {i} must be between {low:g} and {high:g}")
+
+
+def _check_point(latitude: float, longitude: float):
+    if not -90.0 <= latitude <= 90.0:
+        raise PayloadError("latitude must be between -90 and 90")
+    if not -180.0 <= longitude <= 180.0:
+        raise PayloadError("longitude must be between -180 and 180")
+
+
+def _to_datetime(timestamp) -> Optional[datetime]:
+    if timestamp is None or timestamp != timestamp:
+        return None
+    try:
+        return datetime.utcfromtimestamp(timestamp)
+    except (OverflowError, OSError, ValueError):
+        raise PayloadError("timestamp out of range")
+
+
+def _le_array(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def decode_packed_record(body: bytes, tracking_id: str) -> LocationPoint:
+    """Decode a single-point application/x-location-points body"""
+    if len(body) != _RECORD.size:
+        raise PayloadError(f"Expected one {_RECORD.size}-byte record, got {len(body)} bytes")
+    latitude, longitude, timestamp = _RECORD.unpack(body)
+    _check_point(latitude, longitude)
+    return LocationPoint(tracking_id, latitude, longitude, _to_datetime(timestamp))
+
+
+def decode_packed(body: bytes) -> PointColumns:
+    """Decode a batch application/x-location-points body"""
+    try:
+        magic, n_ids, n = _HEADER.unpack_from(body, 0)
+    except struct.error:
+        raise PayloadError("Truncated header")
+    if magic != PACKED_MAGIC:
+        raise PayloadError("Bad magic, expected LOC1")
+
+    offset = _HEADER.size
+    tracking_ids = []
+    try:
+        for _ in range(n_ids):
+            length = body[offset]
+            tracking_ids.append(body[offset + 1:offset + 1 + length].decode("utf-8"))
+            offset += 1 + length
+    except (IndexError, UnicodeDecodeError):
+        raise PayloadError("Malformed tracking IDs")
+
+    expected = offset + n * (2 + 8 * 3)
+    if len(body) != expected:
+        raise PayloadError(f"Expected {expected} bytes for {n} points, got {len(body)}")
+
+    index = _le_array("H", body[offset:offset + 2 * n])
+    offset += 2 * n
+    latitude = _le_array("d", body[offset:offset + 8 * n])
+    offset += 8 * n
+    longitude = _le_array("d", body[offset:offset + 8 * n])
+    offset += 8 * n
+    timestamp = _le_array("d", body[offset:offset + 8 * n])
+
+    columns = PointColumns(tracking_ids, index, latitude, longitude, timestamp)
+    columns.validate()
+    return columns
+
+
+def encode_packed_record(latitude: float, longitude: float, timestamp: Optional[float] = None) -> bytes:
+    """Encode one point for /{tracking_id}/update"""
+    return _RECORD.pack(latitude, longitude, math.nan if timestamp is None else timestamp)
+
+
+def encode_packed(points: list[tuple]) -> bytes:
+    """
+    Encode (tracking_id, latitude, longitude, unix_timestamp_or_None) tuples
+    as application/x-location-points (for clients, tests and benchmarks)
+    """
+    ids: dict[str, int] = {}
+    for point in points:
+        ids.setdefault(point[0], len(ids))
+
+    parts = [_HEADER.pack(PACKED_MAGIC, len(ids), len(points))]
+    for tracking_id in ids:
+        encoded = tracking_id.encode("utf-8")
+        parts.append(bytes([len(encoded)]) + encoded)
+
+    columns = [
+        array("H", [ids[p[0]] for p in points]),
+        array("d", [p[1] for p in points]),
+        array("d", [p[2] for p in points]),
+        array("d", [math.nan if p[3] is None else p[3] for p in points]),
+    ]
+    for column in columns:
+        if sys.byteorder != "little":
+            column.byteswap()
+        parts.append(column.tobytes())
+    return b"".join(parts)
+
+
+def _unpack_msgpack(body: bytes) -> dict:
+    if msgpack is None:
+        raise PayloadError("MessagePack support is not installed")
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+    except Exception:
+        raise PayloadError("Malformed MessagePack body")
+    if not isinstance(payload, dict):
+        raise PayloadError("MessagePack body must be a map")
+    return payload
+
+
+def decode_msgpack_point(body: bytes, tracking_id: str) -> LocationPoint:
+    """Decode a single-point application/x-msgpack map"""
+    payload = _unpack_msgpack(body)
+    try:
+        latitude = float(payload["latitude"])
+        longitude = float(payload["longitude"])
+        timestamp = payload.get("timestamp")
+        timestamp = None if timestamp is None else float(timestamp)
+    except KeyError as e:
+        raise PayloadError(f"Missing field {e}")
+    except (TypeError, ValueError):
+        raise PayloadError("latitude, longitude and timestamp must be numbers")
+    _check_point(latitude, longitude)
+    return LocationPoint(tracking_id, latitude, longitude, _to_datetime(timestamp))
+
+
+def decode_msgpack(body: bytes) -> PointColumns:
+    """Decode a batch application/x-msgpack column map"""
+    payload = _unpack_msgpack(body)
+    try:
+        latitude = array("d", payload["latitude"])
+        longitude = array("d", payload["longitude"])
+        if payload.get("timestamp") is None:
+            timestamp = array("d", [math.nan]) * len(latitude)
+        else:
+            timestamp = array("d", [math.nan if ts is None else ts for ts in payload["timestamp"]])
+        raw_ids = payload["tracking_id"]
+    except KeyError as e:
+        raise PayloadError(f"Missing column {e}")
+    except TypeError:
+        raise PayloadError("latitude, longitude and timestamp must be lists of numbers")
+
+    if isinstance(raw_ids, str):
+        tracking_ids, index = [raw_ids], array("H", bytes(2 * len(latitude)))
+    elif isinstance(raw_ids, list):
+        ids: dict[str, int] = {}
+        try:
+            index = array("H", [ids.setdefault(str(tracking_id), len(ids)) for tracking_id in raw_ids])
+        except OverflowError:
+            raise PayloadError("Too many distinct tracking IDs")
+        tracking_ids = list(ids)
+    else:
+        raise PayloadError("tracking_id must be a string or a list of strings")
+
+    columns = PointColumns(tracking_ids, index, latitude, longitude, timestamp)
+    columns.validate()
+    return columns
+
+
+def decode_point(content_type: str, body: bytes, tracking_id: str) -> Optional[LocationPoint]:
+    """
+    Decode a single-point binary body by content type
+
+    Returns:
+        The point, or None if the content type is not a binary format
+    """
+    if content_type == PACKED_CONTENT_TYPE:
+        return decode_packed_record(body, tracking_id)
+    if content_type in MSGPACK_CONTENT_TYPES:
+        return decode_msgpack_point(body, tracking_id)
+    return None
+
+
+def decode_points(content_type: str, body: bytes) -> Optional[PointColumns]:
+    """
+    Decode a batch binary body by content type
+
+    Returns:
+        The decoded columns, or None if the content type is not a binary format
+    """
+    if content_type == PACKED_CONTENT_TYPE:
+        return decode_packed(body)
+    if content_type in MSGPACK_CONTENT_TYPES:
+        return decode_msgpack(body)
+    return None
+
+
+def openapi_request_body(model) -> dict:
+    """
+    OpenAPI requestBody for routes that read their body manually: the JSON
+    schema of `model` (with nested models inlined) plus the binary formats
+    """
+    schema = model.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            ref = node.get("$ref", "")
+            if ref.startswith("#/$defs/"):
+                return inline(definitions[ref.split("/")[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON_CONTENT_TYPE: {"schema": inline(schema)},
+                PACKED_CONTENT_TYPE: binary,
+                MSGPACK_CONTENT_TYPES[0]: binary,
+            }
+        }
+    }
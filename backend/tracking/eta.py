@@ -2,8 +2,36 @@
 ETA calculation logic using rule-based approach
 """
 import math
+import os
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
+import numpy as np
+
+# Radius of Earth in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+# Assumed speed when no better estimate is available
+DEFAULT_AVERAGE_SPEED_KMH = 30.0
+
+# How routes calculate ETAs: "constant" (DEFAULT_AVERAGE_SPEED_KMH), "speed"
+# (observed speed, see tracking.speed) or "historical" (speed table by place
+# and time of week, see tracking.speed_table)
+ETA_MODE = os.getenv("ETA_MODE", "constant").lower()
+
+# Road graph for road distances (tracking.routing.RoadGraph), set at startup
+# when ROAD_GRAPH_PATH is configured; None means straight-line distances
+road_graph = None
+
+
+def get_road_graph():
+    """The road graph used for distances, or None"""
+    return road_graph
+
+
+def set_road_graph(graph):
+    """Use a road graph for calculate_eta distances (None: straight line)"""
+    global road_graph
+    road_graph = graph
 
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -11,8 +39,7 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     Calculate distance between two coordinates using Haversine formula
     Returns distance in kilometers
     """
-    # Radius of Earth in kilometers
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     
     # Convert latitude and longitude from degrees to radians
     lat1_rad = math.radians(lat1)
@@ -36,7 +63,8 @@ def calculate_eta(
     current_lon: float,
     destination_lat: float,
     destination_lon: float,
-    average_speed_kmh: float = 30.0
+    average_speed_kmh: float = DEFAULT_AVERAGE_SPEED_KMH,
+    now: Optional[datetime] = None
 ) -> Optional[datetime]:
     """
     Calculate Estimated Time of Arrival (ETA) based on:
@@ -44,8 +72,16 @@ def calculate_eta(
     - Destination location
     - Average delivery vehicle speed (default: 30 km/h)
     
+    The distance is the road distance when a road graph is loaded (and both
+    points are on it), the straight-line distance otherwise.
+    
+    now is the time of the current location (default: datetime.utcnow(),
+    earlier for backtests)
+    
     Returns ETA as datetime, or None if calculation fails
     """
+    if now is None:
+        now = datetime.utcnow()
     try:
         # Calculate distance in kilometers
         distance_km = calculate_distance(
@@ -55,7 +91,12 @@ def calculate_eta(
         
         # If distance is very small (< 100 meters), consider it arrived
         if distance_km < 0.1:
-            return datetime.utcnow() + timedelta(minutes=5)
+            return now + timedelta(minutes=5)
+        
+        if road_graph is not None:
+            route = road_graph.route(current_lat, current_lon, destination_lat, destination_lon)
+            if route is not None:
+                distance_km = route.distance_km
         
         # Calculate time in hours: distance / speed
         time_hours = distance_km / average_speed_kmh
@@ -65,7 +106,7 @@ def calculate_eta(
         total_time_hours = time_hours + buffer_hours
         
         # Convert to timedelta and add to current time
-        eta = datetime.utcnow() + timedelta(hours=total_time_hours)
+        eta = now + timedelta(hours=total_time_hours)
         
         return eta
     except Exception as e:
@@ -73,6 +114,111 @@ def calculate_eta(
         return None
 
 
+def calculate_eta_along(
+    current_lat: float,
+    current_lon: float,
+    destination_lat: float,
+    destination_lon: float,
+    segment_speed: Callable[[float, float, datetime], Optional[float]],
+    average_speed_kmh: float = DEFAULT_AVERAGE_SPEED_KMH,
+    step_km: float = 1.0,
+    max_steps: int = 500,
+    now: Optional[datetime] = None
+) -> Optional[datetime]:
+    """
+    Calculate ETA with a speed per stretch of the way: the straight line to
+    the destination is cut into steps of about step_km, and each step is
+    timed with segment_speed(latitude, longitude, time there), falling back
+    to average_speed_kmh where it returns None
+    
+    Arrival threshold, buffer and now are the same as calculate_eta.
+    Returns ETA as datetime, or None if calculation fails
+    """
+    if now is None:
+        now = datetime.utcnow()
+    try:
+        distance_km = calculate_distance(
+            current_lat, current_lon,
+            destination_lat, destination_lon
+        )
+        
+        if distance_km < 0.1:
+            return now + timedelta(minutes=5)
+        
+        steps = min(max_steps, math.ceil(distance_km / step_km))
+        step_distance_km = distance_km / steps
+        time_hours = 0.0
+        for i in range(steps):
+            # Midpoint of the step, at the time the courier gets there
+            fraction = (i + 0.5) / steps
+            speed = segment_speed(
+                current_lat + (destination_lat - current_lat) * fraction,
+                current_lon + (destination_lon - current_lon) * fraction,
+                now + timedelta(hours=time_hours)
+            )
+            time_hours += step_distance_km / (speed or average_speed_kmh)
+        
+        buffer_hours = max(time_hours * 0.1, 5 / 60)
+        return now + timedelta(hours=time_hours + buffer_hours)
+    except Exception as e:
+        print(f"Error calculating ETA: {e}")
+        return None
+
+
+def calculate_distance_many(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Vectorized calculate_distance over coordinate arrays (broadcast, so one
+    side may be a single point); for one pair calculate_distance is faster
+    Returns distances in kilometers
+    """
+    lat1_rad = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1_rad = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2_rad = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2_rad = np.radians(np.asarray(lon2, dtype=np.float64))
+    
+    a = np.sin((lat2_rad - lat1_rad) / 2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin((lon2_rad - lon1_rad) / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return EARTH_RADIUS_KM * c
+
+
+def calculate_eta_many(
+    current_lats,
+    current_lons,
+    destination_lats,
+    destination_lons,
+    average_speed_kmh=DEFAULT_AVERAGE_SPEED_KMH,
+    now: Optional[datetime] = None
+) -> np.ndarray:
+    """
+    Vectorized calculate_eta over coordinate (and optionally speed) arrays,
+    with the same arrival threshold and buffer rules
+    
+    Args:
+        now: Reference time (default: datetime.utcnow(), taken once for all points)
+    
+    Returns ETAs as a datetime64[us] array (naive UTC); NaT where the scalar
+    version would return None
+    """
+    if now is None:
+        now = datetime.utcnow()
+    distance_km = calculate_distance_many(current_lats, current_lons, destination_lats, destination_lons)
+    
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        time_hours = distance_km / np.asarray(average_speed_kmh, dtype=np.float64)
+        buffer_hours = np.maximum(time_hours * 0.1, 5 / 60)
+        # Within 100 meters counts as arrived: 5 minutes
+        total_time_hours = np.where(distance_km < 0.1, 5 / 60, time_hours + buffer_hours)
+        
+        # Beyond datetime.max (or not a number) the scalar version fails
+        max_hours = (datetime.max - now).total_seconds() / 3600
+        valid = np.isfinite(total_time_hours) & (total_time_hours < max_hours)
+        micros = np.rint(np.where(valid, total_time_hours, 0.0) * 3600e6).astype(np.int64)
+    
+    etas = np.datetime64(now, "us") + micros.astype("timedelta64[us]")
+    return np.where(valid, etas, np.datetime64("NaT", "us"))
+
+
 def format_eta(eta: datetime) -> dict:
     """
     Format ETA for display
@@ -0,0 +1,105 @@
+"""
+Freshness-based ETA read cache for GET /api/tracking/{tracking_id}/eta
+
+Tracking pages and partners poll the ETA far more often than couriers send
+points. The last calculated prediction of each package is kept in memory
+together with the point (and recipient location) it was calculated from;
+while the package's latest point is still that point and the prediction is
+younger than ETA_CACHE_MAX_AGE_S, it is returned as is instead of being
+recalculated and written again. The max age bounds how long speed-aware
+modes keep serving an ETA based on an older speed estimate.
+"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+
+def eta_location_key(location: dict, recipient_lat: float, recipient_lng: float) -> tuple:
+    """
+    Identify the inputs of a package's ETA: its latest point (_id and
+    timestamp, as thinning moves merged points in place) and recipient
+    """
+    return (location["_id"], location["timestamp"], recipient_lat, recipient_lng)
+
+
+@dataclass
+class CachedPrediction:
+    location_key: tuple
+    eta: datetime
+    calculated_at: datetime
+    stored_at: float
+
+
+class ETACache:
+    """Bounded LRU cache of tracking_id -> last calculated prediction"""
+
+    def __init__(self, max_size: int = 100000, max_age_seconds: float = 60.0):
+        self.max_size = max_size
+        self.max_age_seconds = max_age_seconds
+        self._entries: OrderedDict[str, CachedPrediction] = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.moved = 0
+        self.expired = 0
+
+    def get(self, tracking_id: str, location_key: tuple) -> Optional[CachedPrediction]:
+        """
+        Return the cached prediction of a package if it was calculated from
+        location_key and is younger than max_age_seconds, or None
+        """
+        entry = self._entries.get(tracking_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.location_key != location_key:
+            # A new point arrived since
+            self.moved += 1
+            self.misses += 1
+            del self._entries[tracking_id]
+            return None
+        if time.monotonic() - entry.stored_at > self.max_age_seconds:
+            self.expired += 1
+            self.misses += 1
+            del self._entries[tracking_id]
+            return None
+        self._entries.move_to_end(tracking_id)
+        self.hits += 1
+        return entry
+
+    def put(self, tracking_id: str, location_key: tuple, eta: datetime, calculated_at: datetime):
+        """Remember the prediction calculated from location_key"""
+        self._entries[tracking_id] = CachedPrediction(location_key, eta, calculated_at, time.monotonic())
+        self._entries.move_to_end(tracking_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, tracking_id: str):
+        self._entries.pop(tracking_id, None)
+
+    def get_stats(self) -> dict:
+        """Return cache counters"""
+        total = self.hits + self.misses
+        return {
+            "enabled": ETA_CACHE_ENABLED,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "moved": self.moved,
+            "expired": self.expired,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# ETA cache configuration
+ETA_CACHE_ENABLED = os.getenv("ETA_CACHE_ENABLED", "true").lower() in ["1", "true", "yes"]
+
+# Global cache instance
+eta_cache = ETACache(
+    max_size=int(os.getenv("ETA_CACHE_SIZE", "100000")),
+    max_age_seconds=float(os.getenv("ETA_CACHE_MAX_AGE_S", "60"))
+)
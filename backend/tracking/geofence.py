@@ -0,0 +1,375 @@
+"""
+Geofences: spatial index and enter / exit / dwell events
+
+Depot, hub and restricted-zone fences (circles and polygons, imported with
+import_geofences.py into the geofences collection) are loaded at startup
+into a uniform grid: each fence is listed in every cell its bounding box
+overlaps, so "which fences contain this point" only tests the few fences
+of one cell, however many fences there are. Fences too large for the grid
+(e.g. a whole service area) are checked directly instead. Each package also
+gets circles around its sender and recipient (GEOFENCE_SENDER_RADIUS_M and
+GEOFENCE_RECIPIENT_RADIUS_M, the old auto-transition distances).
+
+The tracker remembers which fences each package is inside and turns every
+ping into events: enter, exit, and dwell once a package has stayed inside
+a fence for GEOFENCE_DWELL_S. A fence whose definition changed while a
+package was inside is exited and entered again. packages.status maps the
+events to status transitions.
+"""
+import logging
+import math
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from tracking.eta import EARTH_RADIUS_KM, calculate_distance
+
+logger = logging.getLogger(__name__)
+
+GEOFENCES_COLLECTION = "geofences"
+
+# Fence kinds
+DEPOT = "depot"
+HUB = "hub"
+RESTRICTED = "restricted"
+SENDER = "sender"
+RECIPIENT = "recipient"
+FENCE_KINDS = (DEPOT, HUB, RESTRICTED)
+
+# Event types
+ENTER = "enter"
+EXIT = "exit"
+DWELL = "dwell"
+
+
+def _point_in_ring(latitude: float, longitude: float, ring: list[tuple[float, float]]) -> bool:
+    """Even-odd ray casting over a ring of (latitude, longitude) vertices"""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        lat_i, lon_i = ring[i]
+        lat_j, lon_j = ring[j]
+        if (lat_i > latitude) != (lat_j > latitude):
+            crossing = lon_i + (latitude - lat_i) / (lat_j - lat_i) * (lon_j - lon_i)
+            if longitude < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+@dataclass
+class Geofence:
+    """
+    A circle (center and radius_m) or polygons (each an outer ring followed
+    by its holes, as (latitude, longitude) vertices)
+    """
+    id: str
+    kind: str
+    name: str = ""
+    center: Optional[tuple[float, float]] = None
+    radius_m: float = 0.0
+    polygons: list[list[list[tuple[float, float]]]] = field(default_factory=list)
+    # (min_lat, min_lon, max_lat, max_lon)
+    bbox: tuple = field(init=False)
+
+    def __post_init__(self):
+        if self.center is not None:
+            latitude, longitude = self.center
+            dlat = math.degrees(self.radius_m / 1000 / EARTH_RADIUS_KM)
+            dlon = dlat / max(math.cos(math.radians(min(abs(latitude) + dlat, 89.0))), 0.01)
+            self.bbox = (latitude - dlat, longitude - dlon, latitude + dlat, longitude + dlon)
+        else:
+            vertices = [vertex for polygon in self.polygons for vertex in polygon[0]]
+            self.bbox = (
+                min(lat for lat, _ in vertices), min(lon for _, lon in vertices),
+                max(lat for lat, _ in vertices), max(lon for _, lon in vertices)
+            )
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon):
+            return False
+        if self.center is not None:
+            return calculate_distance(latitude, longitude, *self.center) * 1000 <= self.radius_m
+        for outer, *holes in self.polygons:
+            if _point_in_ring(latitude, longitude, outer) and not any(
+                _point_in_ring(latitude, longitude, hole) for hole in holes
+            ):
+                return True
+        return False
+
+    @classmethod
+    def from_document(cls, document: dict) -> "Geofence":
+        """
+        Build a fence from a geofences document: a GeoJSON geometry (Point
+        with radius_m, Polygon or MultiPolygon), kind and name
+
+        Raises:
+            ValueError: If the geometry is not supported
+        """
+        geometry = document.get("geometry") or {}
+        kind = document.get("kind", RESTRICTED)
+        common = {"id": str(document["_id"]), "kind": kind, "name": document.get("name", "")}
+        if kind not in FENCE_KINDS:
+            raise ValueError(f"Geofence {common['id']}: unknown kind {kind!r}")
+        # GeoJSON positions are [longitude, latitude]
+        if geometry.get("type") == "Point":
+            longitude, latitude = geometry["coordinates"][:2]
+            radius_m = float(document.get("radius_m") or 0)
+            if radius_m <= 0:
+                raise ValueError(f"Geofence {common['id']}: a Point needs a positive radius_m")
+            return cls(center=(latitude, longitude), radius_m=radius_m, **common)
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            raise ValueError(f"Geofence {common['id']}: unsupported geometry {geometry.get('type')!r}")
+        return cls(
+            polygons=[[[(lat, lon) for lon, lat, *_ in ring] for ring in polygon] for polygon in polygons],
+            **common
+        )
+
+
+class GeofenceIndex:
+    """
+    Uniform grid over fence bounding boxes
+
+    Fences covering more than max_cells grid cells (e.g. a whole service
+    area) are not copied into the grid; they are kept in a separate list
+    whose bounding boxes are checked on every query.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01, max_cells: int = 1024):
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        self.fences: dict[str, Geofence] = {}
+        self._cells: dict[tuple[int, int], list[Geofence]] = {}
+        self._large: dict[str, Geofence] = {}
+
+    def __len__(self) -> int:
+        return len(self.fences)
+
+    def _cell_bounds(self, fence: Geofence) -> tuple[range, range]:
+        min_lat, min_lon, max_lat, max_lon = fence.bbox
+        rows = range(math.floor(min_lat / self.cell_degrees), math.floor(max_lat / self.cell_degrees) + 1)
+        cols = range(math.floor(min_lon / self.cell_degrees), math.floor(max_lon / self.cell_degrees) + 1)
+        return rows, cols
+
+    def _cell_range(self, fence: Geofence) -> Iterable[tuple[int, int]]:
+        rows, cols = self._cell_bounds(fence)
+        for row in rows:
+            for col in cols:
+                yield row, col
+
+    def add(self, fence: Geofence):
+        self.remove(fence.id)
+        self.fences[fence.id] = fence
+        rows, cols = self._cell_bounds(fence)
+        if len(rows) * len(cols) > self.max_cells:
+            self._large[fence.id] = fence
+            return
+        for cell in self._cell_range(fence):
+            self._cells.setdefault(cell, []).append(fence)
+
+    def remove(self, fence_id: str):
+        fence = self.fences.pop(fence_id, None)
+        if fence is None or self._large.pop(fence_id, None) is not None:
+            return
+        for cell in self._cell_range(fence):
+            remaining = [other for other in self._cells.get(cell, []) if other.id != fence_id]
+            if remaining:
+                self._cells[cell] = remaining
+            else:
+                self._cells.pop(cell, None)
+
+    def query(self, latitude: float, longitude: float) -> list[Geofence]:
+        """Fences containing a point"""
+        cell = (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+        inside = [fence for fence in self._cells.get(cell, ()) if fence.contains(latitude, longitude)]
+        if self._large:
+            inside.extend(fence for fence in self._large.values() if fence.contains(latitude, longitude))
+        return inside
+
+
+@dataclass
+class GeofenceEvent:
+    type: str
+    fence_id: str
+    kind: str
+    name: str
+    timestamp: datetime
+    fence: Optional[Geofence] = field(default=None, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "type": self.type,
+            "fence_id": self.fence_id,
+            "kind": self.kind,
+            "name": self.name,
+            "timestamp": self.timestamp
+        }
+
+
+@dataclass
+class _Visit:
+    fence: Geofence
+    entered_at: datetime
+    dwelled: bool = False
+
+
+class GeofenceTracker:
+    """Per-package fence membership, turned into enter / exit / dwell events"""
+
+    def __init__(self, index: GeofenceIndex, dwell_seconds: float = 120.0, max_packages: int = 10000):
+        self.index = index
+        self.dwell_seconds = dwell_seconds
+        self.max_packages = max_packages
+
+        # package -> fence id -> current visit, LRU ordered
+        self._state: OrderedDict[str, dict[str, _Visit]] = OrderedDict()
+
+        # Counters
+        self.updates = 0
+        self.events = {ENTER: 0, EXIT: 0, DWELL: 0}
+
+    def update(
+        self,
+        key: str,
+        latitude: float,
+        longitude: float,
+        timestamp: datetime,
+        package_fences: Iterable[Geofence] = (),
+        starts_inside: Iterable[str] = ()
+    ) -> list[GeofenceEvent]:
+        """
+        Feed a package's newest point
+
+        Args:
+            package_fences: The package's own fences (sender / recipient),
+                checked besides the indexed ones
+            starts_inside: Ids of package fences the package is assumed to
+                be inside when it is seen for the first time (a registered
+                package is at its sender), so leaving them emits exit
+
+        Returns:
+            Events in order: exits, enters, dwells
+        """
+        self.updates += 1
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        package_fences = list(package_fences)
+        visits = self._state.get(key)
+        if visits is None:
+            starts_inside = set(starts_inside)
+            visits = {fence.id: _Visit(fence, timestamp) for fence in package_fences if fence.id in starts_inside}
+            self._state[key] = visits
+            if len(self._state) > self.max_packages:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+
+        inside = {fence.id: fence for fence in self.index.query(latitude, longitude)}
+        for fence in package_fences:
+            if fence.contains(latitude, longitude):
+                inside[fence.id] = fence
+
+        # A fence that changed since it was entered (re-imported, or a moved
+        # recipient) counts as left and entered again
+        events = []
+        for fence_id in [
+            fence_id for fence_id, visit in visits.items()
+            if fence_id not in inside or (inside[fence_id] is not visit.fence and inside[fence_id] != visit.fence)
+        ]:
+            fence = visits.pop(fence_id).fence
+            events.append(GeofenceEvent(EXIT, fence.id, fence.kind, fence.name, timestamp, fence))
+        for fence_id, fence in inside.items():
+            if fence_id not in visits:
+                visits[fence_id] = _Visit(fence, timestamp)
+                events.append(GeofenceEvent(ENTER, fence.id, fence.kind, fence.name, timestamp, fence))
+        for visit in visits.values():
+            if not visit.dwelled and (timestamp - visit.entered_at).total_seconds() >= self.dwell_seconds:
+                visit.dwelled = True
+                fence = visit.fence
+                events.append(GeofenceEvent(DWELL, fence.id, fence.kind, fence.name, timestamp, fence))
+
+        for event in events:
+            self.events[event.type] += 1
+        return events
+
+    def retry(self, key: str, events: Iterable[GeofenceEvent]):
+        """
+        Undo events so the package's next update emits them again (e.g.
+        when the status transition they triggered failed to write)
+        """
+        visits = self._state.get(key)
+        if visits is None:
+            return
+        for event in events:
+            if event.type == ENTER:
+                visits.pop(event.fence_id, None)
+            elif event.type == DWELL and event.fence_id in visits:
+                visits[event.fence_id].dwelled = False
+            elif event.type == EXIT and event.fence is not None:
+                visits.setdefault(event.fence_id, _Visit(event.fence, event.timestamp, dwelled=True))
+
+    def forget(self, key: str):
+        """Drop state for a package (e.g. once delivered)"""
+        self._state.pop(key, None)
+
+    def get_stats(self) -> dict:
+        """Return tracker counters"""
+        return {
+            "fences": len(self.index),
+            "tracked_packages": len(self._state),
+            "updates": self.updates,
+            "events": dict(self.events)
+        }
+
+
+# Geofence configuration
+GEOFENCE_GRID_DEGREES = float(os.getenv("GEOFENCE_GRID_DEGREES", "0.01"))
+GEOFENCE_GRID_MAX_CELLS = int(os.getenv("GEOFENCE_GRID_MAX_CELLS", "1024"))
+GEOFENCE_DWELL_S = float(os.getenv("GEOFENCE_DWELL_S", "120"))
+GEOFENCE_SENDER_RADIUS_M = float(os.getenv("GEOFENCE_SENDER_RADIUS_M", "500"))
+GEOFENCE_RECIPIENT_RADIUS_M = float(os.getenv("GEOFENCE_RECIPIENT_RADIUS_M", "100"))
+# Recipient fence event that marks a package delivered: enter or dwell
+GEOFENCE_DELIVERED_ON = os.getenv("GEOFENCE_DELIVERED_ON", ENTER).lower()
+
+
+def package_fences(package: dict) -> list[Geofence]:
+    """Circles around a package's sender and recipient (where set)"""
+    fences = []
+    for kind, radius_m in ((SENDER, GEOFENCE_SENDER_RADIUS_M), (RECIPIENT, GEOFENCE_RECIPIENT_RADIUS_M)):
+        latitude = package[kind].get("latitude", 0.0)
+        longitude = package[kind].get("longitude", 0.0)
+        if latitude != 0.0 and longitude != 0.0:
+            fences.append(Geofence(id=kind, kind=kind, center=(latitude, longitude), radius_m=radius_m))
+    return fences
+
+
+# Global index and tracker instances; fences are loaded at startup
+geofence_index = GeofenceIndex(cell_degrees=GEOFENCE_GRID_DEGREES, max_cells=GEOFENCE_GRID_MAX_CELLS)
+geofence_tracker = GeofenceTracker(
+    geofence_index,
+    dwell_seconds=GEOFENCE_DWELL_S,
+    max_packages=int(os.getenv("GEOFENCE_MAX_PACKAGES", "10000"))
+)
+
+
+async def load_geofences(db) -> int:
+    """
+    Load the geofences collection into the global index
+
+    Returns:
+        Number of fences loaded (invalid ones are logged and skipped)
+    """
+    loaded = 0
+    async for document in db[GEOFENCES_COLLECTION].find({}):
+        try:
+            geofence_index.add(Geofence.from_document(document))
+            loaded += 1
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            logger.error(f"Skipping geofence {document.get('_id')}: {e}")
+    return loaded
@@ -0,0 +1,126 @@
+"""
+Idempotent location uploads
+
+Courier apps retry uploads on flaky networks. A retry carrying the same
+idempotency key (or device_id + sequence pair) gets the original response
+back without inserting, recomputing the ETA or re-broadcasting.
+
+Recent keys live in a bounded in-memory cache (LRU + TTL). Concurrent
+duplicates wait for the first request instead of racing it. In the
+documents storage layout a unique index on location_updates.idempotency_key
+also catches duplicates the cache has forgotten. The buckets layout stores
+no key with its points, so there a retry arriving after its key left the
+cache (IDEMPOTENCY_CACHE_SIZE / IDEMPOTENCY_TTL_S) is stored again.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+
+def location_idempotency_key(
+    tracking_id: str,
+    idempotency_key: Optional[str] = None,
+    device_id: Optional[str] = None,
+    sequence: Optional[int] = None
+) -> Optional[str]:
+    """
+    Build the package-scoped key for a location upload
+
+    Returns:
+        The key, or None if the client sent neither an idempotency key nor a
+        (device_id, sequence) pair
+    """
+    if idempotency_key:
+        return f"{tracking_id}:key:{idempotency_key}"
+    if device_id is not None and sequence is not None:
+        return f"{tracking_id}:seq:{device_id}:{sequence}"
+    return None
+
+
+class IdempotencyCache:
+    """Bounded cache of recent keys -> original results"""
+
+    def __init__(self, max_size: int = 100000, ttl_seconds: float = 600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (expires_at, result or in-flight future), LRU ordered
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """Return the cached result (or in-flight future) for a key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value):
+        """Remember the result for a key"""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+    async def run_once(self, key: Optional[str], operation: Callable[[], Awaitable]):
+        """
+        Run operation() once per key and replay its result for duplicates
+
+        Failed operations are not remembered, so the client may retry them.
+        """
+        if key is None:
+            return await operation()
+
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            if isinstance(cached, asyncio.Future):
+                return await asyncio.shield(cached)
+            return cached
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.put(key, future)
+        try:
+            result = await operation()
+        except BaseException as e:
+            self.discard(key)
+            if not future.done():
+                future.set_exception(e)
+                # Mark retrieved so an unawaited future does not log a warning
+                future.exception()
+            raise
+
+        self.put(key, result)
+        future.set_result(result)
+        return result
+
+    def get_stats(self) -> dict:
+        """Return cache counters"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+# Global cache instance
+idempotency_cache = IdempotencyCache(
+    max_size=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "100000")),
+    ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_S", "600"))
+)
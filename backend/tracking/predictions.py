@@ -0,0 +1,232 @@
+"""
+Package ETA calculation and the background ETA scheduler
+
+With ETA_SCHEDULER_ENABLED the scheduler recomputes the ETA of every
+undelivered package every ETA_SCHEDULER_INTERVAL_S seconds: packages and
+their latest points are read in batches, ETAs are calculated with the
+vectorized calculate_eta_many, and all predictions are written with one
+unordered bulk_write. Location ingest then skips the per-ping prediction
+upsert and GET /eta returns the stored prediction, so ETA work depends on
+fleet size instead of request volume.
+
+The scheduler runs in every API process that enables it; enable it on one.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+import numpy as np
+from pymongo import UpdateOne
+from db.connection import get_database
+from tracking.eta import (
+    calculate_eta,
+    calculate_eta_along,
+    calculate_eta_many,
+    get_road_graph,
+    ETA_MODE,
+    DEFAULT_AVERAGE_SPEED_KMH
+)
+from tracking.speed import speed_estimator
+from tracking.speed_table import get_speed_table
+from tracking.storage import get_latest_locations
+
+logger = logging.getLogger(__name__)
+
+PREDICTIONS_COLLECTION = "predictions"
+
+
+def package_speed_kmh(tracking_id: str) -> float:
+    """Speed to base a package's ETA on, per ETA_MODE"""
+    if ETA_MODE == "speed":
+        speed = speed_estimator.speed_kmh(tracking_id)
+        if speed is not None:
+            return speed
+    return DEFAULT_AVERAGE_SPEED_KMH
+
+
+def calculate_package_eta(
+    tracking_id: str,
+    latitude: float,
+    longitude: float,
+    recipient_lat: float,
+    recipient_lng: float
+) -> Optional[datetime]:
+    """Calculate a package's ETA from its position, per ETA_MODE"""
+    speed_table = get_speed_table() if ETA_MODE == "historical" else None
+    if speed_table is not None:
+        # Historical speeds where known, the constant elsewhere
+        return calculate_eta_along(latitude, longitude, recipient_lat, recipient_lng, speed_table.speed_kmh)
+    return calculate_eta(latitude, longitude, recipient_lat, recipient_lng, average_speed_kmh=package_speed_kmh(tracking_id))
+
+
+def calculate_package_etas(
+    packages: list[dict],
+    latest: dict,
+    now: Optional[datetime] = None
+) -> list[tuple]:
+    """
+    Calculate the ETAs of many packages, per ETA_MODE
+
+    Args:
+        packages: Package documents (_id, tracking_id, recipient)
+        latest: package _id -> latest location point
+        now: Reference time (default: datetime.utcnow())
+
+    Returns:
+        (package _id, eta) for each package with a location and an ETA
+    """
+    if now is None:
+        now = datetime.utcnow()
+    located = [package for package in packages if package["_id"] in latest]
+    if not located:
+        return []
+
+    speed_table = get_speed_table() if ETA_MODE == "historical" else None
+    if speed_table is not None:
+        # Per-step table lookups do not vectorize
+        etas = []
+        for package in located:
+            point = latest[package["_id"]]
+            eta = calculate_eta_along(
+                point["latitude"], point["longitude"],
+                package["recipient"]["latitude"], package["recipient"]["longitude"],
+                speed_table.speed_kmh,
+                now=now
+            )
+            if eta:
+                etas.append((package["_id"], eta))
+        return etas
+
+    if get_road_graph() is not None:
+        # Road distances are one graph search per package
+        etas = []
+        for package in located:
+            point = latest[package["_id"]]
+            eta = calculate_eta(
+                point["latitude"], point["longitude"],
+                package["recipient"]["latitude"], package["recipient"]["longitude"],
+                average_speed_kmh=package_speed_kmh(package["tracking_id"]),
+                now=now
+            )
+            if eta:
+                etas.append((package["_id"], eta))
+        return etas
+
+    points = [latest[package["_id"]] for package in located]
+    eta_array = calculate_eta_many(
+        np.fromiter((point["latitude"] for point in points), np.float64, len(points)),
+        np.fromiter((point["longitude"] for point in points), np.float64, len(points)),
+        np.fromiter((package["recipient"]["latitude"] for package in located), np.float64, len(located)),
+        np.fromiter((package["recipient"]["longitude"] for package in located), np.float64, len(located)),
+        average_speed_kmh=np.fromiter(
+            (package_speed_kmh(package["tracking_id"]) for package in located), np.float64, len(located)
+        ),
+        now=now
+    )
+    # NaT converts to None
+    return [(package["_id"], eta) for package, eta in zip(located, eta_array.tolist()) if eta is not None]
+
+
+class ETAScheduler:
+    """Periodically recomputes and stores the ETAs of all undelivered packages"""
+
+    def __init__(self, interval_seconds: float = 30.0, batch_size: int = 1000):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.runs = 0
+        self.failures = 0
+        self.last_packages = 0
+        self.last_duration_ms = 0.0
+        self.last_run_at: Optional[datetime] = None
+
+    def start(self):
+        """Start the background loop (startup hook)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the background loop (shutdown hook)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once(get_database())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error recomputing ETAs: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def run_once(self, db) -> int:
+        """
+        Recompute the ETA of every undelivered package with a recipient location
+
+        Returns:
+            Number of predictions written
+        """
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        cursor = db.packages.find(
+            {
+                "status": {"$in": ["registered", "in_transit"]},
+                "recipient.latitude": {"$nin": [0.0, None]},
+                "recipient.longitude": {"$nin": [0.0, None]}
+            },
+            {"tracking_id": 1, "recipient": 1}
+        )
+
+        operations = []
+        while True:
+            packages = await cursor.to_list(self.batch_size)
+            if not packages:
+                break
+            latest = await get_latest_locations(db, [package["_id"] for package in packages])
+            for package_id, eta in calculate_package_etas(packages, latest, now=now):
+                operations.append(UpdateOne(
+                    {"package_id": package_id},
+                    {"$set": {"package_id": package_id, "eta": eta, "calculated_at": now}},
+                    upsert=True
+                ))
+
+        if operations:
+            await db[PREDICTIONS_COLLECTION].bulk_write(operations, ordered=False)
+
+        self.runs += 1
+        self.last_packages = len(operations)
+        self.last_duration_ms = (time.perf_counter() - start) * 1000
+        self.last_run_at = now
+        return len(operations)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": ETA_SCHEDULER_ENABLED,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_packages": self.last_packages,
+            "last_duration_ms": self.last_duration_ms,
+            "last_run_at": self.last_run_at
+        }
+
+
+# ETA scheduler configuration
+ETA_SCHEDULER_ENABLED = os.getenv("ETA_SCHEDULER_ENABLED", "false").lower() in ["1", "true", "yes"]
+
+# Global scheduler instance, started at startup when enabled
+eta_scheduler = ETAScheduler(
+    interval_seconds=float(os.getenv("ETA_SCHEDULER_INTERVAL_S", "30")),
+    batch_size=int(os.getenv("ETA_SCHEDULER_BATCH_SIZE", "1000"))
+)
@@ -0,0 +1,210 @@
+"""
+Per-courier ingest rate limiting and backpressure
+
+Token buckets keyed by authenticated user and by tracking ID sit in front of
+the location ingest routes. Bucket state is kept in an LRU map with a fixed
+maximum size, so memory stays bounded with tens of thousands of couriers.
+Excess points can optionally be coalesced: only the newest point of a burst
+is kept (in a map bounded the same way) and ingested once it can take a
+token from the refilled buckets.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """LRU-bounded set of token buckets"""
+
+    def __init__(self, rate_per_second: float, burst: float, max_keys: int = 50000):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_keys = max_keys
+
+        # key -> [tokens, last refill time], LRU ordered
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def _refill(self, key: str, now: float) -> list[float]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                # An evicted key simply starts again with a full bucket
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate_per_second)
+            bucket[1] = now
+        return bucket
+
+    def wait_time(self, key: str, cost: float = 1.0, now: float = None) -> float:
+        """Seconds until `cost` tokens are available for key (0 if available now)"""
+        now = time.monotonic() if now is None else now
+        tokens = self._refill(key, now)[0]
+        if tokens >= cost:
+            return 0.0
+        return (cost - tokens) / self.rate_per_second
+
+    def consume(self, key: str, cost: float = 1.0):
+        """Take tokens from a bucket (after wait_time returned 0)"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] -= cost
+
+    def get_stats(self) -> dict:
+        return {"tracked_keys": len(self._buckets)}
+
+
+class IngestRateLimiter:
+    """Checks the per-user and per-package buckets together"""
+
+    def __init__(self, user_limiter: TokenBucketLimiter, package_limiter: TokenBucketLimiter):
+        self.user_limiter = user_limiter
+        self.package_limiter = package_limiter
+
+        # Counters
+        self.allowed = 0
+        self.limited = 0
+
+    def try_acquire(self, user_id: str, tracking_ids: list[str]) -> float:
+        """
+        Take one token from the user's bucket and from each package's bucket
+
+        Tokens are only taken if every bucket has one, so a rejected request
+        does not drain the others.
+
+        Returns:
+            0 if allowed, otherwise the seconds to wait before retrying
+        """
+        now = time.monotonic()
+        checks = [(self.user_limiter, f"user:{user_id}")]
+        checks += [(self.package_limiter, f"package:{tracking_id}") for tracking_id in tracking_ids]
+
+        retry_after = max(limiter.wait_time(key, now=now) for limiter, key in checks)
+        if retry_after > 0:
+            self.limited += 1
+            return retry_after
+
+        for limiter, key in checks:
+            limiter.consume(key)
+        self.allowed += 1
+        return 0.0
+
+    def get_stats(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "users": self.user_limiter.get_stats(),
+            "packages": self.package_limiter.get_stats()
+        }
+
+
+class PointCoalescer:
+    """
+    Keeps only the newest excess point per package until it can be ingested
+
+    Pending points are kept in an LRU map with a fixed maximum size; when it
+    is full the point of the least recently submitted package is dropped.
+    """
+
+    def __init__(self, max_keys: int = 50000):
+        self.max_keys = max_keys
+
+        # key -> (ingest, acquire), LRU ordered, and the timer of each key
+        self._pending: OrderedDict[str, tuple[Callable[[], Awaitable], Callable[[], float]]] = OrderedDict()
+        self._timers: dict[str, asyncio.Task] = {}
+
+        # Counters
+        self.coalesced = 0
+        self.flushed = 0
+        self.evicted = 0
+
+    def submit(
+        self,
+        key: str,
+        ingest: Callable[[], Awaitable],
+        delay_seconds: float,
+        acquire: Callable[[], float] = lambda: 0.0
+    ):
+        """
+        Hold `ingest` for key, replacing any older pending point, and run it
+        after delay_seconds
+
+        Args:
+            acquire: Takes a rate limit token for the deferred point; returns
+                0 if taken, otherwise the seconds to wait before trying again
+        """
+        if key in self._pending:
+            self.coalesced += 1
+            self._pending[key] = (ingest, acquire)
+            self._pending.move_to_end(key)
+            return
+        self._pending[key] = (ingest, acquire)
+        self._timers[key] = asyncio.create_task(self._flush_later(key, delay_seconds))
+        if len(self._pending) > self.max_keys:
+            evicted_key, _ = self._pending.popitem(last=False)
+            self._timers.pop(evicted_key).cancel()
+            self.evicted += 1
+
+    async def _flush_later(self, key: str, delay_seconds: float):
+        # Wait until the deferred point gets a token like any other point
+        while True:
+            await asyncio.sleep(delay_seconds)
+            delay_seconds = self._pending[key][1]()
+            if delay_seconds <= 0:
+                break
+        ingest, _ = self._pending.pop(key)
+        del self._timers[key]
+        try:
+            await ingest()
+            self.flushed += 1
+        except Exception as e:
+            logger.error(f"Error ingesting coalesced point for {key}: {e}")
+
+    async def close(self):
+        """Ingest every pending point now (shutdown hook)"""
+        for task in self._timers.values():
+            task.cancel()
+        pending, self._pending, self._timers = self._pending, OrderedDict(), {}
+        for key, (ingest, _) in pending.items():
+            try:
+                await ingest()
+                self.flushed += 1
+            except Exception as e:
+                logger.error(f"Error ingesting coalesced point for {key}: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "evicted": self.evicted
+        }
+
+
+# Rate limit configuration
+INGEST_RATE_LIMIT_ENABLED = os.getenv("INGEST_RATE_LIMIT_ENABLED", "true").lower() in ["1", "true", "yes"]
+INGEST_COALESCE_EXCESS = os.getenv("INGEST_COALESCE_EXCESS", "false").lower() in ["1", "true", "yes"]
+
+_max_keys = int(os.getenv("INGEST_RATE_MAX_KEYS", "50000"))
+
+# Global limiter and coalescer instances
+ingest_limiter = IngestRateLimiter(
+    user_limiter=TokenBucketLimiter(
+        rate_per_second=float(os.getenv("INGEST_USER_RATE_PER_S", "20")),
+        burst=float(os.getenv("INGEST_USER_BURST", "200")),
+        max_keys=_max_keys
+    ),
+    package_limiter=TokenBucketLimiter(
+        rate_per_second=float(os.getenv("INGEST_PACKAGE_RATE_PER_S", "2")),
+        burst=float(os.getenv("INGEST_PACKAGE_BURST", "20")),
+        max_keys=_max_keys
+    )
+)
+point_coalescer = PointCoalescer(max_keys=_max_keys)
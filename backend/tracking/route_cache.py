@@ -0,0 +1,285 @@
+"""
+In-memory route cache for history reads
+
+Holds the complete route of recently viewed packages in compact parallel
+arrays (12-byte ids, float64 coordinates, int64 millisecond timestamps).
+A route is loaded on its first history read and then kept current by the
+ingest path, which adds (or, for thinning merges, moves) points as they
+are written, so refreshes of the tracking page never re-query MongoDB.
+
+Memory is bounded by a total point budget with LRU eviction; routes longer
+than max_route_points are not cached. Entries expire after ttl_seconds so
+points written by other server processes show up eventually.
+"""
+import calendar
+import os
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Optional
+from bson import ObjectId
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Bytes held per cached point (id + 2 coordinates + 2 timestamps)
+POINT_BYTES = 12 + 8 * 4
+
+
+def to_millis(ts: datetime) -> int:
+    """Milliseconds since epoch, truncated like BSON datetimes; naive means UTC"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return calendar.timegm(ts.timetuple()) * 1000 + ts.microsecond // 1000
+
+
+def from_millis(ms: int) -> datetime:
+    """Naive UTC datetime, as read back from MongoDB"""
+    return _EPOCH + timedelta(milliseconds=ms)
+
+
+class RouteColumns:
+    """
+    One package's points in (timestamp, _id) order, as parallel arrays (the
+    form of both cached routes and decoded archived tracks)
+    """
+
+    def __init__(self, package_id: ObjectId):
+        self.package_id = package_id
+        self.ids = bytearray()
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.timestamps = array("q")
+        self.created = array("q")
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def _id_at(self, i: int) -> bytes:
+        return bytes(self.ids[12 * i:12 * i + 12])
+
+    def append(self, location: dict):
+        """Add a point known to sort after every cached point"""
+        self.ids += location["_id"].binary
+        self.latitudes.append(location["latitude"])
+        self.longitudes.append(location["longitude"])
+        self.timestamps.append(to_millis(location["timestamp"]))
+        self.created.append(to_millis(location["created_at"]))
+
+    def _remove(self, i: int):
+        del self.ids[12 * i:12 * i + 12]
+        for column in (self.latitudes, self.longitudes, self.timestamps, self.created):
+            del column[i]
+
+    def upsert(self, location: dict, replaces: Optional[ObjectId] = None) -> int:
+        """
+        Insert a point in order; a point with the same _id and timestamp is
+        replaced instead of duplicated
+
+        Args:
+            replaces: _id of a point to remove first (a thinning merge moves
+                the last kept point, which is searched from the end)
+
+        Returns:
+            The change in point count (1 or 0)
+        """
+        removed = 0
+        created = to_millis(location["created_at"])
+        if replaces is not None:
+            old_id = replaces.binary
+            for i in range(len(self) - 1, -1, -1):
+                if self._id_at(i) == old_id:
+                    # A merge moves the point; its created_at is unchanged
+                    created = self.created[i]
+                    self._remove(i)
+                    removed = 1
+                    break
+
+        point_id = location["_id"].binary
+        ts = to_millis(location["timestamp"])
+        pos = bisect_right(self.timestamps, ts)
+        while pos > 0 and self.timestamps[pos - 1] == ts:
+            existing = self._id_at(pos - 1)
+            if existing == point_id:
+                self._remove(pos - 1)
+                removed += 1
+            elif existing < point_id:
+                break
+            pos -= 1
+
+        self.ids[12 * pos:12 * pos] = point_id
+        self.latitudes.insert(pos, location["latitude"])
+        self.longitudes.insert(pos, location["longitude"])
+        self.timestamps.insert(pos, ts)
+        self.created.insert(pos, created)
+        return 1 - removed
+
+    def window(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after: Optional[tuple[datetime, ObjectId]] = None
+    ) -> tuple[int, int]:
+        """Index range [start, end) of the points matching a history window"""
+        start = bisect_left(self.timestamps, to_millis(since)) if since is not None else 0
+        end = bisect_left(self.timestamps, to_millis(until)) if until is not None else len(self)
+        if after is not None:
+            after_ts, after_id = to_millis(after[0]), after[1].binary
+            pos = bisect_left(self.timestamps, after_ts)
+            while pos < len(self) and self.timestamps[pos] == after_ts and self._id_at(pos) <= after_id:
+                pos += 1
+            start = max(start, pos)
+        return start, max(start, end)
+
+    def document(self, i: int) -> dict:
+        """Point i shaped like a location_updates document"""
+        return {
+            "_id": ObjectId(self._id_at(i)),
+            "package_id": self.package_id,
+            "latitude": self.latitudes[i],
+            "longitude": self.longitudes[i],
+            "timestamp": from_millis(self.timestamps[i]),
+            "created_at": from_millis(self.created[i])
+        }
+
+    def documents(self, start: int, end: int) -> list[dict]:
+        return [self.document(i) for i in range(start, end)]
+
+
+class RouteCache:
+    """LRU cache of RouteColumns by tracking ID under a total point budget"""
+
+    def __init__(self, max_points: int = 1000000, max_route_points: int = 50000, ttl_seconds: float = 300.0):
+        self.max_points = max_points
+        self.max_route_points = max_route_points
+        self.ttl_seconds = ttl_seconds
+
+        self._routes: OrderedDict[str, RouteColumns] = OrderedDict()
+        # Routes being loaded -> points ingested meanwhile, applied once loaded
+        self._loading: dict[str, list[tuple[dict, Optional[ObjectId]]]] = {}
+        # Routes found too long to cache (routes only grow), LRU bounded
+        self._too_long: OrderedDict[str, None] = OrderedDict()
+        self._points = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, tracking_id: str) -> Optional[RouteColumns]:
+        """Return the cached route (counting a hit or miss)"""
+        route = self._routes.get(tracking_id)
+        if route is not None and time.monotonic() - route.loaded_at > self.ttl_seconds:
+            self.forget(tracking_id)
+            route = None
+        if route is None:
+            self.misses += 1
+            return None
+        self._routes.move_to_end(tracking_id)
+        self.hits += 1
+        return route
+
+    async def load(
+        self,
+        tracking_id: str,
+        package_id: ObjectId,
+        read_batches: Callable[[], AsyncIterator[list[dict]]]
+    ) -> Optional[RouteColumns]:
+        """
+        Read a whole route into the cache
+
+        Args:
+            read_batches: Returns an async iterator over the route's points in
+                (timestamp, _id) order, in batches
+
+        Returns:
+            The cached route, or None if it is too long to cache or already
+            being loaded by another request
+        """
+        if tracking_id in self._loading or tracking_id in self._too_long:
+            return None
+        self._loading[tracking_id] = []
+        route = RouteColumns(package_id)
+        try:
+            async for batch in read_batches():
+                if len(route) + len(batch) > self.max_route_points:
+                    self._mark_too_long(tracking_id)
+                    return None
+                for location in batch:
+                    route.append(location)
+        finally:
+            pending = self._loading.pop(tracking_id)
+
+        # Points written while the route was being read may or may not be in it
+        for location, replaces in pending:
+            route.upsert(location, replaces)
+
+        self.forget(tracking_id)
+        self._routes[tracking_id] = route
+        self._points += len(route)
+        self.loads += 1
+        self._evict()
+        return route
+
+    def add(self, tracking_id: str, location: dict, replaces: Optional[ObjectId] = None):
+        """
+        Record a written point for a cached (or loading) route; uncached
+        routes are ignored
+        """
+        pending = self._loading.get(tracking_id)
+        if pending is not None:
+            pending.append((location, replaces))
+            return
+        route = self._routes.get(tracking_id)
+        if route is None:
+            return
+        self._points += route.upsert(location, replaces)
+        if len(route) > self.max_route_points:
+            self.forget(tracking_id)
+            self._mark_too_long(tracking_id)
+        else:
+            self._evict()
+
+    def _mark_too_long(self, tracking_id: str):
+        self._too_long[tracking_id] = None
+        if len(self._too_long) > 10000:
+            self._too_long.popitem(last=False)
+
+    def forget(self, tracking_id: str):
+        route = self._routes.pop(tracking_id, None)
+        if route is not None:
+            self._points -= len(route)
+
+    def _evict(self):
+        while self._points > self.max_points and self._routes:
+            _, route = self._routes.popitem(last=False)
+            self._points -= len(route)
+            self.evictions += 1
+
+    def get_stats(self) -> dict:
+        """Return cache counters"""
+        total = self.hits + self.misses
+        return {
+            "routes": len(self._routes),
+            "points": self._points,
+            "bytes": self._points * POINT_BYTES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+
+# Route cache configuration
+ROUTE_CACHE_ENABLED = os.getenv("ROUTE_CACHE_ENABLED", "false").lower() in ["1", "true", "yes"]
+
+# Global cache instance
+route_cache = RouteCache(
+    max_points=int(os.getenv("ROUTE_CACHE_MAX_POINTS", "1000000")),
+    max_route_points=int(os.getenv("ROUTE_CACHE_MAX_ROUTE_POINTS", "50000")),
+    ttl_seconds=float(os.getenv("ROUTE_CACHE_TTL_S", "300"))
+)
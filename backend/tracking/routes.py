@@ -1,34 +1,133 @@
 """
 Tracking routes for location updates and route history
 """
-from fastapi import APIRouter, HTTPException, status, Depends, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
 from db.connection import get_database
-from models.location import LocationUpdateCreate, LocationUpdateResponse, RouteHistoryResponse
+from models.location import (
+    LocationUpdateCreate,
+    LocationUpdateResponse,
+    RouteHistoryResponse,
+    LocationBatchItem,
+    LocationBatchCreate,
+    LocationBatchResponse,
+    MAX_BATCH_POINTS
+)
 from models.prediction import PredictionResponse
 from models.user import UserResponse
-from auth.dependencies import get_current_active_user, require_role
+from models.fast_json import FastJSONResponse, dumps, location_row
+from auth.dependencies import get_current_active_user, require_role, get_user_from_token
 from tracking.websocket import manager
-from tracking.eta import calculate_eta, format_eta
+from tracking.buffer import location_buffer, LOCATION_BUFFER_ENABLED, LOCATION_BUFFER_WAIT
+from tracking.storage import (
+    insert_locations,
+    update_location_point,
+    get_route_locations,
+    iter_route_locations,
+    get_latest_location,
+    get_recent_locations,
+    encode_history_cursor,
+    decode_history_cursor
+)
+from tracking.codec import JSON_CONTENT_TYPE, PayloadError, decode_point, decode_points, openapi_request_body
+from tracking.idempotency import idempotency_cache, location_idempotency_key
+from tracking.ratelimit import ingest_limiter, point_coalescer, INGEST_RATE_LIMIT_ENABLED, INGEST_COALESCE_EXCESS
+from tracking.route_cache import route_cache, ROUTE_CACHE_ENABLED
+from tracking.thinning import location_thinner, LOCATION_THINNING_ENABLED, KEEP, DROP, MERGE
+from tracking.eta import format_eta, ETA_MODE
+from tracking.speed import speed_estimator
+from tracking.predictions import calculate_package_eta, eta_scheduler, ETA_SCHEDULER_ENABLED
+from tracking.eta_cache import eta_cache, eta_location_key, ETA_CACHE_ENABLED
+from tracking.simplify import rdp_mask, zoom_tolerance_meters, encode_polyline
+from tracking.geofence import (
+    geofence_tracker,
+    package_fences,
+    ENTER,
+    RESTRICTED,
+    SENDER,
+    GEOFENCE_DELIVERED_ON
+)
 from packages.status import (
-    should_auto_transition_to_in_transit,
-    should_auto_transition_to_delivered,
+    geofence_transitions,
     update_package_status
 )
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pydantic import ValidationError
 from typing import List, Optional
+import asyncio
 import json
 import logging
+import math
+import os
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/tracking", tags=["tracking"])
 
+# Courier ingest WebSocket acknowledgement batching
+WS_ACK_BATCH_SIZE = int(os.getenv("WS_ACK_BATCH_SIZE", "50"))
+WS_ACK_INTERVAL_SECONDS = int(os.getenv("WS_ACK_INTERVAL_MS", "200")) / 1000
+
+# Points read from MongoDB per streamed route history chunk
+HISTORY_STREAM_BATCH_SIZE = int(os.getenv("HISTORY_STREAM_BATCH_SIZE", "1000"))
+
+
+async def _read_location_body(request: Request, model, tracking_id: Optional[str] = None):
+    """
+    Parse an ingest request body by Content-Type
+
+    Binary formats (see tracking.codec) decode into typed arrays without a
+    Pydantic model per point; anything else is validated as JSON against `model`.
+
+    Args:
+        tracking_id: Tracking ID of a single-point route; None for batches
+
+    Returns:
+        A LocationPoint (single-point routes) or a list of them (batches)
+        for binary bodies, otherwise a `model` instance
+    """
+    content_type = request.headers.get("content-type", JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+    body = await request.body()
+    try:
+        if tracking_id is not None:
+            point = decode_point(content_type, body, tracking_id)
+            if point is not None:
+                return point
+        else:
+            columns = decode_points(content_type, body)
+            if columns is not None:
+                if len(columns) > MAX_BATCH_POINTS:
+                    raise PayloadError(f"At most {MAX_BATCH_POINTS} points per batch")
+                return columns.points()
+    except PayloadError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        # Same error shape as a declared body parameter
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
 
-@router.post("/{tracking_id}/update", response_model=LocationUpdateResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/{tracking_id}/update",
+    response_model=LocationUpdateResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=openapi_request_body(LocationUpdateCreate)
+)
 async def update_location(
     tracking_id: str,
-    location_data: LocationUpdateCreate,
+    request: Request,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
     current_user: UserResponse = Depends(require_role(["delivery_staff", "manager"]))
 ):
     """
@@ -38,7 +137,18 @@ async def update_location(
     - **latitude**: Latitude coordinate
     - **longitude**: Longitude coordinate
     - **timestamp**: Optional timestamp (defaults to now)
+    - **idempotency_key** / **device_id** + **sequence**: Optional retry key;
+      a retried upload gets the original response back (also accepted as
+      an Idempotency-Key header)
+    
+    Rate limited per courier and per package: excess points get 429 with a
+    Retry-After header, or 202 when INGEST_COALESCE_EXCESS keeps the newest one.
+    
+    Besides JSON, accepts one point as application/x-location-points or
+    application/x-msgpack (see tracking.codec).
     """
+    location_data = await _read_location_body(request, LocationUpdateCreate, tracking_id)
+    
     try:
         db = get_database()
     except RuntimeError as e:
@@ -47,8 +157,79 @@ async def update_location(
             detail=f"Database connection error: {str(e)}"
         )
     
+    location = await _submit_location(db, current_user.id, tracking_id, location_data, idempotency_key)
+    if location is None:
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "coalesced", "tracking_id": tracking_id}
+        )
+    return location
+
+
+async def _submit_location(
+    db,
+    user_id: str,
+    tracking_id: str,
+    location_data: LocationUpdateCreate,
+    idempotency_key: Optional[str] = None
+) -> Optional[LocationUpdateResponse]:
+    """
+    Rate limit, deduplicate and ingest one location point
+    (shared by the HTTP and WebSocket ingest paths)
+    
+    Returns:
+        The stored location, or None if the point was coalesced
+    
+    Raises:
+        HTTPException: 429 when rate limited (and not coalescing), 404 for unknown packages
+    """
+    key = location_idempotency_key(
+        tracking_id,
+        idempotency_key or location_data.idempotency_key,
+        location_data.device_id,
+        location_data.sequence
+    )
+    
+    def ingest():
+        return idempotency_cache.run_once(
+            key,
+            lambda: _ingest_location(db, tracking_id, location_data, key)
+        )
+    
+    # Backpressure: per-courier and per-package token buckets. Retries of
+    # stored or in-flight uploads are replayed without taking a token.
+    if INGEST_RATE_LIMIT_ENABLED and (key is None or idempotency_cache.get(key) is None):
+        retry_after = ingest_limiter.try_acquire(user_id, [tracking_id])
+        if retry_after > 0:
+            if INGEST_COALESCE_EXCESS:
+                # Keep only the newest excess point; it is ingested once the bucket refills
+                point_coalescer.submit(
+                    tracking_id,
+                    ingest,
+                    retry_after,
+                    acquire=lambda: ingest_limiter.try_acquire(user_id, [tracking_id])
+                )
+                return None
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many location updates",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    
+    return await ingest()
+
+
+async def _ingest_location(
+    db,
+    tracking_id: str,
+    location_data: LocationUpdateCreate,
+    idempotency_key: Optional[str] = None
+) -> LocationUpdateResponse:
+    """
+    Store one location point and run its side effects
+    (thinning, write, status auto-transitions, ETA, broadcast)
+    """
     packages_collection = db.packages
-    locations_collection = db.location_updates
     
     # Verify package exists
     package = await packages_collection.find_one({"tracking_id": tracking_id})
@@ -69,20 +250,91 @@ async def update_location(
         "timestamp": update_timestamp,
         "created_at": datetime.utcnow()
     }
+    if idempotency_key:
+        location_doc["idempotency_key"] = idempotency_key
     
-    # Insert location update
-    result = await locations_collection.insert_one(location_doc)
+    # Every received point (thinned or not) counts towards the observed speed
+    if ETA_MODE == "speed":
+        await _observe_speed(db, package, [(location_data.latitude, location_data.longitude, update_timestamp)])
     
-    # Create indexes if they don't exist
-    try:
-        await locations_collection.create_index("package_id")
-        await locations_collection.create_index("timestamp")
-        await locations_collection.create_index([("package_id", 1), ("timestamp", 1)])
-    except Exception:
-        pass  # Indexes might already exist
+    # Thin near-duplicate points before writing (in-memory, no DB reads).
+    # Fire-and-forget buffering may not have written the last kept point
+    # yet, so merging into it is only allowed when writes are confirmed.
+    action, kept_id = KEEP, None
+    if LOCATION_THINNING_ENABLED:
+        action, kept_id = location_thinner.decide(
+            tracking_id,
+            location_data.latitude,
+            location_data.longitude,
+            update_timestamp,
+            allow_merge=not (LOCATION_BUFFER_ENABLED and not LOCATION_BUFFER_WAIT)
+        )
     
-    # Fetch created location update
-    created_location = await locations_collection.find_one({"_id": result.inserted_id})
+    if action == DROP:
+        # Not stored: report the point against the kept point it fell into;
+        # status, ETA and subscribers already reflect that position
+        return LocationUpdateResponse(
+            id=str(kept_id),
+            package_id=str(package["_id"]),
+            latitude=location_doc["latitude"],
+            longitude=location_doc["longitude"],
+            timestamp=location_doc["timestamp"],
+            created_at=location_doc["created_at"]
+        )
+    
+    if action == MERGE:
+        # The last kept point is redundant on this straight stretch: move it here
+        location_doc["_id"] = kept_id
+        await update_location_point(db, package["_id"], kept_id, {
+            "latitude": location_doc["latitude"],
+            "longitude": location_doc["longitude"],
+            "timestamp": location_doc["timestamp"]
+        })
+        location_thinner.merge(
+            tracking_id,
+            location_doc["latitude"],
+            location_doc["longitude"],
+            location_doc["timestamp"]
+        )
+    else:
+        try:
+            if LOCATION_BUFFER_ENABLED:
+                # Insert location update through the write-behind buffer
+                # (fire-and-forget writes cannot report a duplicate)
+                await location_buffer.add(location_doc, wait=LOCATION_BUFFER_WAIT)
+            else:
+                await insert_locations(db, [location_doc])
+        except DuplicateKeyError:
+            # Retry of an upload the cache no longer remembers: replay the
+            # stored point and skip ETA and broadcast
+            existing = await db.location_updates.find_one({"idempotency_key": idempotency_key})
+            if not existing:
+                raise
+            return LocationUpdateResponse(
+                id=str(existing["_id"]),
+                package_id=str(existing["package_id"]),
+                latitude=existing["latitude"],
+                longitude=existing["longitude"],
+                timestamp=existing["timestamp"],
+                created_at=existing["created_at"]
+            )
+    
+    if LOCATION_THINNING_ENABLED and action == KEEP:
+        location_thinner.keep(
+            tracking_id,
+            location_doc["latitude"],
+            location_doc["longitude"],
+            location_doc["timestamp"],
+            location_doc["_id"]
+        )
+    
+    # Keep a cached route current without re-reading it
+    if ROUTE_CACHE_ENABLED:
+        route_cache.add(tracking_id, location_doc, replaces=kept_id if action == MERGE else None)
+    
+    # Buffered documents may not be written yet, so build the response from
+    # the document we hold (insert_one / the buffer set its _id)
+    created_location = location_doc
     
     # Prepare location data for broadcast
     location_response = LocationUpdateResponse(
@@ -94,42 +346,244 @@ async def update_location(
         created_at=created_location["created_at"]
     )
     
-    # Auto-update status based on location
-    sender_lat = package["sender"].get("latitude", 0.0)
-    sender_lng = package["sender"].get("longitude", 0.0)
+    await _process_latest_location(db, package, location_response)
+    
+    return location_response
+
+
+@router.post(
+    "/batch",
+    response_model=LocationBatchResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=openapi_request_body(LocationBatchCreate)
+)
+async def update_location_batch(
+    request: Request,
+    current_user: UserResponse = Depends(require_role(["delivery_staff", "manager"]))
+):
+    """
+    Upload many buffered location updates at once (delivery staff only)
+    
+    - **updates**: List of points, each with tracking_id, latitude, longitude and optional timestamp
+    
+    All points are written with a single bulk insert. Status auto-transitions,
+    ETA and WebSocket broadcast run once per package, on its newest point.
+    
+    Besides JSON, accepts columnar application/x-location-points or
+    application/x-msgpack bodies (see tracking.codec).
+    """
+    batch = await _read_location_body(request, LocationBatchCreate)
+    updates = batch.updates if isinstance(batch, LocationBatchCreate) else batch
+    
+    try:
+        db = get_database()
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database connection error: {str(e)}"
+        )
+    
+    packages_collection = db.packages
+    tracking_ids = {item.tracking_id for item in updates}
+    
+    # Backpressure: one token per batch from the courier and each package
+    if INGEST_RATE_LIMIT_ENABLED:
+        retry_after = ingest_limiter.try_acquire(current_user.id, sorted(tracking_ids))
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many location updates",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    
+    # Resolve all packages in one query
+    cursor = packages_collection.find({"tracking_id": {"$in": list(tracking_ids)}})
+    packages = {pkg["tracking_id"]: pkg for pkg in await cursor.to_list(length=len(tracking_ids))}
+    
+    missing = sorted(tracking_ids - packages.keys())
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Package not found: {', '.join(missing)}"
+        )
+    
+    # Build all location documents, keeping request order, skipping retried
+    # points and dropping near-duplicate points (merging is not used for batches)
+    now = datetime.utcnow()
+    location_docs = []
+    observed: dict[str, list[tuple]] = {}
+    dropped = 0
+    duplicates = 0
+    seen_keys = set()
+    for item in updates:
+        key = location_idempotency_key(item.tracking_id, item.idempotency_key, item.device_id, item.sequence)
+        if key is not None:
+            if key in seen_keys or idempotency_cache.get(key) is not None:
+                duplicates += 1
+                continue
+            seen_keys.add(key)
+        
+        location_doc = {
+            "_id": ObjectId(),
+            "package_id": packages[item.tracking_id]["_id"],
+            "latitude": item.latitude,
+            "longitude": item.longitude,
+            "timestamp": item.timestamp or now,
+            "created_at": now
+        }
+        if key is not None:
+            location_doc["idempotency_key"] = key
+        observed.setdefault(item.tracking_id, []).append(
+            (location_doc["latitude"], location_doc["longitude"], location_doc["timestamp"])
+        )
+        if LOCATION_THINNING_ENABLED:
+            action, _ = location_thinner.decide(
+                item.tracking_id,
+                location_doc["latitude"],
+                location_doc["longitude"],
+                location_doc["timestamp"],
+                allow_merge=False
+            )
+            if action == DROP:
+                dropped += 1
+                continue
+            location_thinner.keep(
+                item.tracking_id,
+                location_doc["latitude"],
+                location_doc["longitude"],
+                location_doc["timestamp"],
+                location_doc["_id"]
+            )
+        location_docs.append(location_doc)
+    
+    if ETA_MODE == "speed":
+        for tracking_id, points in observed.items():
+            points.sort(key=lambda point: point[2])
+            await _observe_speed(db, packages[tracking_id], points)
+    
+    # Single bulk write
+    try:
+        await insert_locations(db, location_docs)
+    except BulkWriteError as e:
+        # Retried points the cache no longer remembers hit the unique index;
+        # the rest of the batch was still written (unordered insert)
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        rejected = {error["index"] for error in errors}
+        location_docs = [doc for i, doc in enumerate(location_docs) if i not in rejected]
+        duplicates += len(rejected)
+    
+    if ROUTE_CACHE_ENABLED:
+        tracking_ids_by_id = {pkg["_id"]: pkg["tracking_id"] for pkg in packages.values()}
+        for location_doc in location_docs:
+            route_cache.add(tracking_ids_by_id[location_doc["package_id"]], location_doc)
+    
+    location_list = [
+        LocationUpdateResponse(
+            id=str(doc["_id"]),
+            package_id=str(doc["package_id"]),
+            latitude=doc["latitude"],
+            longitude=doc["longitude"],
+            timestamp=doc["timestamp"],
+            created_at=doc["created_at"]
+        )
+        for doc in location_docs
+    ]
+    
+    # Remember keys so retries of this batch are skipped
+    for location_doc, location in zip(location_docs, location_list):
+        if "idempotency_key" in location_doc:
+            idempotency_cache.put(location_doc["idempotency_key"], location)
+    
+    # Pick the newest stored point per package (later points win ties)
+    packages_by_id = {pkg["_id"]: pkg for pkg in packages.values()}
+    latest: dict = {}
+    for location_doc, location in zip(location_docs, location_list):
+        current = latest.get(location_doc["package_id"])
+        if current is None or location.timestamp >= current.timestamp:
+            latest[location_doc["package_id"]] = location
+    
+    for package_id, location in latest.items():
+        await _process_latest_location(db, packages_by_id[package_id], location)
+    
+    return LocationBatchResponse(
+        locations=location_list,
+        total=len(location_list),
+        dropped=dropped,
+        duplicates=duplicates
+    )
+
+
+async def _observe_speed(db, package: dict, points: list[tuple]):
+    """
+    Feed a package's new (latitude, longitude, timestamp) points to the speed
+    estimator, seeding it from stored history the first time it sees the package
+    """
+    tracking_id = package["tracking_id"]
+    if not speed_estimator.tracks(tracking_id):
+        recent = await get_recent_locations(db, package["_id"], speed_estimator.window_segments + 1)
+        speed_estimator.seed(tracking_id, recent)
+    for latitude, longitude, timestamp in points:
+        speed_estimator.observe(tracking_id, latitude, longitude, timestamp)
+
+
+async def _process_latest_location(db, package: dict, location: LocationUpdateResponse):
+    """
+    Run status auto-transitions, ETA update and WebSocket broadcast
+    for the newest known location of a package
+    """
+    tracking_id = package["tracking_id"]
+    
     recipient_lat = package["recipient"].get("latitude", 0.0)
     recipient_lng = package["recipient"].get("longitude", 0.0)
     
-    # Auto-transition to "in_transit" if moved away from sender
-    if package["status"] == "registered":
-        if should_auto_transition_to_in_transit(
-            location_data.latitude,
-            location_data.longitude,
-            sender_lat,
-            sender_lng
-        ):
-            await update_package_status(tracking_id, "in_transit")
-            package["status"] = "in_transit"
-            logger.info(f"Auto-transitioned package {tracking_id} to in_transit")
+    # Geofence events (a registered package starts inside its sender fence)
+    events = geofence_tracker.update(
+        tracking_id,
+        location.latitude,
+        location.longitude,
+        location.timestamp,
+        package_fences(package),
+        starts_inside=[SENDER] if package["status"] == "registered" else ()
+    )
+    for event in events:
+        if event.kind == RESTRICTED and event.type == ENTER:
+            logger.warning(f"Package {tracking_id} entered restricted zone {event.name or event.fence_id}")
     
-    # Auto-transition to "delivered" if close to recipient
-    if package["status"] == "in_transit":
-        if should_auto_transition_to_delivered(
-            location_data.latitude,
-            location_data.longitude,
-            recipient_lat,
-            recipient_lng
-        ):
-            await update_package_status(tracking_id, "delivered")
-            package["status"] = "delivered"
-            logger.info(f"Auto-transitioned package {tracking_id} to delivered")
+    # Auto-transition status on sender / depot / hub / recipient events
+    for new_status in geofence_transitions(package["status"], events, GEOFENCE_DELIVERED_ON):
+        result = await update_package_status(tracking_id, new_status)
+        if result.ok:
+            package["status"] = new_status
+            logger.info(f"Auto-transitioned package {tracking_id} to {new_status}")
+        else:
+            if result.reason == "rejected":
+                # Another request changed the status first
+                package["status"] = result.current_status
+            else:
+                # Write failed: emit the events again on the next ping
+                geofence_tracker.retry(tracking_id, events)
+            break
+    
+    if package["status"] == "delivered":
+        speed_estimator.forget(tracking_id)
+        geofence_tracker.forget(tracking_id)
+        location_thinner.forget(tracking_id)
     
-    # Calculate and store ETA if package is not delivered
-    if package["status"] != "delivered" and recipient_lat != 0.0 and recipient_lng != 0.0:
+    # Calculate and store ETA if package is not delivered (the scheduler
+    # refreshes every prediction when enabled)
+    if (
+        not ETA_SCHEDULER_ENABLED
+        and package["status"] != "delivered"
+        and recipient_lat != 0.0
+        and recipient_lng != 0.0
+    ):
         predictions_collection = db.predictions
-        eta = calculate_eta(
-            location_data.latitude,
-            location_data.longitude,
+        eta = calculate_package_eta(
+            tracking_id,
+            location.latitude,
+            location.longitude,
             recipient_lat,
             recipient_lng
         )
@@ -152,22 +606,55 @@ async def update_location(
     # Broadcast to all connected clients
     await manager.broadcast_location_update(
         tracking_id,
-        location_response.model_dump()
+        location.model_dump()
     )
-    
-    return location_response
+    if events:
+        await manager.broadcast_geofence_events(
+            tracking_id,
+            [event.to_dict() for event in events]
+        )
 
 
 @router.get("/{tracking_id}/history", response_model=RouteHistoryResponse)
 async def get_route_history(
     tracking_id: str,
+    since: Optional[datetime] = Query(None, description="Only points at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only points before this time"),
+    limit: int = Query(1000, ge=1, le=5000, description="Maximum points per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    simplify: Optional[float] = Query(None, gt=0, description="Simplification tolerance in meters"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Simplify for drawing at this map zoom level"),
+    output_format: str = Query("objects", alias="format", pattern="^(objects|polyline)$"),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
     Get route history for a package (authenticated users can view their packages)
     
     - **tracking_id**: Package tracking ID
+    - **since** / **until**: Optional time window
+    - **limit**: Page size (default 1000)
+    - **cursor**: Continue after the previous page; keep the last next_cursor
+      to poll for points added since
+    - **simplify** / **zoom**: Ramer-Douglas-Peucker simplify each page of up
+      to limit points with a tolerance in meters, or one map pixel at the
+      zoom level
+    - **format**: "objects" (default) or "polyline" for a Google encoded
+      polyline string instead of the location list
+    
+    Points are returned oldest first, in (timestamp, id) order. With
+    ROUTE_CACHE_ENABLED, routes are served from the in-memory route cache.
+    Archived tracks of delivered packages are read back transparently.
     """
+    after = None
+    if cursor:
+        try:
+            after = decode_history_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
     try:
         db = get_database()
     except RuntimeError as e:
@@ -177,7 +664,6 @@ async def get_route_history(
         )
     
     packages_collection = db.packages
-    locations_collection = db.location_updates
     
     # Verify package exists
     package = await packages_collection.find_one({"tracking_id": tracking_id})
@@ -195,28 +681,160 @@ async def get_route_history(
                 detail="You don't have permission to view this package"
             )
     
-    # Fetch location updates for this package, sorted by timestamp
-    cursor = locations_collection.find({"package_id": package["_id"]}).sort("timestamp", 1)
-    locations = await cursor.to_list(length=1000)
+    since, until = _naive_utc(since), _naive_utc(until)
+    # Delivered packages' tracks may have moved to the cold archive tier
+    archived = bool(package.get("archived_at"))
     
-    location_list = [
-        LocationUpdateResponse(
-            id=str(loc["_id"]),
-            package_id=str(loc["package_id"]),
-            latitude=loc["latitude"],
-            longitude=loc["longitude"],
-            timestamp=loc["timestamp"],
-            created_at=loc["created_at"]
+    # Serve from the in-memory route cache when enabled, loading it on a miss
+    route = None
+    if ROUTE_CACHE_ENABLED:
+        route = route_cache.get(tracking_id)
+        if route is None:
+            route = await route_cache.load(
+                tracking_id,
+                package["_id"],
+                lambda: iter_route_locations(
+                    db,
+                    package["_id"],
+                    batch_size=HISTORY_STREAM_BATCH_SIZE,
+                    archived=archived
+                )
+            )
+    
+    # Fetch one page of location updates (one extra point to detect more)
+    if route is not None:
+        start, end = route.window(since, until, after)
+        locations = route.documents(start, min(end, start + limit + 1))
+    else:
+        locations = await get_route_locations(
+            db,
+            package["_id"],
+            limit=limit + 1,
+            since=since,
+            until=until,
+            after=after,
+            archived=archived
         )
-        for loc in locations
-    ]
+    has_more = len(locations) > limit
+    locations = locations[:limit]
+    next_cursor = encode_history_cursor(locations[-1]) if locations else cursor
     
-    return RouteHistoryResponse(
-        package_id=str(package["_id"]),
-        tracking_id=tracking_id,
-        locations=location_list,
-        total=len(location_list)
-    )
+    if simplify is not None or zoom is not None:
+        # Simplify the page; its first and last points are always kept, so
+        # consecutive simplified pages join up
+        latitudes = np.array([loc["latitude"] for loc in locations], dtype=np.float64)
+        longitudes = np.array([loc["longitude"] for loc in locations], dtype=np.float64)
+        if simplify is None:
+            simplify = zoom_tolerance_meters(zoom, float(latitudes.mean()) if len(latitudes) else 0.0)
+        kept = np.flatnonzero(rdp_mask(latitudes, longitudes, simplify))
+        locations = [locations[i] for i in kept.tolist()]
+    
+    polyline = None
+    if output_format == "polyline":
+        polyline = encode_polyline(
+            [loc["latitude"] for loc in locations],
+            [loc["longitude"] for loc in locations]
+        )
+        total = len(locations)
+    
+    # Serialize the documents directly (same shape as RouteHistoryResponse)
+    package_id = str(package["_id"])
+    if polyline is None:
+        location_list = [location_row(loc, package_id) for loc in locations]
+        total = len(location_list)
+    else:
+        location_list = []
+    
+    return FastJSONResponse({
+        "package_id": package_id,
+        "tracking_id": tracking_id,
+        "locations": location_list,
+        "total": total,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "polyline": polyline
+    })
+
+
+@router.get(
+    "/{tracking_id}/history/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}}
+)
+async def stream_route_history(
+    tracking_id: str,
+    since: Optional[datetime] = Query(None, description="Only points at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only points before this time"),
+    cursor: Optional[str] = Query(None, description="Continue after this history cursor"),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Stream the full route history as NDJSON, one location per line
+    
+    - **tracking_id**: Package tracking ID
+    - **since** / **until**: Optional time window
+    - **cursor**: Optional next_cursor from /history to resume after
+    
+    Rows have the fields of the /history locations, oldest first. Points
+    are read and written in batches, so memory use does not grow with the
+    route length and the first rows are sent before the query finishes.
+    """
+    after = None
+    if cursor:
+        try:
+            after = decode_history_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
+    try:
+        db = get_database()
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Database connection error: {str(e)}"
+        )
+    
+    # Verify package exists
+    package = await db.packages.find_one({"tracking_id": tracking_id})
+    if not package:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Package not found"
+        )
+    
+    # Check authorization: users can only view their own packages (unless manager/delivery_staff)
+    if current_user.role not in ["manager", "delivery_staff"]:
+        if str(package["user_id"]) != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have permission to view this package"
+            )
+    
+    package_id = str(package["_id"])
+    
+    async def rows():
+        async for batch in iter_route_locations(
+            db,
+            package["_id"],
+            batch_size=HISTORY_STREAM_BATCH_SIZE,
+            since=_naive_utc(since),
+            until=_naive_utc(until),
+            after=after,
+            archived=bool(package.get("archived_at"))
+        ):
+            yield b"".join(dumps(location_row(loc, package_id)) + b"\n" for loc in batch)
+    
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert an aware query datetime to the naive UTC form stored in MongoDB"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 @router.websocket("/ws/{tracking_id}")
@@ -260,6 +878,117 @@ async def websocket_tracking(websocket: WebSocket, tracking_id: str):
         manager.disconnect(websocket, tracking_id)
 
 
+@router.websocket("/ingest/ws")
+async def websocket_ingest(websocket: WebSocket, token: Optional[str] = None):
+    """
+    WebSocket endpoint for courier location ingest (delivery staff only)
+    
+    Authenticates once on connect (``?token=<JWT>`` or a first
+    ``{"type": "auth", "token": ...}`` frame), then accepts a stream of
+    location frames for one or more packages:
+    
+    - ``{"type": "location", "ref": ..., "tracking_id": ..., "latitude": ..., "longitude": ...}``
+    - ``{"type": "locations", "updates": [<location frames>]}``
+    
+    Frames go through the same pipeline as POST /{tracking_id}/update.
+    Acknowledgements are batched: ``{"type": "ack", "refs": [...], "errors": [...]}``
+    is sent every WS_ACK_BATCH_SIZE frames or WS_ACK_INTERVAL_MS.
+    """
+    await websocket.accept()
+    
+    try:
+        db = get_database()
+        if token is None:
+            first = json.loads(await websocket.receive_text())
+            if first.get("type") == "auth":
+                token = first.get("token")
+        user = await get_user_from_token(token) if token else None
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        logger.error(f"Ingest WebSocket auth error: {e}")
+        user = None
+    
+    if user is None or user.role not in ["delivery_staff", "manager"]:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not authorized")
+        return
+    
+    await manager.send_message(websocket, {"type": "connected", "user_id": user.id})
+    
+    acked: list = []
+    errors: list = []
+    loop = asyncio.get_running_loop()
+    ack_deadline = None
+    
+    async def send_acks():
+        nonlocal acked, errors, ack_deadline
+        if acked or errors:
+            await manager.send_message(websocket, {"type": "ack", "refs": acked, "errors": errors})
+            acked, errors = [], []
+        ack_deadline = None
+    
+    try:
+        while True:
+            timeout = None if ack_deadline is None else max(0.0, ack_deadline - loop.time())
+            try:
+                data = await asyncio.wait_for(websocket.receive_text(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await send_acks()
+                continue
+            
+            try:
+                message = json.loads(data)
+            except ValueError:
+                errors.append({"ref": None, "status": 400, "detail": "Invalid JSON"})
+                message = {}
+            if not isinstance(message, dict):
+                errors.append({"ref": None, "status": 400, "detail": "Frame must be a JSON object"})
+                message = {}
+            
+            if message.get("type") == "ping":
+                await manager.send_message(websocket, {
+                    "type": "pong",
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                continue
+            
+            if message.get("type") == "locations":
+                frames = message.get("updates", [])
+                if not isinstance(frames, list):
+                    errors.append({"ref": None, "status": 422, "detail": "updates must be a list"})
+                    frames = []
+            elif message.get("type") == "location":
+                frames = [message]
+            else:
+                frames = []
+            
+            for frame in frames:
+                if not isinstance(frame, dict):
+                    errors.append({"ref": None, "status": 422, "detail": "Location frame must be a JSON object"})
+                    continue
+                ref = frame.get("ref")
+                try:
+                    item = LocationBatchItem.model_validate(frame)
+                    await _submit_location(db, user.id, item.tracking_id, item)
+                    acked.append(ref)
+                except ValidationError as e:
+                    errors.append({"ref": ref, "status": 422, "detail": e.errors(include_url=False, include_context=False)})
+                except HTTPException as e:
+                    errors.append({"ref": ref, "status": e.status_code, "detail": e.detail})
+                except Exception as e:
+                    logger.error(f"Error ingesting WebSocket frame: {e}")
+                    errors.append({"ref": ref, "status": 500, "detail": "Failed to store location"})
+            
+            if len(acked) + len(errors) >= WS_ACK_BATCH_SIZE:
+                await send_acks()
+            elif (acked or errors) and ack_deadline is None:
+                ack_deadline = loop.time() + WS_ACK_INTERVAL_SECONDS
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Ingest WebSocket error: {e}")
+
+
 @router.get("/{tracking_id}/eta", response_model=PredictionResponse)
 async def get_eta(
     tracking_id: str,
@@ -280,7 +1009,6 @@ async def get_eta(
     
     packages_collection = db.packages
     predictions_collection = db.predictions
-    locations_collection = db.location_updates
     
     # Verify package exists
     package = await packages_collection.find_one({"tracking_id": tracking_id})
@@ -305,11 +1033,23 @@ async def get_eta(
             detail="Package has already been delivered"
         )
     
+    # Scheduled predictions are served as stored
+    if ETA_SCHEDULER_ENABLED:
+        prediction = await predictions_collection.find_one({"package_id": package["_id"]})
+        if prediction:
+            eta_info = format_eta(prediction["eta"])
+            return PredictionResponse(
+                id=str(prediction["_id"]),
+                package_id=str(package["_id"]),
+                tracking_id=tracking_id,
+                eta=prediction["eta"],
+                calculated_at=prediction["calculated_at"],
+                time_remaining_minutes=eta_info["time_remaining_minutes"],
+                formatted_eta=eta_info["formatted"]
+            )
+    
     # Get the most recent location update
-    latest_location = await locations_collection.find_one(
-        {"package_id": package["_id"]},
-        sort=[("timestamp", -1)]
-    )
+    latest_location = await get_latest_location(db, package["_id"])
     
     if not latest_location:
         raise HTTPException(
@@ -327,8 +1067,29 @@ async def get_eta(
             detail="Recipient location not set"
         )
     
+    # Nothing moved since the last recent calculation: serve it as is
+    location_key = eta_location_key(latest_location, recipient_lat, recipient_lng)
+    if ETA_CACHE_ENABLED:
+        cached = eta_cache.get(tracking_id, location_key)
+        if cached is not None:
+            eta_info = format_eta(cached.eta)
+            return PredictionResponse(
+                id="",  # Not needed for response
+                package_id=str(package["_id"]),
+                tracking_id=tracking_id,
+                eta=cached.eta,
+                calculated_at=cached.calculated_at,
+                time_remaining_minutes=eta_info["time_remaining_minutes"],
+                formatted_eta=eta_info["formatted"]
+            )
+    
+    # Seed the observed speed after a restart
+    if ETA_MODE == "speed":
+        await _observe_speed(db, package, [])
+    
     # Calculate ETA
-    eta = calculate_eta(
+    eta = calculate_package_eta(
+        tracking_id,
         latest_location["latitude"],
         latest_location["longitude"],
         recipient_lat,
@@ -345,10 +1106,11 @@ async def get_eta(
     eta_info = format_eta(eta)
     
     # Store or update prediction
+    calculated_at = datetime.utcnow()
     prediction_doc = {
         "package_id": package["_id"],
         "eta": eta,
-        "calculated_at": datetime.utcnow()
+        "calculated_at": calculated_at
     }
     
     await predictions_collection.update_one(
@@ -357,13 +1119,37 @@ async def get_eta(
         upsert=True
     )
     
+    if ETA_CACHE_ENABLED:
+        eta_cache.put(tracking_id, location_key, eta, calculated_at)
+    
     return PredictionResponse(
         id="",  # Not needed for response
         package_id=str(package["_id"]),
         tracking_id=tracking_id,
         eta=eta,
-        calculated_at=datetime.utcnow(),
+        calculated_at=calculated_at,
         time_remaining_minutes=eta_info["time_remaining_minutes"],
         formatted_eta=eta_info["formatted"]
     )
 
+
+
+@router.get("/stats")
+async def get_ingest_stats(
+    current_user: UserResponse = Depends(require_role(["manager"]))
+):
+    """
+    Get in-process ingest counters (manager only)
+    """
+    return {
+        "write_buffer": location_buffer.get_stats(),
+        "thinning": location_thinner.get_stats(),
+        "idempotency": idempotency_cache.get_stats(),
+        "rate_limit": ingest_limiter.get_stats(),
+        "coalescing": point_coalescer.get_stats(),
+        "route_cache": route_cache.get_stats(),
+        "speed": speed_estimator.get_stats(),
+        "eta_scheduler": eta_scheduler.get_stats(),
+        "eta_cache": eta_cache.get_stats(),
+        "geofences": geofence_tracker.get_stats()
+    }
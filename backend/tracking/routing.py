@@ -0,0 +1,491 @@
+"""
+Offline road-network routing for distances and ETAs
+
+build_road_graph.py turns a road extract (GeoJSON LineStrings, e.g. exported
+from OpenStreetMap) into a directed road graph and preprocesses it into a
+contraction hierarchy: nodes are contracted one by one (least important
+first), adding a shortcut edge wherever a fastest route ran through the
+contracted node. A query then only needs a bidirectional Dijkstra search
+that climbs towards more important nodes from both ends, which settles a
+few hundred nodes even across a city. The file holds both upward graphs in
+compressed sparse row form:
+
+    header     <4sIII>  magic b"RTG1", nodes, up edges, down edges
+    latitude   nodes x f8
+    longitude  nodes x f8
+    up         (nodes + 1) x u4 offsets, then edges x u4 target, edges x
+               f4 length_m, edges x f4 seconds: edges from each node to
+               more important nodes
+    down       the same layout: edges into each node from more important
+               nodes (searched backwards from the destination)
+
+Shortcuts carry the summed length and travel time of the edges they
+replace. Points are snapped to their nearest node through a uniform grid
+built at load time.
+"""
+import heapq
+import logging
+import math
+import os
+import struct
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Optional
+import numpy as np
+from tracking.eta import DEFAULT_AVERAGE_SPEED_KMH, calculate_distance, set_road_graph
+
+logger = logging.getLogger(__name__)
+
+ROAD_GRAPH_MAGIC = b"RTG1"
+_HEADER = struct.Struct("<4sIII")
+
+# Snapping grid cell size (about 110 m of latitude)
+GRID_DEGREES = 0.001
+
+# Speeds for roads without a maxspeed tag, by OSM highway class
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 80.0,
+    "motorway_link": 50.0,
+    "trunk": 60.0,
+    "trunk_link": 40.0,
+    "primary": 45.0,
+    "primary_link": 35.0,
+    "secondary": 35.0,
+    "secondary_link": 30.0,
+    "tertiary": 30.0,
+    "tertiary_link": 25.0,
+    "unclassified": 25.0,
+    "residential": 20.0,
+    "living_street": 10.0,
+    "service": 10.0
+}
+DEFAULT_ROAD_SPEED_KMH = 25.0
+
+
+@dataclass
+class RoadRoute:
+    """Result of a routing query"""
+    distance_km: float
+    seconds: float
+    # Straight-line distance from the query points to their snapped nodes
+    snapped_km: float
+
+
+class _UpwardGraph:
+    """One direction of the hierarchy in CSR form"""
+
+    def __init__(self, offsets, targets, length_m, seconds):
+        self.offsets = np.asarray(offsets, dtype="<u4")
+        self.targets = np.asarray(targets, dtype="<u4")
+        self.length_m = np.asarray(length_m, dtype="<f4")
+        self.seconds = np.asarray(seconds, dtype="<f4")
+
+        # Searches index these per edge; stdlib arrays index much faster
+        # than NumPy arrays and stay compact
+        self._offsets = array("I", self.offsets.tobytes())
+        self._targets = array("I", self.targets.tobytes())
+        self._length_m = array("f", self.length_m.tobytes())
+        self._seconds = array("f", self.seconds.tobytes())
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def columns(self) -> tuple[np.ndarray, ...]:
+        return self.offsets, self.targets, self.length_m, self.seconds
+
+
+class RoadGraph:
+    """Contraction hierarchy over a road graph, with snapping and route queries"""
+
+    def __init__(
+        self,
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        up: tuple,
+        down: tuple,
+        max_snap_km: float = 1.0
+    ):
+        self.latitude = np.asarray(latitude, dtype="<f8")
+        self.longitude = np.asarray(longitude, dtype="<f8")
+        self.up = _UpwardGraph(*up)
+        self.down = _UpwardGraph(*down)
+        self.max_snap_km = max_snap_km
+
+        self._latitude = self.latitude.tolist()
+        self._longitude = self.longitude.tolist()
+        self._grid = self._build_grid()
+
+    @classmethod
+    def open(cls, path: str, max_snap_km: float = 1.0) -> "RoadGraph":
+        """Load a graph file"""
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            magic, nodes, up_edges, down_edges = _HEADER.unpack_from(data)
+        except struct.error:
+            raise ValueError(f"{path}: truncated road graph header")
+        if magic != ROAD_GRAPH_MAGIC:
+            raise ValueError(f"{path}: bad magic, expected RTG1")
+
+        sections = [("<f8", nodes), ("<f8", nodes)]
+        for edges in (up_edges, down_edges):
+            sections += [("<u4", nodes + 1), ("<u4", edges), ("<f4", edges), ("<f4", edges)]
+        offset = _HEADER.size
+        columns = []
+        for dtype, count in sections:
+            size = np.dtype(dtype).itemsize * count
+            if offset + size > len(data):
+                raise ValueError(f"{path}: truncated road graph")
+            columns.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset))
+            offset += size
+        return cls(columns[0], columns[1], columns[2:6], columns[6:10], max_snap_km=max_snap_km)
+
+    def write(self, path: str):
+        """Write the graph file (atomically, so running servers keep the old one)"""
+        header = _HEADER.pack(ROAD_GRAPH_MAGIC, self.nodes, len(self.up), len(self.down))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            for column in (self.latitude, self.longitude, *self.up.columns(), *self.down.columns()):
+                f.write(np.ascontiguousarray(column).tobytes())
+        os.replace(tmp_path, path)
+
+    @property
+    def nodes(self) -> int:
+        return len(self.latitude)
+
+    def _build_grid(self) -> dict[tuple[int, int], list[int]]:
+        grid: dict[tuple[int, int], list[int]] = {}
+        rows = np.floor(self.latitude / GRID_DEGREES).astype(np.int64).tolist()
+        cols = np.floor(self.longitude / GRID_DEGREES).astype(np.int64).tolist()
+        for node, cell in enumerate(zip(rows, cols)):
+            grid.setdefault(cell, []).append(node)
+        return grid
+
+    def nearest_node(self, latitude: float, longitude: float) -> Optional[tuple[int, float]]:
+        """
+        Snap a point to the graph
+
+        Returns:
+            (node, distance_km) of the nearest node within max_snap_km, or None
+        """
+        row = math.floor(latitude / GRID_DEGREES)
+        col = math.floor(longitude / GRID_DEGREES)
+        # Narrowest extent of a cell (longitude shrinks towards the poles)
+        cell_km = GRID_DEGREES * 111.195 * max(math.cos(math.radians(min(abs(latitude), 89.0))), 0.01)
+        max_ring = math.ceil(self.max_snap_km / cell_km) + 1
+
+        best, best_km = None, math.inf
+        for ring in range(max_ring + 1):
+            # Nodes from this ring outwards are at least ring - 1 cells away
+            if best_km <= (ring - 1) * cell_km:
+                break
+            for r in range(row - ring, row + ring + 1):
+                step = 1 if r in (row - ring, row + ring) else 2 * ring
+                for c in range(col - ring, col + ring + 1, max(step, 1)):
+                    for node in self._grid.get((r, c), ()):
+                        distance_km = calculate_distance(latitude, longitude, self._latitude[node], self._longitude[node])
+                        if distance_km < best_km:
+                            best, best_km = node, distance_km
+        if best is None or best_km > self.max_snap_km:
+            return None
+        return best, best_km
+
+    def shortest_path(self, source: int, target: int) -> Optional[tuple[float, float]]:
+        """
+        Fastest route between two nodes (bidirectional upward search)
+
+        Returns:
+            (length_m, seconds), or None if target is unreachable
+        """
+        if source == target:
+            return 0.0, 0.0
+
+        # The forward search climbs the up graph from source, the backward
+        # search the down graph from target; they meet at the route's most
+        # important node. Each side also reads the other graph to stall nodes.
+        forward = (self.up, self.down, {source: 0.0}, {source: 0.0}, [(0.0, source)])
+        backward = (self.down, self.up, {target: 0.0}, {target: 0.0}, [(0.0, target)])
+        best_seconds, best_length = math.inf, math.inf
+        while True:
+            # Advance the side with the nearer frontier; stop once neither
+            # frontier can improve on the best meeting found
+            forward_top = forward[4][0][0] if forward[4] else math.inf
+            backward_top = backward[4][0][0] if backward[4] else math.inf
+            if min(forward_top, backward_top) >= best_seconds:
+                break
+            side, other = (forward, backward) if forward_top <= backward_top else (backward, forward)
+            graph, opposite, times, lengths, heap = side
+
+            time_s, v = heapq.heappop(heap)
+            if time_s > times[v]:
+                continue
+            length_v = lengths[v]
+            other_time = other[2].get(v)
+            if other_time is not None and time_s + other_time < best_seconds:
+                best_seconds = time_s + other_time
+                best_length = length_v + other[3][v]
+
+            # Stall on demand: a more important node already reached gets
+            # to v faster, so no fastest route climbs on through v
+            offsets, targets, seconds = opposite._offsets, opposite._targets, opposite._seconds
+            stalled = False
+            for e in range(offsets[v], offsets[v + 1]):
+                time_u = times.get(targets[e])
+                if time_u is not None and time_u + seconds[e] < time_s:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+
+            offsets, targets, seconds, length_m = graph._offsets, graph._targets, graph._seconds, graph._length_m
+            for e in range(offsets[v], offsets[v + 1]):
+                w = targets[e]
+                candidate = time_s + seconds[e]
+                if candidate < times.get(w, math.inf):
+                    times[w] = candidate
+                    lengths[w] = length_v + length_m[e]
+                    heapq.heappush(heap, (candidate, w))
+
+        if best_seconds == math.inf:
+            return None
+        return best_length, best_seconds
+
+    def route(self, lat1: float, lon1: float, lat2: float, lon2: float) -> Optional[RoadRoute]:
+        """
+        Road distance and travel time between two points; the stretches to
+        and from the snapped nodes are counted in a straight line at
+        DEFAULT_AVERAGE_SPEED_KMH
+
+        Returns:
+            RoadRoute, or None if a point is off the graph or no route exists
+        """
+        start = self.nearest_node(lat1, lon1)
+        end = self.nearest_node(lat2, lon2)
+        if start is None or end is None:
+            return None
+        path = self.shortest_path(start[0], end[0])
+        if path is None:
+            return None
+        length_m, seconds = path
+        snapped_km = start[1] + end[1]
+        return RoadRoute(
+            distance_km=length_m / 1000 + snapped_km,
+            seconds=seconds + snapped_km / DEFAULT_AVERAGE_SPEED_KMH * 3600,
+            snapped_km=snapped_km
+        )
+
+
+def road_speed_kmh(properties: dict) -> float:
+    """Speed of an OSM way from its maxspeed tag or highway class"""
+    maxspeed = str(properties.get("maxspeed") or "").strip()
+    digits = maxspeed.split()[0] if maxspeed else ""
+    if digits.replace(".", "", 1).isdigit():
+        speed = float(digits)
+        return speed * 1.609344 if "mph" in maxspeed else speed
+    return HIGHWAY_SPEEDS_KMH.get(properties.get("highway"), DEFAULT_ROAD_SPEED_KMH)
+
+
+def road_direction(properties: dict) -> int:
+    """OSM oneway tag: 1 forward only, -1 backward only, 0 both ways"""
+    oneway = str(properties.get("oneway") or "").lower()
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway == "-1":
+        return -1
+    if properties.get("junction") == "roundabout" or properties.get("highway") == "motorway":
+        return 1
+    return 0
+
+
+def _csr(edges_by_node: list[dict]) -> tuple[np.ndarray, ...]:
+    """Flatten per-node {neighbor: (seconds, length_m)} dicts into CSR columns"""
+    counts = np.fromiter((len(edges) for edges in edges_by_node), np.int64, len(edges_by_node))
+    offsets = np.zeros(len(edges_by_node) + 1, dtype="<u4")
+    np.cumsum(counts, out=offsets[1:])
+    targets, length_m, seconds = [], [], []
+    for edges in edges_by_node:
+        for w, (edge_seconds, edge_length) in edges.items():
+            targets.append(w)
+            seconds.append(edge_seconds)
+            length_m.append(edge_length)
+    return (
+        offsets,
+        np.array(targets, dtype="<u4"),
+        np.array(length_m, dtype="<f4"),
+        np.array(seconds, dtype="<f4")
+    )
+
+
+class RoadGraphBuilder:
+    """Collects road polylines and contracts them into a RoadGraph"""
+
+    def __init__(self, coordinate_digits: int = 7, witness_settle_limit: int = 200):
+        self.coordinate_digits = coordinate_digits
+        # Witness searches give up after settling this many nodes; that only
+        # adds a shortcut that may not be needed (slower queries, same routes)
+        self.witness_settle_limit = witness_settle_limit
+        self._node_ids: dict[tuple[float, float], int] = {}
+        self.latitude: list[float] = []
+        self.longitude: list[float] = []
+        # (source, target, length_m, seconds)
+        self.edges: list[tuple[int, int, float, float]] = []
+
+    def add_node(self, latitude: float, longitude: float) -> int:
+        """Node id of a coordinate (shared by roads meeting there)"""
+        key = (round(latitude, self.coordinate_digits), round(longitude, self.coordinate_digits))
+        node = self._node_ids.get(key)
+        if node is None:
+            node = self._node_ids[key] = len(self.latitude)
+            self.latitude.append(latitude)
+            self.longitude.append(longitude)
+        return node
+
+    def add_road(self, points: Iterable[tuple[float, float]], speed_kmh: float, direction: int = 0) -> int:
+        """
+        Add a road through (latitude, longitude) points
+
+        Returns:
+            Number of edges added
+        """
+        added = 0
+        previous = None
+        for latitude, longitude in points:
+            node = self.add_node(latitude, longitude)
+            if previous is not None and node != previous:
+                length_m = calculate_distance(
+                    self.latitude[previous], self.longitude[previous], latitude, longitude
+                ) * 1000
+                seconds = length_m / (speed_kmh / 3.6)
+                if direction >= 0:
+                    self.edges.append((previous, node, length_m, seconds))
+                    added += 1
+                if direction <= 0:
+                    self.edges.append((node, previous, length_m, seconds))
+                    added += 1
+            previous = node
+        return added
+
+    def add_geojson(self, geojson: dict) -> int:
+        """
+        Add the LineString / MultiLineString features of a GeoJSON road
+        extract (OSM highway, maxspeed, oneway and junction properties)
+
+        Returns:
+            Number of edges added
+        """
+        added = 0
+        for feature in geojson.get("features", []):
+            geometry = feature.get("geometry") or {}
+            properties = feature.get("properties") or {}
+            if geometry.get("type") == "LineString":
+                lines = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiLineString":
+                lines = geometry["coordinates"]
+            else:
+                continue
+            speed_kmh = road_speed_kmh(properties)
+            direction = road_direction(properties)
+            for line in lines:
+                # GeoJSON positions are [longitude, latitude]
+                added += self.add_road(((lat, lon) for lon, lat, *_ in line), speed_kmh, direction)
+        return added
+
+    def build(self) -> RoadGraph:
+        """Contract the graph into a hierarchy"""
+        nodes = len(self.latitude)
+        # Remaining graph as per-node {neighbor: (seconds, length_m)},
+        # keeping the faster of parallel edges
+        outgoing: list[dict] = [{} for _ in range(nodes)]
+        incoming: list[dict] = [{} for _ in range(nodes)]
+        for u, w, length_m, seconds in self.edges:
+            if seconds < outgoing[u].get(w, (math.inf,))[0]:
+                outgoing[u][w] = incoming[w][u] = (seconds, length_m)
+
+        up: list[dict] = [{} for _ in range(nodes)]
+        down: list[dict] = [{} for _ in range(nodes)]
+        contracted_neighbors = [0] * nodes
+
+        def priority(v: int, shortcuts: list) -> int:
+            # Edge difference, plus contracted neighbors to spread
+            # contraction evenly over the map
+            return len(shortcuts) - len(outgoing[v]) - len(incoming[v]) + contracted_neighbors[v]
+
+        queue = [(priority(v, self._shortcuts(v, outgoing, incoming)), v) for v in range(nodes)]
+        heapq.heapify(queue)
+        while queue:
+            _, v = heapq.heappop(queue)
+            # Lazy update: contract v only while it is still the least important
+            shortcuts = self._shortcuts(v, outgoing, incoming)
+            current = priority(v, shortcuts)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+
+            # Every remaining neighbor ends up more important than v
+            up[v], down[v] = outgoing[v], incoming[v]
+            for w in outgoing[v]:
+                del incoming[w][v]
+                contracted_neighbors[w] += 1
+            for u in incoming[v]:
+                del outgoing[u][v]
+                contracted_neighbors[u] += 1
+            outgoing[v], incoming[v] = {}, {}
+            for u, w, seconds, length_m in shortcuts:
+                if seconds < outgoing[u].get(w, (math.inf,))[0]:
+                    outgoing[u][w] = incoming[w][u] = (seconds, length_m)
+
+        return RoadGraph(self.latitude, self.longitude, _csr(up), _csr(down))
+
+    def _shortcuts(self, v: int, outgoing: list[dict], incoming: list[dict]) -> list[tuple]:
+        """Shortcuts (u, w, seconds, length_m) needed to contract v"""
+        shortcuts = []
+        if not outgoing[v]:
+            return shortcuts
+        max_seconds_vw = max(seconds for seconds, _ in outgoing[v].values())
+        for u, (seconds_uv, length_uv) in incoming[v].items():
+            witness = self._witness_times(u, v, seconds_uv + max_seconds_vw, outgoing)
+            for w, (seconds_vw, length_vw) in outgoing[v].items():
+                if w != u and witness.get(w, math.inf) > seconds_uv + seconds_vw:
+                    shortcuts.append((u, w, seconds_uv + seconds_vw, length_uv + length_vw))
+        return shortcuts
+
+    def _witness_times(self, source: int, excluded: int, limit: float, outgoing: list[dict]) -> dict:
+        """Travel times from source avoiding excluded, up to limit"""
+        times = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and settled < self.witness_settle_limit:
+            time_s, v = heapq.heappop(heap)
+            if time_s > times[v]:
+                continue
+            if time_s > limit:
+                break
+            settled += 1
+            for w, (seconds, _) in outgoing[v].items():
+                if w == excluded:
+                    continue
+                candidate = time_s + seconds
+                if candidate < times.get(w, math.inf):
+                    times[w] = candidate
+                    heapq.heappush(heap, (candidate, w))
+        return times
+
+
+# Road graph configuration (no path: straight-line distances)
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "")
+ROAD_GRAPH_MAX_SNAP_KM = float(os.getenv("ROAD_GRAPH_MAX_SNAP_KM", "1"))
+
+
+def load_road_graph(path: str = ROAD_GRAPH_PATH) -> Optional[RoadGraph]:
+    """Load the road graph file and use it for ETA distances, if it exists"""
+    try:
+        graph = RoadGraph.open(path, max_snap_km=ROAD_GRAPH_MAX_SNAP_KM)
+    except FileNotFoundError:
+        logger.warning(f"Road graph {path} not found; ETAs use straight-line distances")
+        graph = None
+    except ValueError as e:
+        logger.error(f"Could not load road graph: {e}")
+        graph = None
+    set_road_graph(graph)
+    return graph
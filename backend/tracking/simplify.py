@@ -0,0 +1,127 @@
+"""
+Route polyline simplification and encoding for history reads
+
+Ramer-Douglas-Peucker runs on a local metric projection of the route; each
+split step measures all points of a segment against its chord in one NumPy
+operation. Encoded output uses the Google polyline algorithm.
+"""
+import math
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+# Web Mercator ground resolution at the equator, zoom 0 (meters per pixel)
+_METERS_PER_PIXEL_Z0 = 156543.03392
+
+
+def zoom_tolerance_meters(zoom: int, latitude: float) -> float:
+    """Ground size of one map pixel at a zoom level and latitude"""
+    return _METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+
+def _project(latitudes: np.ndarray, longitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Sinusoidal projection around the first point, in meters"""
+    lat = np.radians(latitudes)
+    x = np.radians(longitudes - longitudes[0]) * np.cos(lat) * EARTH_RADIUS_M
+    y = lat * EARTH_RADIUS_M
+    return x, y
+
+
+def rdp_mask(latitudes, longitudes, tolerance_m: float) -> np.ndarray:
+    """
+    Ramer-Douglas-Peucker simplification
+
+    Args:
+        latitudes, longitudes: Route points in order
+        tolerance_m: Maximum distance (meters) of a dropped point from the
+            simplified line
+
+    Returns:
+        Boolean mask of the points to keep (always keeps the endpoints)
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    n = len(latitudes)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if n < 3 or tolerance_m <= 0:
+        keep[:] = True
+        return keep
+
+    x, y = _project(latitudes, longitudes)
+
+    # Explicit stack instead of recursion: long routes would hit the recursion limit
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        px = x[start + 1:end] - x[start]
+        py = y[start + 1:end] - y[start]
+        ex = x[end] - x[start]
+        ey = y[end] - y[start]
+        length_sq = ex * ex + ey * ey
+        if length_sq == 0:
+            distances_sq = px * px + py * py
+        else:
+            t = np.clip((px * ex + py * ey) / length_sq, 0.0, 1.0)
+            dx = px - t * ex
+            dy = py - t * ey
+            distances_sq = dx * dx + dy * dy
+
+        farthest = int(np.argmax(distances_sq))
+        if distances_sq[farthest] > tolerance_m * tolerance_m:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def encode_polyline(latitudes, longitudes, precision: int = 5) -> str:
+    """Encode a route with the Google encoded polyline algorithm"""
+    factor = 10 ** precision
+    lat = np.round(np.asarray(latitudes, dtype=np.float64) * factor).astype(np.int64)
+    lon = np.round(np.asarray(longitudes, dtype=np.float64) * factor).astype(np.int64)
+    if len(lat) == 0:
+        return ""
+
+    # Interleaved per-point deltas (lat, lon), zigzag encoded
+    deltas = np.empty(2 * len(lat), dtype=np.int64)
+    deltas[0::2] = np.diff(lat, prepend=0)
+    deltas[1::2] = np.diff(lon, prepend=0)
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chars = []
+    for value in values.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+
+def decode_polyline(polyline: str, precision: int = 5) -> list[tuple[float, float]]:
+    """Decode a Google encoded polyline into (latitude, longitude) pairs"""
+    factor = 10 ** precision
+    coordinates = []
+    index = lat = lon = 0
+    while index < len(polyline):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(polyline[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coordinates.append((lat / factor, lon / factor))
+    return coordinates
@@ -0,0 +1,145 @@
+"""
+Observed package speed for speed-aware ETAs (ETA_MODE=speed)
+
+Each ingested point closes a segment from the package's previous point; the
+segment speed feeds an exponentially weighted moving average whose weight
+(alpha = 2 / (N + 1)) roughly averages the last N segments. Only the last
+point and the running average are kept per package, in memory, so no
+history query is needed per ping. A package seen for the first time (e.g.
+after a restart) is seeded once from its most recent stored points.
+"""
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from tracking.eta import calculate_distance
+
+
+@dataclass
+class _SpeedState:
+    latitude: float
+    longitude: float
+    epoch: float
+    speed_kmh: float = 0.0
+    segments: int = 0
+
+
+def _epoch_seconds(ts: datetime) -> float:
+    """Seconds since epoch; naive datetimes are treated as UTC"""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class SpeedEstimator:
+    """Per-package EWMA of segment speeds"""
+
+    def __init__(
+        self,
+        window_segments: int = 10,
+        min_segments: int = 3,
+        min_segment_seconds: float = 10.0,
+        max_speed_kmh: float = 150.0,
+        min_speed_kmh: float = 5.0,
+        max_packages: int = 10000
+    ):
+        self.alpha = 2.0 / (window_segments + 1)
+        self.window_segments = window_segments
+        self.min_segments = min_segments
+        self.min_segment_seconds = min_segment_seconds
+        self.max_speed_kmh = max_speed_kmh
+        self.min_speed_kmh = min_speed_kmh
+        self.max_packages = max_packages
+
+        self._state: OrderedDict[str, _SpeedState] = OrderedDict()
+
+        # Counters
+        self.segments = 0
+        self.rejected = 0
+        self.estimates = 0
+        self.fallbacks = 0
+
+    def tracks(self, key: str) -> bool:
+        """Whether there is state for a package (seed it otherwise)"""
+        return key in self._state
+
+    def observe(self, key: str, latitude: float, longitude: float, timestamp: datetime):
+        """Feed a package's point (in time order)"""
+        epoch = _epoch_seconds(timestamp)
+        state = self._state.get(key)
+        if state is None:
+            self._state[key] = _SpeedState(latitude, longitude, epoch)
+            if len(self._state) > self.max_packages:
+                self._state.popitem(last=False)
+            return
+        self._state.move_to_end(key)
+
+        elapsed = epoch - state.epoch
+        # Out of order or retried points; very short segments are extended
+        # by the next point instead (GPS jitter dominates them)
+        if elapsed < self.min_segment_seconds:
+            return
+
+        speed = calculate_distance(state.latitude, state.longitude, latitude, longitude) / elapsed * 3600
+        state.latitude, state.longitude, state.epoch = latitude, longitude, epoch
+        if speed > self.max_speed_kmh:
+            # GPS jump: restart the segment from here without averaging it
+            self.rejected += 1
+            return
+
+        if state.segments == 0:
+            state.speed_kmh = speed
+        else:
+            state.speed_kmh += self.alpha * (speed - state.speed_kmh)
+        state.segments += 1
+        self.segments += 1
+
+    def seed(self, key: str, points: Iterable[dict]):
+        """Start a package's state from stored points, oldest first"""
+        self._state.pop(key, None)
+        for point in points:
+            self.observe(key, point["latitude"], point["longitude"], point["timestamp"])
+
+    def speed_kmh(self, key: str) -> Optional[float]:
+        """
+        Current speed estimate of a package
+
+        Returns:
+            Speed in km/h (at least min_speed_kmh, so a parked courier does
+            not get an unbounded ETA), or None with fewer than min_segments
+            observed segments
+        """
+        state = self._state.get(key)
+        if state is None or state.segments < self.min_segments:
+            self.fallbacks += 1
+            return None
+        self.estimates += 1
+        return max(state.speed_kmh, self.min_speed_kmh)
+
+    def forget(self, key: str):
+        """Drop state for a package (e.g. once delivered)"""
+        self._state.pop(key, None)
+
+    def get_stats(self) -> dict:
+        """Return estimator counters"""
+        total = self.estimates + self.fallbacks
+        return {
+            "tracked_packages": len(self._state),
+            "segments": self.segments,
+            "rejected_segments": self.rejected,
+            "estimates": self.estimates,
+            "fallbacks": self.fallbacks,
+            "estimate_ratio": self.estimates / total if total else 0.0
+        }
+
+
+# Global estimator instance
+speed_estimator = SpeedEstimator(
+    window_segments=int(os.getenv("ETA_SPEED_WINDOW_SEGMENTS", "10")),
+    min_segments=int(os.getenv("ETA_SPEED_MIN_SEGMENTS", "3")),
+    min_segment_seconds=float(os.getenv("ETA_SPEED_MIN_SEGMENT_S", "10")),
+    max_speed_kmh=float(os.getenv("ETA_SPEED_MAX_KMH", "150")),
+    min_speed_kmh=float(os.getenv("ETA_SPEED_MIN_KMH", "5")),
+    max_packages=int(os.getenv("ETA_SPEED_MAX_PACKAGES", "10000"))
+)
@@ -0,0 +1,272 @@
+"""
+Historical travel-speed table by geohash cell and hour of week
+
+build_speed_table.py aggregates delivered packages' tracks into per
+(geohash cell, hour-of-week) totals of distance, time and segment count, and
+writes them as an open-addressing hash table in a flat file:
+
+    header  <4sIIQd4x>  magic b"SPD1", geohash precision, capacity (a power
+                        of two), entries, built_until (Unix seconds of the
+                        newest delivery included)
+    slots   capacity x <u8 key, f8 distance_km, f8 seconds, u4 segments>
+            key = ((cell << 8) | hour_of_week) + 1, 0 marks an empty slot
+
+The server memory-maps the file (ETA_MODE=historical), so only the pages
+touched by lookups are read; a lookup is a multiplicative hash and a short
+linear probe. Hours of week are in UTC (Monday 00:00 = 0), which bins rush
+hours consistently as long as the fleet stays in one time zone.
+"""
+import logging
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+import numpy as np
+from tracking.eta import calculate_distance
+
+logger = logging.getLogger(__name__)
+
+SPEED_TABLE_MAGIC = b"SPD1"
+_HEADER = struct.Struct("<4sIIQd4x")
+
+SLOT_DTYPE = np.dtype([
+    ("key", "<u8"),
+    ("distance_km", "<f8"),
+    ("seconds", "<f8"),
+    ("segments", "<u4")
+])
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_cell(latitude: float, longitude: float, precision: int) -> int:
+    """Geohash of a point as an integer of 5 * precision bits"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lon_q = min(int((longitude + 180.0) / 360.0 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    lat_q = min(int((latitude + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+
+    # Interleave, longitude first (most significant bit)
+    cell = 0
+    for i in range(bits):
+        if i % 2 == 0:
+            bit = (lon_q >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_q >> (lat_bits - 1 - i // 2)) & 1
+        cell = (cell << 1) | bit
+    return cell
+
+
+def geohash_string(cell: int, precision: int) -> str:
+    """Base32 text form of geohash_cell()"""
+    return "".join(
+        _BASE32[(cell >> (5 * (precision - 1 - i))) & 0x1F] for i in range(precision)
+    )
+
+
+def hour_of_week(ts: datetime) -> int:
+    """Hour of the week (UTC), Monday 00:00 = 0; naive datetimes are UTC"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.weekday() * 24 + ts.hour
+
+
+def _slot(key: int, bits: int) -> int:
+    return ((key * _GOLDEN) & _MASK64) >> (64 - bits)
+
+
+class SpeedTable:
+    """Read-only (usually memory-mapped) speed table"""
+
+    def __init__(self, slots: np.ndarray, precision: int, built_until: Optional[datetime] = None, min_segments: int = 3):
+        self.slots = slots
+        self.precision = precision
+        self.built_until = built_until
+        self.min_segments = min_segments
+
+        self._keys = slots["key"]
+        self._bits = max(1, len(slots).bit_length() - 1)
+        self._mask = len(slots) - 1
+        self.entries = int(np.count_nonzero(self._keys))
+
+    @classmethod
+    def open(cls, path: str, min_segments: int = 3) -> "SpeedTable":
+        """Memory-map a table file"""
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+        try:
+            magic, precision, capacity, _, built_until = _HEADER.unpack(header)
+        except struct.error:
+            raise ValueError(f"{path}: truncated speed table header")
+        if magic != SPEED_TABLE_MAGIC:
+            raise ValueError(f"{path}: bad magic, expected SPD1")
+        slots = np.memmap(path, dtype=SLOT_DTYPE, mode="r", offset=_HEADER.size, shape=(capacity,))
+        return cls(
+            slots,
+            precision,
+            datetime.utcfromtimestamp(built_until) if built_until else None,
+            min_segments=min_segments
+        )
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def find(self, cell: int, hour: int) -> int:
+        """Slot index of a (cell, hour of week) entry, or -1"""
+        key = ((cell << 8) | hour) + 1
+        i = _slot(key, self._bits)
+        keys = self._keys
+        while True:
+            found = int(keys[i])
+            if found == key:
+                return i
+            if found == 0:
+                return -1
+            i = (i + 1) & self._mask
+
+    def speed_kmh(self, latitude: float, longitude: float, ts: datetime) -> Optional[float]:
+        """
+        Historical average speed at a place and time of week
+
+        Returns:
+            km/h, or None when fewer than min_segments segments were seen there
+        """
+        i = self.find(geohash_cell(latitude, longitude, self.precision), hour_of_week(ts))
+        if i < 0:
+            return None
+        slot = self.slots[i]
+        if slot["segments"] < self.min_segments or slot["seconds"] <= 0:
+            return None
+        return float(slot["distance_km"]) / float(slot["seconds"]) * 3600
+
+    def items(self) -> Iterable[tuple[int, int, float, float, int]]:
+        """(cell, hour_of_week, distance_km, seconds, segments) of every entry"""
+        for i in np.flatnonzero(self._keys):
+            slot = self.slots[i]
+            key = int(slot["key"]) - 1
+            yield key >> 8, key & 0xFF, float(slot["distance_km"]), float(slot["seconds"]), int(slot["segments"])
+
+
+class SpeedTableBuilder:
+    """Accumulates track segments into (cell, hour of week) totals"""
+
+    def __init__(
+        self,
+        precision: int = 5,
+        min_segment_seconds: float = 10.0,
+        max_segment_seconds: float = 600.0,
+        max_speed_kmh: float = 150.0
+    ):
+        self.precision = precision
+        self.min_segment_seconds = min_segment_seconds
+        self.max_segment_seconds = max_segment_seconds
+        self.max_speed_kmh = max_speed_kmh
+        self.built_until: Optional[datetime] = None
+
+        # (cell, hour) -> [distance_km, seconds, segments]
+        self.totals: dict[tuple[int, int], list] = {}
+
+    @classmethod
+    def from_table(cls, table: SpeedTable, **kwargs) -> "SpeedTableBuilder":
+        """Start from an existing table's totals (incremental rebuild)"""
+        builder = cls(precision=table.precision, **kwargs)
+        builder.built_until = table.built_until
+        for cell, hour, distance_km, seconds, segments in table.items():
+            builder.totals[(cell, hour)] = [distance_km, seconds, segments]
+        return builder
+
+    def add_track(self, points: Iterable[dict]) -> int:
+        """
+        Add a package's track (points in time order); each segment counts
+        towards the cell and hour of its start point
+
+        Returns:
+            Number of segments added
+        """
+        added = 0
+        previous = None
+        for point in points:
+            if previous is not None:
+                seconds = (point["timestamp"] - previous["timestamp"]).total_seconds()
+                # Very short segments are extended by the next point; data
+                # gaps and GPS jumps are skipped
+                if seconds < self.min_segment_seconds:
+                    continue
+                if seconds <= self.max_segment_seconds:
+                    distance_km = calculate_distance(
+                        previous["latitude"], previous["longitude"],
+                        point["latitude"], point["longitude"]
+                    )
+                    if distance_km / seconds * 3600 <= self.max_speed_kmh:
+                        key = (
+                            geohash_cell(previous["latitude"], previous["longitude"], self.precision),
+                            hour_of_week(previous["timestamp"])
+                        )
+                        totals = self.totals.setdefault(key, [0.0, 0.0, 0])
+                        totals[0] += distance_km
+                        totals[1] += seconds
+                        totals[2] += 1
+                        added += 1
+            previous = point
+        return added
+
+    def build(self) -> np.ndarray:
+        """Lay the totals out as hash table slots (load factor <= 0.5)"""
+        capacity = 16
+        while capacity < 2 * len(self.totals):
+            capacity *= 2
+        bits = capacity.bit_length() - 1
+
+        slots = np.zeros(capacity, dtype=SLOT_DTYPE)
+        keys = slots["key"]
+        for (cell, hour), (distance_km, seconds, segments) in self.totals.items():
+            key = ((cell << 8) | hour) + 1
+            i = _slot(key, bits)
+            while keys[i] != 0:
+                i = (i + 1) & (capacity - 1)
+            slots[i] = (key, distance_km, seconds, segments)
+        return slots
+
+    def write(self, path: str):
+        """Write the table file (atomically, so servers mapping the old file keep it)"""
+        slots = self.build()
+        built_until = self.built_until.replace(tzinfo=timezone.utc).timestamp() if self.built_until else 0.0
+        header = _HEADER.pack(SPEED_TABLE_MAGIC, self.precision, len(slots), len(self.totals), built_until)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(slots.tobytes())
+        os.replace(tmp_path, path)
+
+
+# Speed table configuration
+SPEED_TABLE_PATH = os.getenv("SPEED_TABLE_PATH", "speed_table.bin")
+SPEED_TABLE_PRECISION = int(os.getenv("SPEED_TABLE_PRECISION", "5"))
+SPEED_TABLE_MIN_SEGMENTS = int(os.getenv("SPEED_TABLE_MIN_SEGMENTS", "3"))
+
+# Global table instance, loaded at startup (ETA_MODE=historical)
+speed_table: Optional[SpeedTable] = None
+
+
+def get_speed_table() -> Optional[SpeedTable]:
+    """The loaded speed table, or None"""
+    return speed_table
+
+
+def load_speed_table(path: str = SPEED_TABLE_PATH) -> Optional[SpeedTable]:
+    """Memory-map the speed table file into the global instance, if it exists"""
+    global speed_table
+    try:
+        speed_table = SpeedTable.open(path, min_segments=SPEED_TABLE_MIN_SEGMENTS)
+    except FileNotFoundError:
+        logger.warning(f"Speed table {path} not found; ETAs use the constant speed")
+        speed_table = None
+    except ValueError as e:
+        logger.error(f"Could not load speed table: {e}")
+        speed_table = None
+    return speed_table
@@ -0,0 +1,391 @@
+"""
+Storage layouts for location history
+
+- "documents" (default): one document per GPS fix in location_updates
+- "buckets": points are appended with $push into per-package, per-hour bucket
+  documents in location_buckets (at most LOCATION_BUCKET_SIZE points each),
+  which removes the per-point document overhead and lets a route be read
+  with a handful of documents
+
+Route handlers read and write location points only through this module, so
+they work the same against either layout. Points are always returned as
+plain dicts shaped like location_updates documents.
+
+Delivered packages may have their track moved to the cold archive tier
+(tracking.archive); the read functions merge it back in when called with
+archived=True.
+"""
+import base64
+import binascii
+import heapq
+import os
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from tracking.archive import load_archive
+
+LOCATIONS_COLLECTION = "location_updates"
+BUCKETS_COLLECTION = "location_buckets"
+
+LOCATION_STORAGE_MODE = os.getenv("LOCATION_STORAGE_MODE", "documents").lower()
+LOCATION_BUCKET_SIZE = int(os.getenv("LOCATION_BUCKET_SIZE", "200"))
+
+# Point fields stored inside a bucket's points array. idempotency_key is
+# not kept (a unique index cannot dedupe within one bucket's array), so
+# with buckets retries are only deduplicated by the in-memory cache.
+POINT_FIELDS = ("_id", "latitude", "longitude", "timestamp", "created_at")
+
+
+def use_buckets() -> bool:
+    """Whether the bucketed layout is configured"""
+    return LOCATION_STORAGE_MODE == "buckets"
+
+
+def bucket_hour(ts: datetime) -> datetime:
+    """Start of the hour a point's bucket covers"""
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def bucket_update(location_doc: dict, bucket_size: int = LOCATION_BUCKET_SIZE) -> tuple[dict, dict]:
+    """
+    Build the (filter, update) upsert that appends one point to its
+    package/hour bucket
+
+    The count filter makes a full bucket stop matching, so the upsert
+    starts a new bucket for the same hour.
+    """
+    timestamp = location_doc["timestamp"]
+    point = {field: location_doc[field] for field in POINT_FIELDS}
+    return (
+        {
+            "package_id": location_doc["package_id"],
+            "hour": bucket_hour(timestamp),
+            "count": {"$lt": bucket_size}
+        },
+        {
+            "$push": {"points": point},
+            "$inc": {"count": 1},
+            "$min": {"min_timestamp": timestamp},
+            "$max": {"max_timestamp": timestamp}
+        }
+    )
+
+
+def unpack_bucket(bucket: dict) -> list[dict]:
+    """Expand a bucket into location_updates-shaped documents"""
+    package_id = bucket["package_id"]
+    return [{**point, "package_id": package_id} for point in bucket.get("points", [])]
+
+
+async def insert_locations(db, location_docs: list[dict]):
+    """
+    Store location documents in the configured layout
+
+    Documents without an _id get one assigned. Multi-document inserts are
+    unordered, so a duplicate idempotency key only rejects its own point
+    (raised as BulkWriteError after the rest are written).
+    """
+    if not location_docs:
+        return
+    if use_buckets():
+        for location_doc in location_docs:
+            location_doc.setdefault("_id", ObjectId())
+        await db[BUCKETS_COLLECTION].bulk_write(
+            [UpdateOne(*bucket_update(location_doc), upsert=True) for location_doc in location_docs],
+            ordered=True
+        )
+    elif len(location_docs) == 1:
+        await db[LOCATIONS_COLLECTION].insert_one(location_docs[0])
+    else:
+        await db[LOCATIONS_COLLECTION].insert_many(location_docs, ordered=False)
+
+
+async def update_location_point(db, package_id, point_id, fields: dict):
+    """
+    Update fields of one stored point in place
+
+    In the buckets layout a new timestamp widens the bucket's min/max
+    timestamps, and a point whose new timestamp falls in another hour is
+    moved to a bucket of that hour.
+    """
+    if use_buckets():
+        collection = db[BUCKETS_COLLECTION]
+        point_filter = {"package_id": package_id, "points._id": point_id}
+        update = {"$set": {f"points.$.{key}": value for key, value in fields.items()}}
+        timestamp = fields.get("timestamp")
+        if timestamp is None:
+            await collection.update_one(point_filter, update)
+            return
+        update["$min"] = {"min_timestamp": timestamp}
+        update["$max"] = {"max_timestamp": timestamp}
+        result = await collection.update_one({**point_filter, "hour": bucket_hour(timestamp)}, update)
+        if result.matched_count:
+            return
+        # Hour changed: take the point out of its bucket and append the
+        # updated point to the new hour's bucket
+        bucket = await collection.find_one_and_update(
+            point_filter,
+            {"$pull": {"points": {"_id": point_id}}, "$inc": {"count": -1}},
+            projection={"points": {"$elemMatch": {"_id": point_id}}}
+        )
+        if bucket is None or not bucket.get("points"):
+            return
+        point = {**bucket["points"][0], **fields, "package_id": package_id}
+        await collection.update_one(*bucket_update(point), upsert=True)
+    else:
+        await db[LOCATIONS_COLLECTION].update_one({"_id": point_id}, {"$set": fields})
+
+
+def encode_history_cursor(location: dict) -> str:
+    """Opaque route history cursor pointing after a point"""
+    raw = f"{location['timestamp'].isoformat()}|{location['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    """
+    Decode a cursor from encode_history_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, point_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), ObjectId(point_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _in_window(location: dict, since, until, after) -> bool:
+    timestamp = location["timestamp"]
+    if since is not None and timestamp < since:
+        return False
+    if until is not None and timestamp >= until:
+        return False
+    if after is not None and (timestamp, location["_id"]) <= after:
+        return False
+    return True
+
+
+def _route_queries(package_id, since, until, after) -> tuple[dict, dict]:
+    """Build the (documents, buckets) queries for a route window"""
+    # Earliest timestamp that can still match
+    lower = since
+    if after is not None and (lower is None or after[0] > lower):
+        lower = after[0]
+
+    query = {"package_id": package_id}
+    timestamps = {}
+    if lower is not None:
+        timestamps["$gte"] = lower
+    if until is not None:
+        timestamps["$lt"] = until
+    if timestamps:
+        query["timestamp"] = timestamps
+    if after is not None:
+        # Keyset tie-break on _id within the cursor's timestamp
+        query["$or"] = [
+            {"timestamp": {"$gt": after[0]}},
+            {"timestamp": after[0], "_id": {"$gt": after[1]}}
+        ]
+
+    bucket_query = {"package_id": package_id}
+    hours = {}
+    if lower is not None:
+        hours["$gte"] = bucket_hour(lower)
+    if until is not None:
+        hours["$lt"] = until
+    if hours:
+        bucket_query["hour"] = hours
+    return query, bucket_query
+
+
+def _merge_points(archived: list[dict], hot: list[dict]) -> list[dict]:
+    """
+    Merge archived and hot points in (timestamp, _id) order, dropping
+    duplicates (points an interrupted archive run copied but did not delete)
+    """
+    merged = []
+    for location in heapq.merge(archived, hot, key=lambda loc: (loc["timestamp"], loc["_id"])):
+        if merged and merged[-1]["_id"] == location["_id"]:
+            continue
+        merged.append(location)
+    return merged
+
+
+async def get_route_locations(
+    db,
+    package_id,
+    limit: int = 1000,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[tuple[datetime, ObjectId]] = None,
+    archived: bool = False
+) -> list[dict]:
+    """
+    Get up to `limit` points of a package in (timestamp, _id) order
+
+    Args:
+        since: Only points at or after this time
+        until: Only points before this time
+        after: Keyset position (timestamp, _id); only points after it
+        archived: The package has an archived track (packages.archived_at)
+    """
+    if archived:
+        route = await load_archive(db, package_id)
+        locations = await get_route_locations(db, package_id, limit, since, until, after)
+        if route is None:
+            return locations
+        start, end = route.window(since, until, after)
+        return _merge_points(route.documents(start, min(end, start + limit)), locations)[:limit]
+
+    query, bucket_query = _route_queries(package_id, since, until, after)
+
+    if use_buckets():
+        cursor = db[BUCKETS_COLLECTION].find(bucket_query).sort("hour", 1)
+        locations = []
+        last_hour = None
+        async for bucket in cursor:
+            # Later hours only hold later points, so stop once the hour that
+            # filled the limit has been read completely
+            if len(locations) >= limit and bucket["hour"] != last_hour:
+                break
+            locations.extend(
+                loc for loc in unpack_bucket(bucket) if _in_window(loc, since, until, after)
+            )
+            last_hour = bucket["hour"]
+        locations.sort(key=lambda loc: (loc["timestamp"], loc["_id"]))
+        return locations[:limit]
+
+    cursor = db[LOCATIONS_COLLECTION].find(query).sort([("timestamp", 1), ("_id", 1)]).limit(limit)
+    return await cursor.to_list(length=limit)
+
+
+async def iter_route_locations(
+    db,
+    package_id,
+    batch_size: int = 1000,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[tuple[datetime, ObjectId]] = None,
+    archived: bool = False
+) -> AsyncIterator[list[dict]]:
+    """
+    Yield all points of a package in (timestamp, _id) order, a batch at a time
+
+    Only one batch (or, in the buckets layout, one hour of points) is held
+    in memory, however long the route is; an archived track is held in its
+    compact decoded form.
+    """
+    if archived:
+        route = await load_archive(db, package_id)
+        start, end = route.window(since, until, after) if route is not None else (0, 0)
+        async for batch in iter_route_locations(db, package_id, batch_size, since, until, after):
+            if start < end:
+                # Archived points up to the end of this batch go in with it
+                last = batch[-1]
+                split = min(end, max(start, route.window(after=(last["timestamp"], last["_id"]))[0]))
+                batch = _merge_points(route.documents(start, split), batch)
+                start = split
+            yield batch
+        for i in range(start, end, batch_size):
+            yield route.documents(i, min(end, i + batch_size))
+        return
+
+    query, bucket_query = _route_queries(package_id, since, until, after)
+
+    if use_buckets():
+        bucket_batch_size = max(1, batch_size // LOCATION_BUCKET_SIZE)
+        cursor = db[BUCKETS_COLLECTION].find(bucket_query).sort("hour", 1).batch_size(bucket_batch_size)
+        hour_points = []
+        last_hour = None
+        async for bucket in cursor:
+            # A full hour can span several buckets; order it once complete
+            if bucket["hour"] != last_hour and hour_points:
+                hour_points.sort(key=lambda loc: (loc["timestamp"], loc["_id"]))
+                yield hour_points
+                hour_points = []
+            hour_points.extend(
+                loc for loc in unpack_bucket(bucket) if _in_window(loc, since, until, after)
+            )
+            last_hour = bucket["hour"]
+        if hour_points:
+            hour_points.sort(key=lambda loc: (loc["timestamp"], loc["_id"]))
+            yield hour_points
+        return
+
+    cursor = db[LOCATIONS_COLLECTION].find(query).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+    while True:
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            return
+        yield batch
+
+
+async def get_recent_locations(db, package_id, limit: int) -> list[dict]:
+    """Get the `limit` most recent points of a package, oldest first"""
+    if use_buckets():
+        cursor = db[BUCKETS_COLLECTION].find({"package_id": package_id}).sort([("hour", -1), ("max_timestamp", -1)])
+        locations = []
+        last_hour = None
+        async for bucket in cursor:
+            # Earlier hours only hold earlier points
+            if len(locations) >= limit and bucket["hour"] != last_hour:
+                break
+            locations.extend(unpack_bucket(bucket))
+            last_hour = bucket["hour"]
+        locations.sort(key=lambda loc: (loc["timestamp"], loc["_id"]))
+        return locations[-limit:]
+
+    cursor = db[LOCATIONS_COLLECTION].find({"package_id": package_id}).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
+    locations = await cursor.to_list(length=limit)
+    locations.reverse()
+    return locations
+
+
+async def get_latest_locations(db, package_ids: list) -> dict:
+    """
+    Get the most recent point of many packages with one aggregation
+
+    Returns:
+        package_id -> point, for packages that have points
+    """
+    if use_buckets():
+        # Newest bucket per package (descending walk of the bucket index)
+        pipeline = [
+            {"$match": {"package_id": {"$in": package_ids}}},
+            {"$sort": {"package_id": -1, "hour": -1, "max_timestamp": -1}},
+            {"$group": {"_id": "$package_id", "bucket": {"$first": "$$ROOT"}}}
+        ]
+        latest = {}
+        async for group in db[BUCKETS_COLLECTION].aggregate(pipeline):
+            location = max(unpack_bucket(group["bucket"]), key=lambda loc: loc["timestamp"], default=None)
+            if location is not None:
+                latest[group["_id"]] = location
+        return latest
+
+    pipeline = [
+        {"$match": {"package_id": {"$in": package_ids}}},
+        {"$sort": {"package_id": -1, "timestamp": -1, "_id": -1}},
+        {"$group": {"_id": "$package_id", "location": {"$first": "$$ROOT"}}}
+    ]
+    return {group["_id"]: group["location"] async for group in db[LOCATIONS_COLLECTION].aggregate(pipeline)}
+
+
+async def get_latest_location(db, package_id) -> Optional[dict]:
+    """Get the most recent point of a package"""
+    if use_buckets():
+        bucket = await db[BUCKETS_COLLECTION].find_one(
+            {"package_id": package_id},
+            sort=[("hour", -1), ("max_timestamp", -1)]
+        )
+        if not bucket:
+            return None
+        return max(unpack_bucket(bucket), key=lambda loc: loc["timestamp"], default=None)
+
+    return await db[LOCATIONS_COLLECTION].find_one(
+        {"package_id": package_id},
+        sort=[("timestamp", -1)]
+    )
@@ -0,0 +1,191 @@
+"""
+Online GPS point thinning at ingest
+
+Drops points that are within a distance and time tolerance of the last kept
+point for the same package (e.g. a parked courier), and optionally merges
+points on a straight stretch in the spirit of an online Douglas-Peucker
+simplifier. State is kept in memory per package so no DB reads are needed.
+"""
+import math
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+from tracking.eta import calculate_distance
+
+KEEP = "keep"
+DROP = "drop"
+MERGE = "merge"
+
+
+@dataclass
+class _KeptPoint:
+    latitude: float
+    longitude: float
+    epoch: float
+    doc_id: object = None
+
+
+def _epoch_seconds(ts: datetime) -> float:
+    """Seconds since epoch; naive datetimes are treated as UTC"""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def cross_track_distance_km(
+    lat: float, lon: float,
+    start_lat: float, start_lon: float,
+    end_lat: float, end_lon: float
+) -> float:
+    """
+    Distance (km) from a point to the segment start->end, using a local
+    equirectangular projection (accurate for the short segments seen at ingest)
+    """
+    R = 6371.0
+    cos_lat = math.cos(math.radians(start_lat))
+    px = math.radians(lon - start_lon) * cos_lat * R
+    py = math.radians(lat - start_lat) * R
+    ex = math.radians(end_lon - start_lon) * cos_lat * R
+    ey = math.radians(end_lat - start_lat) * R
+
+    length_sq = ex * ex + ey * ey
+    if length_sq == 0:
+        return math.hypot(px, py)
+    t = max(0.0, min(1.0, (px * ex + py * ey) / length_sq))
+    return math.hypot(px - t * ex, py - t * ey)
+
+
+class LocationThinner:
+    """Per-package online thinning of incoming location points"""
+
+    def __init__(
+        self,
+        distance_tolerance_km: float = 0.02,
+        time_tolerance_seconds: float = 60.0,
+        simplify_tolerance_km: float = 0.0,
+        max_merge_span_seconds: float = 600.0,
+        max_packages: int = 10000
+    ):
+        self.distance_tolerance_km = distance_tolerance_km
+        self.time_tolerance_seconds = time_tolerance_seconds
+        self.simplify_tolerance_km = simplify_tolerance_km
+        self.max_merge_span_seconds = max_merge_span_seconds
+        self.max_packages = max_packages
+
+        # key -> [previous kept point, last kept point], LRU ordered
+        self._state: OrderedDict[str, list[Optional[_KeptPoint]]] = OrderedDict()
+
+        # Counters
+        self.kept = 0
+        self.dropped = 0
+        self.merged = 0
+
+    def decide(
+        self,
+        key: str,
+        latitude: float,
+        longitude: float,
+        timestamp: datetime,
+        allow_merge: bool = True
+    ) -> tuple[str, object]:
+        """
+        Decide what to do with an incoming point
+
+        Args:
+            key: Package key (tracking ID)
+            latitude, longitude, timestamp: Incoming point
+            allow_merge: Whether MERGE may be returned (requires the caller to
+                update the last kept document in place)
+
+        Returns:
+            (action, doc_id): KEEP with None, or DROP / MERGE with the _id of
+            the last kept document the point was dropped into / merges into.
+            Call keep() after inserting a KEEP point and merge() after
+            updating the document of a MERGE point.
+        """
+        state = self._state.get(key)
+        if state is None:
+            return KEEP, None
+        self._state.move_to_end(key)
+
+        previous, last = state
+        epoch = _epoch_seconds(timestamp)
+
+        # Near-duplicate of the last kept point (parked / jitter)
+        if (
+            epoch - last.epoch < self.time_tolerance_seconds
+            and calculate_distance(latitude, longitude, last.latitude, last.longitude) < self.distance_tolerance_km
+        ):
+            self.dropped += 1
+            return DROP, last.doc_id
+
+        # Online simplification: if the last kept point lies on the straight
+        # line from the one before it to the new point, it is redundant and
+        # the new point replaces it
+        if (
+            allow_merge
+            and self.simplify_tolerance_km > 0
+            and previous is not None
+            and last.doc_id is not None
+            and epoch >= last.epoch
+            and epoch - previous.epoch < self.max_merge_span_seconds
+            and cross_track_distance_km(
+                last.latitude, last.longitude,
+                previous.latitude, previous.longitude,
+                latitude, longitude
+            ) < self.simplify_tolerance_km
+        ):
+            return MERGE, last.doc_id
+
+        return KEEP, None
+
+    def keep(self, key: str, latitude: float, longitude: float, timestamp: datetime, doc_id=None):
+        """Record a point that was stored as a new document"""
+        point = _KeptPoint(latitude, longitude, _epoch_seconds(timestamp), doc_id)
+        state = self._state.get(key)
+        if state is None:
+            self._state[key] = [None, point]
+            if len(self._state) > self.max_packages:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+            state[0], state[1] = state[1], point
+        self.kept += 1
+
+    def merge(self, key: str, latitude: float, longitude: float, timestamp: datetime):
+        """Record that the last kept document was moved to a MERGE point"""
+        state = self._state.get(key)
+        if state is None:
+            return
+        last = state[1]
+        last.latitude, last.longitude, last.epoch = latitude, longitude, _epoch_seconds(timestamp)
+        self.merged += 1
+
+    def forget(self, key: str):
+        """Drop state for a package (e.g. once delivered)"""
+        self._state.pop(key, None)
+
+    def get_stats(self) -> dict:
+        """Return thinning counters"""
+        total = self.kept + self.dropped + self.merged
+        return {
+            "kept": self.kept,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "drop_ratio": (self.dropped + self.merged) / total if total else 0.0,
+            "tracked_packages": len(self._state)
+        }
+
+
+# Thinning configuration
+LOCATION_THINNING_ENABLED = os.getenv("LOCATION_THINNING_ENABLED", "false").lower() in ["1", "true", "yes"]
+
+# Global thinner instance
+location_thinner = LocationThinner(
+    distance_tolerance_km=float(os.getenv("LOCATION_THINNING_DISTANCE_M", "20")) / 1000,
+    time_tolerance_seconds=float(os.getenv("LOCATION_THINNING_TIME_S", "60")),
+    simplify_tolerance_km=float(os.getenv("LOCATION_SIMPLIFY_TOLERANCE_M", "0")) / 1000,
+    max_packages=int(os.getenv("LOCATION_THINNING_MAX_PACKAGES", "10000"))
+)
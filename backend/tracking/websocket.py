@@ -65,6 +65,28 @@ class ConnectionManager:
         
         logger.info(f"Broadcasted location update for {tracking_id} to {len(self.active_connections[tracking_id])} clients")
     
+    async def broadcast_geofence_events(self, tracking_id: str, events: list[dict]):
+        """Broadcast geofence enter / exit / dwell events for a tracking ID"""
+        if tracking_id not in self.active_connections:
+            return
+        
+        message = {
+            "type": "geofence_event",
+            "tracking_id": tracking_id,
+            "data": events
+        }
+        
+        disconnected = set()
+        for connection in self.active_connections[tracking_id]:
+            try:
+                await connection.send_text(json.dumps(message, default=str))
+            except Exception as e:
+                logger.error(f"Error sending message to client: {e}")
+                disconnected.add(connection)
+        
+        for connection in disconnected:
+            self.disconnect(connection, tracking_id)
+    
     async def send_message(self, websocket: WebSocket, message: dict):
         """Send a message to a specific client"""
         try: